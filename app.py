@@ -9,16 +9,28 @@ Production-ready Flask application with:
 - JWT authentication
 - Global error handling
 - Health check endpoints
+- Prometheus metrics endpoint
+- Read-replica routing with "read your writes" after mutations
 """
 import os
+import hmac
+import time
 import logging
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
 
+from cli import register_commands
 from config import get_config
-from connection import close_pool
+from connection import pool_stats, set_primary_only
+from utils import metrics, rate_limit
+from utils.cache import response_cache
+from utils.colaboradores import colaborador_cache
+from utils.senhas import password_hasher
+from utils.tokens import token_blocklist
+from utils.usuarios import usuario_cache
 
 # Configure logging
 logging.basicConfig(
@@ -27,6 +39,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Cookie pinning a client's reads to the primary right after it wrote
+READ_YOUR_WRITES_COOKIE = 'cf_primary_until'
+
 # Import blueprints
 from routes.auth import auth_bp
 from routes.colaboradores import colaboradores_bp
@@ -34,6 +49,10 @@ from routes.despesas import despesas_bp
 from routes.rendas import rendas_bp
 from routes.divisao import divisao_bp
 from routes.resumo import resumo_bp
+from routes.importacao import importacao_bp
+from routes.exportacao import exportacao_bp
+from routes.recorrencias import recorrencias_bp
+from routes.alteracoes import alteracoes_bp
 
 
 def create_app(config_class=None) -> Flask:
@@ -47,8 +66,16 @@ def create_app(config_class=None) -> Flask:
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    # Client address from X-Forwarded-For behind the platform's proxy (rate limits)
+    proxy_hops = getattr(config_class, 'PROXY_FIX_X_FOR', 0)
+    if proxy_hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops)
+
     # Initialize extensions
     jwt = JWTManager(app)
+    metrics.init_app(app)
+    if getattr(config_class, 'RATE_LIMIT_ENABLED', False):
+        rate_limit.init_app(app)
 
     # CORS Configuration - from environment variable
     cors_origins = getattr(config_class, 'CORS_ORIGINS', [])
@@ -60,11 +87,43 @@ def create_app(config_class=None) -> Flask:
         origins=cors_origins,
         supports_credentials=True,
         methods=['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'],
-        allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'],
-        expose_headers=['Content-Range', 'X-Total-Count'],
+        allow_headers=['Content-Type', 'Authorization', 'X-Requested-With', 'If-None-Match'],
+        expose_headers=['Content-Range', 'X-Total-Count', 'X-Next-Cursor', 'Link', 'ETag', 'Retry-After'],
         max_age=3600
     )
 
+    # Read replica routing: a client that just wrote reads from the primary
+    # for READ_YOUR_WRITES_SECONDS, so it never sees the replica lag behind
+    replica_enabled = bool(getattr(config_class, 'DATABASE_REPLICA_URL', None))
+    ryw_seconds = getattr(config_class, 'READ_YOUR_WRITES_SECONDS', 5)
+
+    @app.before_request
+    def route_reads():
+        pinned = False
+        if replica_enabled:
+            try:
+                pinned = float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > time.time()
+            except ValueError:
+                pinned = False
+        set_primary_only(pinned)
+
+    @app.after_request
+    def pin_reads_after_write(response):
+        if (replica_enabled and ryw_seconds > 0
+                and request.method in ('POST', 'PUT', 'PATCH', 'DELETE')
+                and response.status_code < 400):
+            secure = getattr(config_class, 'SESSION_COOKIE_SECURE', True)
+            response.set_cookie(
+                READ_YOUR_WRITES_COOKIE,
+                str(int(time.time() + ryw_seconds)),
+                max_age=ryw_seconds,
+                httponly=True,
+                secure=secure,
+                # Frontend and API live on different sites in production
+                samesite='None' if secure else 'Lax',
+            )
+        return response
+
     # JWT error handlers
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
@@ -86,6 +145,10 @@ def create_app(config_class=None) -> Flask:
     def revoked_token_callback(jwt_header, jwt_payload):
         return jsonify({'error': 'Token revogado', 'code': 'TOKEN_REVOKED'}), 401
 
+    @jwt.user_lookup_error_loader
+    def user_lookup_error_callback(jwt_header, jwt_payload):
+        return jsonify({'error': 'Usuário não encontrado ou inativo', 'code': 'USER_NOT_FOUND'}), 401
+
     # Global error handlers
     @app.errorhandler(HTTPException)
     def handle_http_exception(e: HTTPException):
@@ -144,9 +207,28 @@ def create_app(config_class=None) -> Flask:
         return jsonify({
             'status': 'OK' if db_status == 'connected' else 'degraded',
             'database': db_status,
+            'pool': pool_stats(),
+            'replica_pool': pool_stats('replica'),
+            'response_cache': response_cache.stats(),
+            'colaborador_cache': colaborador_cache.stats(),
+            'token_blocklist': token_blocklist.stats(),
+            'password_hasher': password_hasher.stats(),
+            'usuario_cache': usuario_cache.stats(),
+            'rate_limit': rate_limit.limiter.stats(),
             'environment': config_class.__name__.replace('Config', '').lower()
         }), http_status
 
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Prometheus metrics, aggregated across gunicorn workers."""
+        token = getattr(config_class, 'METRICS_TOKEN', None)
+        if token:
+            auth = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(auth, f'Bearer {token}'):
+                return jsonify({'error': 'Não autorizado', 'code': 'METRICS_UNAUTHORIZED'}), 401
+        body, content_type = metrics.render_latest()
+        return Response(body, content_type=content_type)
+
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api')
     app.register_blueprint(colaboradores_bp, url_prefix='/api')
@@ -154,6 +236,12 @@ def create_app(config_class=None) -> Flask:
     app.register_blueprint(rendas_bp, url_prefix='/api')
     app.register_blueprint(divisao_bp, url_prefix='/api')
     app.register_blueprint(resumo_bp, url_prefix='/api')
+    app.register_blueprint(importacao_bp, url_prefix='/api')
+    app.register_blueprint(exportacao_bp, url_prefix='/api')
+    app.register_blueprint(recorrencias_bp, url_prefix='/api')
+    app.register_blueprint(alteracoes_bp, url_prefix='/api')
+
+    register_commands(app)
 
     # Log registered routes in debug mode
     if getattr(config_class, 'DEBUG', False):
@@ -170,13 +258,9 @@ def create_app(config_class=None) -> Flask:
 application = create_app()
 app = application  # Alias for compatibility
 
-
-# Teardown: close pool on app shutdown
-@application.teardown_appcontext
-def shutdown_pool(exception=None):
-    if exception:
-        logger.error(f"App context teardown with exception: {exception}")
-    close_pool()
+# Connection pool lifecycle is per process, not per request:
+# it is warmed in gunicorn's post_worker_init hook and closed on
+# worker exit (see gunicorn.conf.py).
 
 
 # For local development only - not used in production
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Login storm benchmark: latency of a cheap endpoint while logins pile up.
+
+Measures GET <probe> latency twice against a running API - alone, then
+while ``--storm`` threads hammer POST /api/auth/login - and reports how
+many logins succeeded or were shed with 503. With hashing on the request
+threads the probe waits behind the logins; with utils/senhas.py it should
+stay close to the baseline.
+
+Usage:
+    python benchmarks/login_storm.py --url http://localhost:8000 \\
+        --username ana --password 'Senha123' [--storm 32] [--seconds 10]
+
+Stdlib only; run it against gunicorn with the production Procfile
+options (e.g. ``--workers 1 --threads 4``) to see one worker's behavior.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def _request(url: str, data: dict | None = None, token: str | None = None) -> tuple[int, bytes]:
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    body = json.dumps(data).encode() if data is not None else None
+    req = urllib.request.Request(url, data=body, headers=headers, method='POST' if data is not None else 'GET')
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def _sondar(url: str, token: str, segundos: float, pausa: float) -> list[float]:
+    latencias = []
+    fim = time.monotonic() + segundos
+    while time.monotonic() < fim:
+        inicio = time.perf_counter()
+        _request(url, token=token)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        time.sleep(pausa)
+    return latencias
+
+
+def _resumo(nome: str, latencias: list[float]) -> None:
+    print(f"{nome:<14} n={len(latencias):<5} "
+          f"p50={statistics.median(latencias):8.1f} ms  "
+          f"p95={_percentil(latencias, 0.95):8.1f} ms  "
+          f"max={max(latencias):8.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--probe', default='/api/colaboradores', help='Endpoint cheap to serve')
+    parser.add_argument('--storm', type=int, default=32, help='Concurrent login threads')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--interval', type=float, default=0.05, help='Pause between probes (s)')
+    args = parser.parse_args()
+
+    credenciais = {'username': args.username, 'password': args.password}
+    status, body = _request(f"{args.url}/api/auth/login", credenciais)
+    if status != 200:
+        raise SystemExit(f"Login inicial falhou ({status}): {body[:200]!r}")
+    token = json.loads(body)['access_token']
+    probe_url = f"{args.url}{args.probe}"
+
+    _resumo('sem logins', _sondar(probe_url, token, args.seconds, args.interval))
+
+    parar = threading.Event()
+    contagem: dict[int, int] = {}
+    lock = threading.Lock()
+
+    def tempestade():
+        while not parar.is_set():
+            status, _ = _request(f"{args.url}/api/auth/login", credenciais)
+            with lock:
+                contagem[status] = contagem.get(status, 0) + 1
+
+    threads = [threading.Thread(target=tempestade, daemon=True) for _ in range(args.storm)]
+    for t in threads:
+        t.start()
+    try:
+        _resumo('com logins', _sondar(probe_url, token, args.seconds, args.interval))
+    finally:
+        parar.set()
+        for t in threads:
+            t.join()
+
+    print(f"logins por status: {dict(sorted(contagem.items()))}")
+
+
+if __name__ == '__main__':
+    main()
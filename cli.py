@@ -0,0 +1,67 @@
+# cli.py
+"""
+Flask CLI commands for maintenance tasks.
+
+Usage:
+    flask --app app rebuild-agregados
+    flask --app app materializar-recorrencias [--de YYYY-MM] [--ate YYYY-MM]
+    flask --app app purgar-alteracoes [--dias N]
+"""
+import logging
+from datetime import date
+
+import click
+
+from connection import get_db_cursor
+
+logger = logging.getLogger(__name__)
+
+
+def register_commands(app) -> None:
+    """Register maintenance commands on the Flask CLI."""
+
+    @app.cli.command('rebuild-agregados')
+    def rebuild_agregados():
+        """Reconcile despesa_agregado_mensal from the despesa table."""
+        with get_db_cursor() as cur:
+            cur.execute("SELECT rebuild_despesa_agregado_mensal() AS divergentes")
+            divergentes = cur.fetchone()['divergentes']
+
+        if divergentes:
+            logger.warning(f"Agregado mensal reconstruído: {divergentes} grupo(s) divergiam")
+        click.echo(f"Agregado mensal reconstruído ({divergentes} grupo(s) corrigido(s))")
+
+    @app.cli.command('materializar-recorrencias')
+    @click.option('--de', help='Primeiro mês (YYYY-MM); padrão: mês atual')
+    @click.option('--ate', help='Último mês (YYYY-MM); padrão: mês atual')
+    def materializar_recorrencias_cmd(de, ate):
+        """Generate the due despesas of every active recurrence rule."""
+        from routes.recorrencias import materializar_recorrencias
+        from routes.resumo import MES_ANO_RE
+
+        hoje = date.today().strftime('%Y-%m')
+        de, ate = de or hoje, ate or hoje
+        if not MES_ANO_RE.match(de) or not MES_ANO_RE.match(ate) or de > ate:
+            raise click.BadParameter('use --de/--ate no formato YYYY-MM, com de <= ate')
+
+        with get_db_cursor() as cur:
+            meses = materializar_recorrencias(cur, de, ate)
+
+        for m in meses:
+            click.echo(f"  {m['mes_vigente']}: {m['quantidade']} despesa(s)")
+        click.echo(f"Recorrências materializadas de {de} a {ate}: "
+                   f"{sum(m['quantidade'] for m in meses)} despesa(s) criada(s)")
+
+    @app.cli.command('purgar-alteracoes')
+    @click.option('--dias', default=90, show_default=True, type=click.IntRange(min=1),
+                  help='Mantém as alterações dos últimos N dias')
+    def purgar_alteracoes_cmd(dias):
+        """Drop change-log entries older than N days (their cursors expire)."""
+        with get_db_cursor() as cur:
+            cur.execute(
+                "SELECT purgar_alteracoes(now() - %s * interval '1 day') AS removidas",
+                (dias,)
+            )
+            removidas = cur.fetchone()['removidas']
+
+        click.echo(f"Log de alterações: {removidas} registro(s) com mais de {dias} dia(s) removido(s)")
@@ -8,6 +8,8 @@ All required variables must be set via environment variables — no insecure fal
 import os
 from dotenv import load_dotenv
 
+from utils.rate_limit import parse_regras
+
 load_dotenv()
 
 
@@ -33,11 +35,80 @@ class Config:
     SECRET_KEY: str = _get_required_env('SECRET_KEY')
     JWT_SECRET_KEY: str = _get_required_env('JWT_SECRET_KEY')
     JWT_ACCESS_TOKEN_EXPIRES_HOURS: int = int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES_HOURS', '1'))
+    JWT_REFRESH_TOKEN_EXPIRES_DAYS: int = int(os.getenv('JWT_REFRESH_TOKEN_EXPIRES_DAYS', '30'))
 
     # Database
     DATABASE_URL: str = _get_required_env('DATABASE_URL')
     DATABASE_SSLMODE: str = os.getenv('DATABASE_SSLMODE', 'require')
+    DATABASE_POOL_MIN: int = int(os.getenv('DATABASE_POOL_MIN', '1'))
     DATABASE_POOL_MAX: int = int(os.getenv('DATABASE_POOL_MAX', '10'))
+    DATABASE_POOL_TIMEOUT: float = float(os.getenv('DATABASE_POOL_TIMEOUT', '5'))
+    DATABASE_POOL_MAX_WAITING: int = int(os.getenv('DATABASE_POOL_MAX_WAITING', '16'))
+    DATABASE_POOL_MAX_LIFETIME: float = float(os.getenv('DATABASE_POOL_MAX_LIFETIME', '1800'))
+    DATABASE_POOL_MAX_USES: int = int(os.getenv('DATABASE_POOL_MAX_USES', '0'))
+    DATABASE_POOL_CHECK_IDLE: float = float(os.getenv('DATABASE_POOL_CHECK_IDLE', '30'))
+    DATABASE_CONNECT_TIMEOUT: int = int(os.getenv('DATABASE_CONNECT_TIMEOUT', '10'))
+
+    # Read replica (optional) — used by read-only GET handlers
+    DATABASE_REPLICA_URL: str | None = os.getenv('DATABASE_REPLICA_URL') or None
+    DATABASE_REPLICA_MAX_LAG: float = float(os.getenv('DATABASE_REPLICA_MAX_LAG', '5'))
+    DATABASE_REPLICA_CHECK_INTERVAL: float = float(os.getenv('DATABASE_REPLICA_CHECK_INTERVAL', '5'))
+    DATABASE_REPLICA_RETRY: float = float(os.getenv('DATABASE_REPLICA_RETRY', '30'))
+    DATABASE_REPLICA_TIMEOUT: float = float(os.getenv('DATABASE_REPLICA_TIMEOUT', '0.5'))
+    READ_YOUR_WRITES_SECONDS: int = int(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+
+    # GET /api/despesas page size (?limit=) default and maximum
+    DESPESAS_PAGE_SIZE: int = int(os.getenv('DESPESAS_PAGE_SIZE', '100'))
+    DESPESAS_PAGE_MAX: int = int(os.getenv('DESPESAS_PAGE_MAX', '500'))
+    # Maximum items per POST /api/despesas/batch
+    DESPESAS_BATCH_MAX: int = int(os.getenv('DESPESAS_BATCH_MAX', '2000'))
+    # Maximum lines per statement import (POST /api/importacao/extrato)
+    IMPORTACAO_MAX_LINHAS: int = int(os.getenv('IMPORTACAO_MAX_LINHAS', '50000'))
+    # Rows fetched per round trip by the server-side cursor of /api/export/*
+    EXPORT_ITERSIZE: int = int(os.getenv('EXPORT_ITERSIZE', '2000'))
+    # Password hashing (utils/senhas.py): werkzeug method, processes and
+    # pending-work limit per gunicorn worker (keep it below --threads),
+    # seconds to wait for a result, Retry-After sent with 503 when saturated
+    PASSWORD_HASH_METHOD: str = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_WORKERS: int = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '2'))
+    PASSWORD_HASH_TIMEOUT: float = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+    PASSWORD_HASH_RETRY_AFTER: int = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', '2'))
+    # Seconds between background purges of expired token_revogado rows (utils/tokens.py)
+    TOKEN_PURGE_INTERVAL: float = float(os.getenv('TOKEN_PURGE_INTERVAL', '3600'))
+    # Per-worker cache of active users resolved from the JWT (utils/usuarios.py)
+    USER_CACHE_TTL: float = float(os.getenv('USER_CACHE_TTL', '300'))
+    USER_CACHE_MAX_ENTRIES: int = int(os.getenv('USER_CACHE_MAX_ENTRIES', '1000'))
+    # Sliding-window rate limits (utils/rate_limit.py): comma-separated
+    # endpoint=limit/seconds@scope[:falhas] rules, scope ip, user or ip+user
+    # (:falhas counts only failed logins); keys kept per worker;
+    # RATE_LIMIT_SHARED counts in Postgres instead (migration 012).
+    # Rules match the endpoint whatever the query, so the list limits are
+    # sized for unfiltered listings without getting in the way of paging
+    # (rendas.rendas also covers its POST)
+    RATE_LIMIT_ENABLED: bool = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RATE_LIMITS: str = os.getenv('RATE_LIMITS', (
+        'auth.login=10/60@ip,auth.login=5/60@user:falhas,auth.register=5/300@ip,auth.refresh=30/60@ip,'
+        'despesas.listar_despesas=120/60@user,rendas.rendas=120/60@user,'
+        'despesas.buscar_despesas=60/60@user,despesas.criar_despesas_em_lote=10/60@user,'
+        'importacao.importar_extrato=10/300@user,'
+        'exportacao.exportar_despesas=10/60@user,exportacao.exportar_rendas=10/60@user'
+    ))
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv('RATE_LIMIT_MAX_KEYS', '10000'))
+    RATE_LIMIT_SHARED: bool = os.getenv('RATE_LIMIT_SHARED', 'false').lower() in ('1', 'true', 'yes')
+    # Reverse proxies in front of the app trusted for X-Forwarded-For (Render: 1);
+    # without it every client shares the proxy's address in per-IP limits
+    PROXY_FIX_X_FOR: int = int(os.getenv('PROXY_FIX_X_FOR', '0'))
+    # GET /api/changes page size (?limit=) default and maximum
+    CHANGES_PAGE_SIZE: int = int(os.getenv('CHANGES_PAGE_SIZE', '500'))
+    CHANGES_PAGE_MAX: int = int(os.getenv('CHANGES_PAGE_MAX', '5000'))
+
+    # Per-worker response cache (GET /resumo, /despesas, /rendas, /colaboradores)
+    RESPONSE_CACHE_ENABLED: bool = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RESPONSE_CACHE_MAX_BYTES: int = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+
+    # Metrics (optional bearer token protecting /metrics)
+    METRICS_TOKEN: str | None = os.getenv('METRICS_TOKEN') or None
 
     # CORS
     CORS_ORIGINS: list[str] = _parse_cors_origins(os.getenv('CORS_ORIGINS'))
@@ -61,9 +132,58 @@ class Config:
         if cls.JWT_ACCESS_TOKEN_EXPIRES_HOURS <= 0:
             raise ValueError("JWT_ACCESS_TOKEN_EXPIRES_HOURS deve ser maior que zero")
 
+        if cls.JWT_REFRESH_TOKEN_EXPIRES_DAYS <= 0:
+            raise ValueError("JWT_REFRESH_TOKEN_EXPIRES_DAYS deve ser maior que zero")
+
         if cls.DATABASE_POOL_MAX <= 0:
             raise ValueError("DATABASE_POOL_MAX deve ser maior que zero")
 
+        if not (0 <= cls.DATABASE_POOL_MIN <= cls.DATABASE_POOL_MAX):
+            raise ValueError("DATABASE_POOL_MIN deve estar entre 0 e DATABASE_POOL_MAX")
+
+        if cls.DATABASE_POOL_TIMEOUT <= 0:
+            raise ValueError("DATABASE_POOL_TIMEOUT deve ser maior que zero")
+
+        if cls.DATABASE_POOL_MAX_WAITING < 0:
+            raise ValueError("DATABASE_POOL_MAX_WAITING não pode ser negativo")
+
+        if cls.READ_YOUR_WRITES_SECONDS < 0:
+            raise ValueError("READ_YOUR_WRITES_SECONDS não pode ser negativo")
+
+        if not (1 <= cls.DESPESAS_PAGE_SIZE <= cls.DESPESAS_PAGE_MAX):
+            raise ValueError("DESPESAS_PAGE_SIZE deve estar entre 1 e DESPESAS_PAGE_MAX")
+
+        if cls.EXPORT_ITERSIZE <= 0:
+            raise ValueError("EXPORT_ITERSIZE deve ser maior que zero")
+
+        if not (1 <= cls.CHANGES_PAGE_SIZE <= cls.CHANGES_PAGE_MAX):
+            raise ValueError("CHANGES_PAGE_SIZE deve estar entre 1 e CHANGES_PAGE_MAX")
+
+        if cls.PASSWORD_HASH_WORKERS <= 0 or cls.PASSWORD_HASH_MAX_PENDING <= 0:
+            raise ValueError("PASSWORD_HASH_WORKERS e PASSWORD_HASH_MAX_PENDING devem ser maiores que zero")
+
+        if cls.TOKEN_PURGE_INTERVAL <= 0:
+            raise ValueError("TOKEN_PURGE_INTERVAL deve ser maior que zero")
+
+        if cls.USER_CACHE_TTL < 0 or cls.USER_CACHE_MAX_ENTRIES <= 0:
+            raise ValueError("USER_CACHE_TTL não pode ser negativo e USER_CACHE_MAX_ENTRIES deve ser maior que zero")
+
+        if cls.PROXY_FIX_X_FOR < 0:
+            raise ValueError("PROXY_FIX_X_FOR não pode ser negativo")
+
+        if cls.RATE_LIMIT_MAX_KEYS <= 0:
+            raise ValueError("RATE_LIMIT_MAX_KEYS deve ser maior que zero")
+
+        if cls.RATE_LIMIT_ENABLED:
+            # Raises ValueError naming the malformed rule
+            parse_regras(cls.RATE_LIMITS)
+
+        if cls.PASSWORD_HASH_TIMEOUT <= 0:
+            raise ValueError("PASSWORD_HASH_TIMEOUT deve ser maior que zero")
+
+        if cls.RESPONSE_CACHE_MAX_BYTES <= 0:
+            raise ValueError("RESPONSE_CACHE_MAX_BYTES deve ser maior que zero")
+
 
 class DevelopmentConfig(Config):
     """Development environment configuration."""
@@ -99,6 +219,7 @@ class TestingConfig(Config):
 
     # Override with test-specific values if needed
     DATABASE_URL: str = os.getenv('TEST_DATABASE_URL', _get_required_env('DATABASE_URL'))
+    DATABASE_POOL_MIN: int = 1
     DATABASE_POOL_MAX: int = 2
 
 
@@ -3,20 +3,35 @@
 Provides thread-safe connection pooling with context managers for safe
 connection handling, automatic rollback on errors, and proper cleanup.
 
+Pool lifecycle:
+- One pool per process (gunicorn worker), created after fork
+- Warmed to DATABASE_POOL_MIN connections on worker start
+- Idle connections are kept for reuse up to DATABASE_POOL_MAX
+- Closed only on worker exit (gunicorn ``worker_exit`` hook / atexit)
+- Checkout waits up to DATABASE_POOL_TIMEOUT when the pool is busy
+- Optional read replica (DATABASE_REPLICA_URL) for ``readonly=True`` reads
+- Idle connections are pinged before reuse and recycled by age/use count
+
 Decimal support:
 - Registers adapter to send Decimal as NUMERIC to PostgreSQL
 - RealDictCursor returns Decimal values from NUMERIC columns automatically
 """
+import atexit
 import os
+import threading
+import time
 from contextlib import contextmanager
 from decimal import Decimal
-from typing import Generator, Optional
+from typing import Callable, Generator, Optional
 
 import psycopg2
+from psycopg2 import extensions as _ext
 from psycopg2.extensions import AsIs, register_adapter
-from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.pool import PoolError
 from psycopg2.extras import RealDictCursor
 
+from utils import metrics
+
 
 # Register Decimal adapter for psycopg2 - sends Decimal as NUMERIC literal
 def _adapt_decimal(d: Decimal) -> AsIs:
@@ -25,8 +40,306 @@ def _adapt_decimal(d: Decimal) -> AsIs:
 
 register_adapter(Decimal, _adapt_decimal)
 
-# Global connection pool instance
-_pool: Optional[ThreadedConnectionPool] = None
+
+class _ConnInfo:
+    """Bookkeeping for a pooled connection (age, idleness, use count)."""
+
+    __slots__ = ('created_at', 'last_used', 'uses')
+
+    def __init__(self, now: float):
+        self.created_at = now
+        self.last_used = now
+        self.uses = 0
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool that keeps idle connections open for reuse.
+
+    Unlike psycopg2's ``ThreadedConnectionPool`` (which closes every
+    connection returned beyond ``minconn`` and fails immediately when
+    exhausted), this pool:
+
+    - keeps idle connections open up to ``maxconn``
+    - makes callers wait (bounded queue of ``max_waiting``) up to
+      ``timeout`` seconds for a connection instead of failing
+    - checks liveness before reuse: a free local check on every checkout,
+      plus a ``SELECT 1`` ping when the connection sat idle longer than
+      ``check_idle`` seconds
+    - recycles connections older than ``max_lifetime`` seconds or used
+      more than ``max_uses`` times (0 disables either limit)
+
+    Counters (see ``stats()``):
+        created:  connections opened against the server
+        reused:   checkouts served by an already open connection
+        closed:   connections closed by the pool
+        recycled: connections closed for age/use limits
+        stale:    connections found dead on checkout
+        timeouts: checkouts that gave up waiting
+
+    ``listener``, if set, is called as ``listener(in_use, idle, waiting)``
+    whenever occupancy changes (used to feed the metrics gauges).
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float = 5.0,
+                 max_waiting: int = 16, max_lifetime: float = 1800.0,
+                 max_uses: int = 0, check_idle: float = 30.0, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+        self.max_lifetime = max_lifetime
+        self.max_uses = max_uses
+        self.check_idle = check_idle
+        self._connect_kwargs = connect_kwargs
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._idle: list = []
+        self._info: dict[int, _ConnInfo] = {}
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+        self._created = 0
+        self._reused = 0
+        self._closed_count = 0
+        self._recycled = 0
+        self._stale = 0
+        self._timeouts = 0
+        self.listener: Optional[Callable[[int, int, int], None]] = None
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def _connect(self) -> psycopg2.extensions.connection:
+        conn = psycopg2.connect(**self._connect_kwargs)
+        with self._lock:
+            self._created += 1
+            self._info[id(conn)] = _ConnInfo(time.monotonic())
+        return conn
+
+    def _close(self, conn) -> None:
+        """Close a connection that no longer counts against the pool."""
+        with self._lock:
+            self._info.pop(id(conn), None)
+            self._closed_count += 1
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+
+    def _publish(self) -> None:
+        listener = self.listener
+        if listener is not None:
+            try:
+                listener(self._in_use, len(self._idle), self._waiting)
+            except Exception:
+                pass  # Metrics must never break a checkout
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+        self._publish()
+
+    def _expired(self, info: Optional[_ConnInfo], now: float) -> bool:
+        if info is None:
+            return True
+        if self.max_lifetime and now - info.created_at >= self.max_lifetime:
+            return True
+        return bool(self.max_uses) and info.uses >= self.max_uses
+
+    def _is_usable(self, conn) -> bool:
+        """Cheap liveness check before handing out an idle connection."""
+        if conn.closed or conn.info.transaction_status == _ext.TRANSACTION_STATUS_UNKNOWN:
+            with self._lock:
+                self._stale += 1
+            return False
+
+        now = time.monotonic()
+        info = self._info.get(id(conn))
+        if self._expired(info, now):
+            with self._lock:
+                self._recycled += 1
+            return False
+
+        if self.check_idle >= 0 and now - info.last_used >= self.check_idle:
+            # Idle long enough for a server/proxy to have dropped it: ping.
+            # Autocommit avoids a second round trip for ROLLBACK.
+            try:
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute('SELECT 1')
+                conn.autocommit = False
+            except Exception:
+                with self._lock:
+                    self._stale += 1
+                return False
+        return True
+
+    def _acquire_slot(self, deadline: float, timeout: float):
+        """
+        Reserve a slot, waiting until ``deadline`` if the pool is full.
+
+        Must be called with ``self._cond`` held. Returns an idle connection,
+        or None if the caller must open a new one.
+        """
+        if self._closed:
+            raise PoolError("connection pool is closed")
+
+        if not self._idle and self._in_use >= self.maxconn:
+            if self._waiting >= self.max_waiting:
+                self._timeouts += 1
+                raise PoolError("connection pool exhausted (fila de espera cheia)")
+            self._waiting += 1
+            self._publish()
+            try:
+                while not self._idle and self._in_use >= self.maxconn and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolError(
+                            f"connection pool exhausted (timeout de {timeout}s ao aguardar conexão)"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            if self._closed:
+                raise PoolError("connection pool is closed")
+
+        self._in_use += 1
+        if self._idle:
+            # LIFO: the most recently used connection is the likeliest alive
+            return self._idle.pop()
+        return None
+
+    def warm(self) -> None:
+        """Open connections until ``minconn`` are idle in the pool."""
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) + self._in_use >= self.minconn:
+                    return
+            conn = self._connect()
+            with self._cond:
+                if not self._closed:
+                    self._idle.insert(0, conn)
+                    self._cond.notify()
+                    continue
+            self._close(conn)
+            return
+
+    def getconn(self, timeout: Optional[float] = None) -> psycopg2.extensions.connection:
+        """
+        Check out a connection, reusing an idle one when available.
+
+        Blocks up to ``timeout`` seconds (default: pool timeout) when all
+        ``maxconn`` connections are in use.
+
+        Raises:
+            PoolError: If the pool is closed, the wait queue is full or
+                the checkout deadline expires
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                conn = self._acquire_slot(deadline, timeout)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                self._publish()
+                return conn
+
+            if self._is_usable(conn):
+                with self._lock:
+                    self._reused += 1
+                self._publish()
+                return conn
+
+            # Dead or expired: drop it and try again with the same deadline
+            self._close(conn)
+            self._release_slot()
+
+    def putconn(self, conn, close: bool = False) -> None:
+        """Return a connection to the pool, discarding it if broken or expired."""
+        now = time.monotonic()
+        info = self._info.get(id(conn))
+        if info is not None:
+            info.uses += 1
+            info.last_used = now
+
+        keep = not (close or self._closed or conn.closed)
+        if keep:
+            status = conn.info.transaction_status
+            if status == _ext.TRANSACTION_STATUS_UNKNOWN:
+                # Server connection lost
+                keep = False
+            elif self._expired(info, now):
+                keep = False
+                with self._lock:
+                    self._recycled += 1
+            elif status != _ext.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    keep = False
+
+        with self._cond:
+            self._in_use -= 1
+            kept = keep and not self._closed
+            if kept:
+                self._idle.append(conn)
+            self._cond.notify()
+        self._publish()
+        if not kept:
+            self._close(conn)
+
+    def closeall(self) -> None:
+        """Close idle connections; checked-out ones are closed on return."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self) -> dict:
+        """Snapshot of pool counters and current occupancy."""
+        with self._lock:
+            return {
+                'created': self._created,
+                'reused': self._reused,
+                'closed': self._closed_count,
+                'recycled': self._recycled,
+                'stale': self._stale,
+                'timeouts': self._timeouts,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'minconn': self.minconn,
+                'maxconn': self.maxconn,
+            }
+
+
+# Process-wide pools ('primary' and optional 'replica'), bound to the PID
+_pools: dict[str, ConnectionPool] = {}
+_pools_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+# Replica routing state (per process)
+_replica_down_until = 0.0
+_replica_checked_at = 0.0
+_replica_lagging = False
+_replica_check_lock = threading.Lock()
+
+# Per-thread routing flags (set per request, see set_primary_only)
+_routing = threading.local()
 
 
 def _normalize_database_url(url: str) -> str:
@@ -41,58 +354,126 @@ def _normalize_database_url(url: str) -> str:
     return url
 
 
-def _get_pool() -> ThreadedConnectionPool:
-    """
-    Get the global connection pool, initializing if needed (lazy initialization).
+def _replica_url() -> Optional[str]:
+    return os.environ.get('DATABASE_REPLICA_URL') or None
 
-    Returns:
-        ThreadedConnectionPool instance
-
-    Raises:
-        RuntimeError: If DATABASE_URL is not configured
-        psycopg2.OperationalError: If connection to database fails
-    """
-    global _pool
 
-    if _pool is not None:
-        return _pool
-
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        raise RuntimeError("DATABASE_URL não configurada nas variáveis de ambiente")
+def _connect_kwargs(role: str) -> dict:
+    """psycopg2.connect() keyword arguments for ``role`` from the environment."""
+    if role == 'replica':
+        database_url = _replica_url()
+        if not database_url:
+            raise RuntimeError("DATABASE_REPLICA_URL não configurada nas variáveis de ambiente")
+    else:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            raise RuntimeError("DATABASE_URL não configurada nas variáveis de ambiente")
 
     # Normalize URL
     database_url = _normalize_database_url(database_url)
 
-    # Get pool configuration from environment
-    pool_max = int(os.environ.get('DATABASE_POOL_MAX', '10'))
-    
     # Build connection parameters
     # If sslmode is already in the URL, don't override it
     connect_kwargs = {
         'dsn': database_url,
         'cursor_factory': RealDictCursor,
+        # TCP keepalives let the OS notice connections dropped by a proxy
+        'keepalives': 1,
+        'keepalives_idle': 30,
+        'keepalives_interval': 10,
+        'keepalives_count': 3,
     }
-    
+
+    if 'connect_timeout=' not in database_url:
+        connect_kwargs['connect_timeout'] = int(os.environ.get('DATABASE_CONNECT_TIMEOUT', '10'))
+
     # Only add sslmode if not already in URL
     if 'sslmode=' not in database_url:
         sslmode = os.environ.get('DATABASE_SSLMODE', 'require')
         connect_kwargs['sslmode'] = sslmode
 
-    try:
-        _pool = ThreadedConnectionPool(
-            minconn=1,
-            maxconn=pool_max,
-            **connect_kwargs
-        )
-        return _pool
-    except Exception as e:
-        raise RuntimeError(f"Falha ao inicializar pool de conexões: {e}") from e
+    return connect_kwargs
+
+
+def connect_direct(role: str = 'primary') -> psycopg2.extensions.connection:
+    """
+    Open a dedicated connection outside the pool.
+
+    For long-lived background work (e.g. LISTEN for cache invalidations)
+    that must not hold a pooled connection. The caller owns and closes it.
+    """
+    return psycopg2.connect(**_connect_kwargs(role))
+
+
+def _build_pool(role: str) -> ConnectionPool:
+    """Create a new (empty) pool for ``role`` from environment configuration."""
+    connect_kwargs = _connect_kwargs(role)
+
+    # Get pool configuration from environment
+    pool_max = int(os.environ.get('DATABASE_POOL_MAX', '10'))
+    if role == 'replica':
+        pool_max = int(os.environ.get('DATABASE_REPLICA_POOL_MAX', str(pool_max)))
+    pool_min = min(int(os.environ.get('DATABASE_POOL_MIN', '1')), pool_max)
+
+    # A busy replica should not hold requests: fall back to the primary fast
+    if role == 'replica':
+        timeout = float(os.environ.get('DATABASE_REPLICA_TIMEOUT', '0.5'))
+    else:
+        timeout = float(os.environ.get('DATABASE_POOL_TIMEOUT', '5'))
+
+    pool = ConnectionPool(
+        minconn=pool_min,
+        maxconn=pool_max,
+        timeout=timeout,
+        max_waiting=int(os.environ.get('DATABASE_POOL_MAX_WAITING', '16')),
+        max_lifetime=float(os.environ.get('DATABASE_POOL_MAX_LIFETIME', '1800')),
+        max_uses=int(os.environ.get('DATABASE_POOL_MAX_USES', '0')),
+        check_idle=float(os.environ.get('DATABASE_POOL_CHECK_IDLE', '30')),
+        **connect_kwargs
+    )
+    if role == 'primary':
+        pool.listener = metrics.record_pool_state
+    return pool
+
+
+def _get_pool(role: str = 'primary') -> ConnectionPool:
+    """
+    Get a process-wide connection pool, initializing if needed.
 
+    Pools are bound to the PID that created them: a process forked after
+    a pool was built (e.g. gunicorn with ``--preload``) gets its own
+    pools instead of sharing sockets with the parent.
+
+    Args:
+        role: 'primary' (DATABASE_URL) or 'replica' (DATABASE_REPLICA_URL)
 
-def get_pool() -> ThreadedConnectionPool:
+    Returns:
+        ConnectionPool instance
+
+    Raises:
+        RuntimeError: If the database URL for ``role`` is not configured
     """
-    Public interface to get the connection pool.
+    global _pools, _pools_pid
+
+    if _pools_pid == os.getpid():
+        pool = _pools.get(role)
+        if pool is not None:
+            return pool
+
+    with _pool_lock:
+        if _pools_pid != os.getpid():
+            # Drop (without closing) pools inherited from the parent process
+            _pools = {}
+            _pools_pid = os.getpid()
+        pool = _pools.get(role)
+        if pool is None:
+            pool = _pools[role] = _build_pool(role)
+        return pool
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Public interface to get the (primary) connection pool.
     
     This is the recommended way to access the pool.
     The pool is initialized lazily on first access.
@@ -100,24 +481,151 @@ def get_pool() -> ThreadedConnectionPool:
     return _get_pool()
 
 
+def init_pool() -> ConnectionPool:
+    """
+    Create the pools for the current process and warm them to ``minconn``.
+
+    Called from the gunicorn ``post_worker_init`` hook so the first
+    requests of a worker don't pay for connection setup. A replica that
+    cannot be reached is not fatal: reads fall back to the primary.
+
+    Raises:
+        RuntimeError: If the primary pool cannot be initialized
+    """
+    pool = _get_pool()
+    try:
+        pool.warm()
+    except Exception as e:
+        raise RuntimeError(f"Falha ao inicializar pool de conexões: {e}") from e
+
+    if _replica_url():
+        try:
+            _get_pool('replica').warm()
+        except Exception as e:
+            _mark_replica_down()
+            import logging
+            logging.getLogger(__name__).warning(f"Réplica indisponível no início do worker: {e}")
+    return pool
+
+
+def pool_stats(role: str = 'primary') -> dict:
+    """Return pool counters, or an empty dict if the pool doesn't exist yet."""
+    if _pools_pid != os.getpid():
+        return {}
+    pool = _pools.get(role)
+    return pool.stats() if pool is not None else {}
+
+
 def close_pool() -> None:
     """
-    Close all connections in the pool.
+    Close all connections in the pools.
     
-    Should be called on application shutdown to cleanly release resources.
+    Called once on worker exit to cleanly release resources.
+    Must not be called per request.
     """
-    global _pool
-    if _pool is not None:
+    global _pools, _pools_pid
+    with _pool_lock:
+        pools, _pools = _pools, {}
+        owner, _pools_pid = _pools_pid, None
+    if owner != os.getpid():
+        return
+    for pool in pools.values():
         try:
-            _pool.closeall()
+            pool.closeall()
         except Exception:
             pass  # Ignore errors during shutdown
-        finally:
-            _pool = None
+
+
+atexit.register(close_pool)
+
+
+def set_primary_only(value: bool) -> None:
+    """
+    Route read-only checkouts of the current thread to the primary.
+
+    Set at the start of every request; used for "read your writes" right
+    after a client changed data (replicas may not have replayed it yet).
+    """
+    _routing.primary_only = value
+
+
+def replica_checkouts() -> int:
+    """Number of read-only checkouts the replica has served in the current thread."""
+    return getattr(_routing, 'replica_checkouts', 0)
+
+
+def _mark_replica_down() -> None:
+    global _replica_down_until
+    _replica_down_until = time.monotonic() + float(os.environ.get('DATABASE_REPLICA_RETRY', '30'))
+
+
+def _replica_lag_ok(conn) -> bool:
+    """
+    Check replication lag at most every DATABASE_REPLICA_CHECK_INTERVAL seconds.
+
+    Only one thread runs the check; the others use the last known result.
+    Lag is zero when everything received has been replayed, so an idle
+    primary does not look like a lagging replica.
+    """
+    global _replica_checked_at, _replica_lagging
+
+    interval = float(os.environ.get('DATABASE_REPLICA_CHECK_INTERVAL', '5'))
+    if time.monotonic() - _replica_checked_at < interval:
+        return not _replica_lagging
+    if not _replica_check_lock.acquire(blocking=False):
+        return not _replica_lagging
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT CASE
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                END AS lag
+            """)
+            lag = float(cur.fetchone()['lag'])
+        conn.rollback()
+        _replica_lagging = lag > float(os.environ.get('DATABASE_REPLICA_MAX_LAG', '5'))
+        _replica_checked_at = time.monotonic()
+        return not _replica_lagging
+    finally:
+        _replica_check_lock.release()
+
+
+def _checkout_replica():
+    """
+    Try to check out a replica connection.
+
+    Returns:
+        (pool, conn), or None if reads must go to the primary (no replica
+        configured, pinned by read-your-writes, replica down or lagging)
+    """
+    if not _replica_url() or getattr(_routing, 'primary_only', False):
+        return None
+    if time.monotonic() < _replica_down_until:
+        return None
+
+    try:
+        pool = _get_pool('replica')
+        conn = pool.getconn()
+    except PoolError:
+        return None  # Replica saturated: this read goes to the primary
+    except Exception:
+        _mark_replica_down()
+        return None
+
+    try:
+        if _replica_lag_ok(conn):
+            _routing.replica_checkouts = replica_checkouts() + 1
+            return pool, conn
+        pool.putconn(conn)
+    except Exception:
+        _mark_replica_down()
+        pool.putconn(conn, close=True)
+    return None
 
 
 @contextmanager
-def get_db_connection() -> Generator[psycopg2.extensions.connection, None, None]:
+def get_db_connection(readonly: bool = False) -> Generator[psycopg2.extensions.connection, None, None]:
     """
     Context manager for acquiring a database connection from the pool.
 
@@ -129,12 +637,28 @@ def get_db_connection() -> Generator[psycopg2.extensions.connection, None, None]
 
     The connection is automatically returned to the pool on exit.
     On exception, transaction is rolled back before returning to pool.
+
+    Args:
+        readonly: If True, use the read replica (DATABASE_REPLICA_URL) when
+            configured, healthy and within DATABASE_REPLICA_MAX_LAG; falls
+            back to the primary otherwise. Only for handlers that never write.
     
     Yields:
         psycopg2.extensions.connection: Database connection from pool
     """
-    pool = get_pool()
-    conn = pool.getconn()
+    started = time.perf_counter()
+    picked = _checkout_replica() if readonly else None
+    if picked is not None:
+        pool, conn = picked
+    else:
+        pool = get_pool()
+        try:
+            conn = pool.getconn()
+        except Exception:
+            metrics.DB_CHECKOUT_ERRORS.inc()
+            raise
+    acquired = time.perf_counter()
+    metrics.observe_db_checkout(acquired - started)
     try:
         yield conn
     except Exception:
@@ -152,10 +676,11 @@ def get_db_connection() -> Generator[psycopg2.extensions.connection, None, None]
         except Exception:
             pass
         pool.putconn(conn)
+        metrics.observe_db_hold(time.perf_counter() - acquired)
 
 
 @contextmanager
-def get_db_cursor(commit: bool = True) -> Generator[RealDictCursor, None, None]:
+def get_db_cursor(commit: bool = True, readonly: bool = False) -> Generator[RealDictCursor, None, None]:
     """
     Context manager for acquiring a cursor with automatic connection management.
 
@@ -171,13 +696,17 @@ def get_db_cursor(commit: bool = True) -> Generator[RealDictCursor, None, None]:
             cur.execute("SELECT ...")
             # Caller must commit manually if needed
 
+        with get_db_cursor(commit=False, readonly=True) as cur:
+            cur.execute("SELECT ...")  # may be served by the read replica
+
     Args:
         commit: If True (default), commit on success. If False, caller must commit.
+        readonly: If True, prefer the read replica (see get_db_connection).
         
     Yields:
         RealDictCursor: Database cursor for executing queries
     """
-    with get_db_connection() as conn:
+    with get_db_connection(readonly=readonly) as conn:
         cursor = conn.cursor()
         try:
             yield cursor
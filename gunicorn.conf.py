@@ -0,0 +1,68 @@
+# gunicorn.conf.py
+"""
+Gunicorn server hooks for Controle Financeiro Familiar API.
+
+Loaded automatically by gunicorn from the working directory. Command-line
+options (workers, threads, timeout) stay in the Procfile; this file only
+manages per-worker resources.
+"""
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger('gunicorn.error')
+
+# Shared directory where each worker writes its Prometheus samples.
+# Must be in the environment before workers import prometheus_client.
+_metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'controle-familiar-metrics'),
+)
+
+
+def on_starting(server):
+    """Start every master run with an empty metrics directory."""
+    shutil.rmtree(_metrics_dir, ignore_errors=True)
+    os.makedirs(_metrics_dir, exist_ok=True)
+
+
+def post_worker_init(worker):
+    """Create and warm this worker's connection pool once, after fork."""
+    from connection import init_pool
+
+    try:
+        pool = init_pool()
+        logger.info(f"Pool de conexões pronto (pid={worker.pid}): {pool.stats()}")
+    except Exception as e:
+        # Don't kill the worker: the pool retries lazily on first request
+        logger.error(f"Falha ao aquecer pool de conexões (pid={worker.pid}): {e}")
+
+    # Cache invalidations from the other workers (LISTEN/NOTIFY)
+    from utils.invalidation import ensure_listener
+    ensure_listener()
+
+    # Password hashing processes (spawned now, not on the first login)
+    from utils.senhas import password_hasher
+    try:
+        password_hasher.aquecer()
+    except Exception as e:
+        logger.error(f"Falha ao iniciar processos de hashing (pid={worker.pid}): {e}")
+
+
+def worker_exit(server, worker):
+    """Close this worker's connection pool when the worker exits."""
+    from connection import close_pool, pool_stats
+
+    logger.info(f"Encerrando pool de conexões (pid={worker.pid}): {pool_stats()}")
+    close_pool()
+
+    from utils.senhas import password_hasher
+    password_hasher.encerrar()
+
+
+def child_exit(server, worker):
+    """Discard live gauges of a worker that exited (runs in the master)."""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,134 @@
+-- Migration 002: Agregado mensal de despesas mantido por triggers
+-- Mantém SUM(valor) e COUNT(*) por (mes_vigente, colaborador_id, categoria, tipo_pg)
+-- para que resumo e analytics leiam O(colaboradores) linhas em vez de O(despesas).
+--
+-- Os triggers são por statement com transition tables: um INSERT de 1.000 linhas
+-- (lote, importação via COPY) gera um único upsert agrupado no agregado.
+-- Reconciliação completa: SELECT rebuild_despesa_agregado_mensal();
+--                  ou: flask --app app rebuild-agregados
+
+CREATE TABLE IF NOT EXISTS despesa_agregado_mensal (
+    mes_vigente VARCHAR(7) NOT NULL,
+    colaborador_id INTEGER NOT NULL REFERENCES colaborador(id) ON DELETE CASCADE,
+    categoria VARCHAR(100) NOT NULL,
+    tipo_pg VARCHAR(20) NOT NULL,
+    total NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    quantidade INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (mes_vigente, colaborador_id, categoria, tipo_pg)
+);
+
+
+-- Aplica o delta de um statement sobre despesa ao agregado
+CREATE OR REPLACE FUNCTION despesa_agregado_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO despesa_agregado_mensal AS a
+            (mes_vigente, colaborador_id, categoria, tipo_pg, total, quantidade)
+        SELECT mes_vigente, colaborador_id, categoria, tipo_pg, SUM(valor), COUNT(*)
+        FROM novas
+        GROUP BY mes_vigente, colaborador_id, categoria, tipo_pg
+        ON CONFLICT (mes_vigente, colaborador_id, categoria, tipo_pg) DO UPDATE
+        SET total = a.total + EXCLUDED.total,
+            quantidade = a.quantidade + EXCLUDED.quantidade;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE despesa_agregado_mensal a
+        SET total = a.total - d.total,
+            quantidade = a.quantidade - d.quantidade
+        FROM (
+            SELECT mes_vigente, colaborador_id, categoria, tipo_pg,
+                   SUM(valor) AS total, COUNT(*) AS quantidade
+            FROM antigas
+            GROUP BY mes_vigente, colaborador_id, categoria, tipo_pg
+        ) d
+        WHERE a.mes_vigente = d.mes_vigente
+          AND a.colaborador_id = d.colaborador_id
+          AND a.categoria = d.categoria
+          AND a.tipo_pg = d.tipo_pg;
+
+    ELSE  -- UPDATE: soma as linhas novas e subtrai as antigas
+        INSERT INTO despesa_agregado_mensal AS a
+            (mes_vigente, colaborador_id, categoria, tipo_pg, total, quantidade)
+        SELECT mes_vigente, colaborador_id, categoria, tipo_pg, SUM(valor), SUM(quantidade)
+        FROM (
+            SELECT mes_vigente, colaborador_id, categoria, tipo_pg, valor, 1 AS quantidade
+            FROM novas
+            UNION ALL
+            SELECT mes_vigente, colaborador_id, categoria, tipo_pg, -valor, -1
+            FROM antigas
+        ) d
+        GROUP BY mes_vigente, colaborador_id, categoria, tipo_pg
+        HAVING SUM(valor) <> 0 OR SUM(quantidade) <> 0
+        ON CONFLICT (mes_vigente, colaborador_id, categoria, tipo_pg) DO UPDATE
+        SET total = a.total + EXCLUDED.total,
+            quantidade = a.quantidade + EXCLUDED.quantidade;
+    END IF;
+
+    IF TG_OP <> 'INSERT' THEN
+        -- Remove grupos que ficaram vazios nos meses afetados
+        DELETE FROM despesa_agregado_mensal a
+        WHERE a.quantidade = 0
+          AND a.mes_vigente IN (SELECT DISTINCT mes_vigente FROM antigas);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Transition tables exigem um trigger por evento
+DROP TRIGGER IF EXISTS trg_despesa_agregado_ins ON despesa;
+CREATE TRIGGER trg_despesa_agregado_ins
+    AFTER INSERT ON despesa
+    REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION despesa_agregado_trigger();
+
+DROP TRIGGER IF EXISTS trg_despesa_agregado_upd ON despesa;
+CREATE TRIGGER trg_despesa_agregado_upd
+    AFTER UPDATE ON despesa
+    REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION despesa_agregado_trigger();
+
+DROP TRIGGER IF EXISTS trg_despesa_agregado_del ON despesa;
+CREATE TRIGGER trg_despesa_agregado_del
+    AFTER DELETE ON despesa
+    REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION despesa_agregado_trigger();
+
+
+-- Reconstrói o agregado a partir de despesa e retorna quantos grupos divergiam
+CREATE OR REPLACE FUNCTION rebuild_despesa_agregado_mensal() RETURNS integer AS $$
+DECLARE
+    divergentes integer;
+BEGIN
+    -- Bloqueia escritas em despesa durante a reconciliação (leituras seguem)
+    LOCK TABLE despesa IN SHARE MODE;
+    LOCK TABLE despesa_agregado_mensal IN EXCLUSIVE MODE;
+
+    CREATE TEMP TABLE _agregado_real AS
+    SELECT mes_vigente, colaborador_id, categoria, tipo_pg,
+           SUM(valor) AS total, COUNT(*)::integer AS quantidade
+    FROM despesa
+    GROUP BY mes_vigente, colaborador_id, categoria, tipo_pg;
+
+    SELECT COUNT(*) INTO divergentes
+    FROM _agregado_real r
+    FULL JOIN despesa_agregado_mensal a
+        USING (mes_vigente, colaborador_id, categoria, tipo_pg)
+    WHERE r.total IS DISTINCT FROM a.total
+       OR r.quantidade IS DISTINCT FROM a.quantidade;
+
+    DELETE FROM despesa_agregado_mensal;
+    INSERT INTO despesa_agregado_mensal
+        (mes_vigente, colaborador_id, categoria, tipo_pg, total, quantidade)
+    SELECT mes_vigente, colaborador_id, categoria, tipo_pg, total, quantidade
+    FROM _agregado_real;
+
+    DROP TABLE _agregado_real;
+    RETURN divergentes;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Carga inicial
+SELECT rebuild_despesa_agregado_mensal();
@@ -0,0 +1,89 @@
+-- Migration 003: Snapshot do resumo em meses acertados
+-- Ao marcar a divisão de um mês como paga, o resumo calculado é gravado em
+-- divisao_mensal.snapshot e /api/resumo passa a servi-lo sem recalcular.
+-- Despesas ou rendas alteradas depois do acerto marcam o snapshot como
+-- desatualizado (snapshot_desatualizado); marcar como pago de novo o regrava.
+
+ALTER TABLE divisao_mensal ADD COLUMN IF NOT EXISTS snapshot JSONB;
+ALTER TABLE divisao_mensal ADD COLUMN IF NOT EXISTS snapshot_em TIMESTAMPTZ;
+ALTER TABLE divisao_mensal ADD COLUMN IF NOT EXISTS snapshot_desatualizado BOOLEAN NOT NULL DEFAULT false;
+
+
+-- Despesas: meses afetados vêm de mes_vigente (linhas antigas e novas)
+CREATE OR REPLACE FUNCTION divisao_snapshot_despesa_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE divisao_mensal SET snapshot_desatualizado = true
+        WHERE snapshot IS NOT NULL AND NOT snapshot_desatualizado
+          AND mes_ano IN (SELECT mes_vigente FROM novas);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE divisao_mensal SET snapshot_desatualizado = true
+        WHERE snapshot IS NOT NULL AND NOT snapshot_desatualizado
+          AND mes_ano IN (SELECT mes_vigente FROM antigas);
+    ELSE
+        UPDATE divisao_mensal SET snapshot_desatualizado = true
+        WHERE snapshot IS NOT NULL AND NOT snapshot_desatualizado
+          AND mes_ano IN (SELECT mes_vigente FROM novas
+                          UNION SELECT mes_vigente FROM antigas);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_divisao_snapshot_despesa_ins ON despesa;
+CREATE TRIGGER trg_divisao_snapshot_despesa_ins
+    AFTER INSERT ON despesa
+    REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION divisao_snapshot_despesa_trigger();
+
+DROP TRIGGER IF EXISTS trg_divisao_snapshot_despesa_upd ON despesa;
+CREATE TRIGGER trg_divisao_snapshot_despesa_upd
+    AFTER UPDATE ON despesa
+    REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION divisao_snapshot_despesa_trigger();
+
+DROP TRIGGER IF EXISTS trg_divisao_snapshot_despesa_del ON despesa;
+CREATE TRIGGER trg_divisao_snapshot_despesa_del
+    AFTER DELETE ON despesa
+    REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION divisao_snapshot_despesa_trigger();
+
+
+-- Rendas: meses afetados vêm de mes_ano
+CREATE OR REPLACE FUNCTION divisao_snapshot_renda_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE divisao_mensal SET snapshot_desatualizado = true
+        WHERE snapshot IS NOT NULL AND NOT snapshot_desatualizado
+          AND mes_ano IN (SELECT mes_ano FROM novas);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE divisao_mensal SET snapshot_desatualizado = true
+        WHERE snapshot IS NOT NULL AND NOT snapshot_desatualizado
+          AND mes_ano IN (SELECT mes_ano FROM antigas);
+    ELSE
+        UPDATE divisao_mensal SET snapshot_desatualizado = true
+        WHERE snapshot IS NOT NULL AND NOT snapshot_desatualizado
+          AND mes_ano IN (SELECT mes_ano FROM novas
+                          UNION SELECT mes_ano FROM antigas);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_divisao_snapshot_renda_ins ON renda_mensal;
+CREATE TRIGGER trg_divisao_snapshot_renda_ins
+    AFTER INSERT ON renda_mensal
+    REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION divisao_snapshot_renda_trigger();
+
+DROP TRIGGER IF EXISTS trg_divisao_snapshot_renda_upd ON renda_mensal;
+CREATE TRIGGER trg_divisao_snapshot_renda_upd
+    AFTER UPDATE ON renda_mensal
+    REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION divisao_snapshot_renda_trigger();
+
+DROP TRIGGER IF EXISTS trg_divisao_snapshot_renda_del ON renda_mensal;
+CREATE TRIGGER trg_divisao_snapshot_renda_del
+    AFTER DELETE ON renda_mensal
+    REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION divisao_snapshot_renda_trigger();
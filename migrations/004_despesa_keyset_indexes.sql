@@ -0,0 +1,14 @@
+-- Migration 004: Índices para paginação por cursor em GET /api/despesas
+-- A listagem ordena por (data_compra DESC, id DESC) e continua a partir do
+-- último item com (data_compra, id) < (cursor): com estes índices cada página
+-- é um range scan de `limit` linhas, independente da profundidade.
+--
+-- CONCURRENTLY não bloqueia escritas; rode fora de transação (psql -f já o faz).
+
+-- Listagem geral (sem filtro de mês)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_despesa_data_id
+ON despesa (data_compra DESC, id DESC);
+
+-- Listagem de um mês (?mes_vigente=); também atende buscas só por mes_vigente
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_despesa_mes_data_id
+ON despesa (mes_vigente, data_compra DESC, id DESC);
@@ -0,0 +1,35 @@
+-- Migration 005: Busca em despesas (GET /api/despesas/search)
+-- Texto completo e trigramas sobre descricao, sem acentos, mais índices
+-- compostos para os filtros combináveis que mantêm a ordenação por
+-- (data_compra DESC, id DESC) da paginação por cursor.
+--
+-- Os índices usam CONCURRENTLY: rode fora de transação (psql -f já o faz).
+-- As expressões dos índices de texto precisam ser idênticas às das queries
+-- em routes/despesas.py (BUSCA_TSVECTOR / BUSCA_NORMALIZADA).
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- unaccent() é STABLE (depende do search_path e do dicionário padrão) e não
+-- pode entrar em índice; este wrapper fixa o dicionário e é IMMUTABLE.
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS $$
+    SELECT public.unaccent('public.unaccent'::regdictionary, $1)
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+
+-- Texto completo (português, sem acentos): ?q=farmacia encontra "Farmácias São João"
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_despesa_descricao_fts
+ON despesa USING gin (to_tsvector('portuguese', f_unaccent(descricao)));
+
+-- Trigramas: prefixos e trechos de palavras (?q=drog encontra "Drogasil")
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_despesa_descricao_trgm
+ON despesa USING gin (lower(f_unaccent(descricao)) gin_trgm_ops);
+
+-- Filtros mais seletivos, já na ordem da listagem
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_despesa_categoria_data_id
+ON despesa (categoria, data_compra DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_despesa_colaborador_data_id
+ON despesa (colaborador_id, data_compra DESC, id DESC);
+
+-- tipo_pg (5 valores) e faixas de valor não ganham índice próprio: filtram
+-- as linhas vindas dos índices acima ou de idx_despesa_data_id (migration 004).
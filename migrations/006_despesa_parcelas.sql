@@ -0,0 +1,22 @@
+-- Migration 006: Compras parceladas
+-- POST /api/despesas com "parcelas": N gera N despesas ligadas pelo mesmo
+-- parcela_grupo, cada uma com seu mes_vigente (1ª parcela pelo dia de
+-- fechamento do colaborador, as demais nos meses seguintes). Despesas à
+-- vista ficam com as três colunas nulas.
+
+ALTER TABLE despesa ADD COLUMN IF NOT EXISTS parcela_grupo UUID;
+ALTER TABLE despesa ADD COLUMN IF NOT EXISTS parcela_numero SMALLINT;
+ALTER TABLE despesa ADD COLUMN IF NOT EXISTS parcela_total SMALLINT;
+
+-- NOT VALID + VALIDATE: a validação varre a tabela sem bloquear escritas
+ALTER TABLE despesa DROP CONSTRAINT IF EXISTS despesa_parcela_check;
+ALTER TABLE despesa ADD CONSTRAINT despesa_parcela_check CHECK (
+    (parcela_grupo IS NULL AND parcela_numero IS NULL AND parcela_total IS NULL)
+    OR (parcela_grupo IS NOT NULL AND parcela_total >= 2
+        AND parcela_numero BETWEEN 1 AND parcela_total)
+) NOT VALID;
+ALTER TABLE despesa VALIDATE CONSTRAINT despesa_parcela_check;
+
+-- PUT/DELETE /api/despesas/parcelas/<grupo> alcançam o grupo inteiro por aqui
+CREATE INDEX IF NOT EXISTS idx_despesa_parcela_grupo
+ON despesa (parcela_grupo, parcela_numero) WHERE parcela_grupo IS NOT NULL;
@@ -0,0 +1,100 @@
+-- Migration 007: Despesas recorrentes (aluguel, contas, assinaturas)
+-- Uma regra em despesa_recorrente (mensal ou anual, dia do mês, início/fim)
+-- é materializada em linhas de despesa por materializar_despesas_recorrentes(),
+-- um único INSERT ... SELECT para todas as regras e meses do período.
+-- Cada ocorrência é identificada por (recorrencia_id, recorrencia_data):
+-- rodar de novo sobre o mesmo período não duplica nada.
+--
+-- Uso: SELECT * FROM materializar_despesas_recorrentes('2023-01-01', '2024-12-01');
+--  ou: flask --app app materializar-recorrencias --de 2023-01 --ate 2024-12
+--  ou: POST /api/recorrencias/materializar
+
+CREATE TABLE IF NOT EXISTS despesa_recorrente (
+    id SERIAL PRIMARY KEY,
+    descricao TEXT NOT NULL,
+    valor DECIMAL(10,2) NOT NULL CHECK (valor > 0),
+    tipo_pg VARCHAR(20) NOT NULL CHECK (tipo_pg IN ('credito', 'debito', 'pix', 'dinheiro', 'outros')),
+    colaborador_id INTEGER NOT NULL REFERENCES colaborador(id) ON DELETE CASCADE,
+    categoria VARCHAR(30) NOT NULL CHECK (
+        categoria IN (
+            'moradia',
+            'alimentacao',
+            'restaurante_lanche',
+            'casa_utilidades',
+            'saude',
+            'transporte',
+            'lazer_outros'
+        )
+    ),
+    frequencia VARCHAR(10) NOT NULL CHECK (frequencia IN ('mensal', 'anual')),
+    -- Dia do vencimento; em meses mais curtos cai no último dia
+    dia SMALLINT NOT NULL CHECK (dia BETWEEN 1 AND 31),
+    -- Mês do vencimento das anuais
+    mes SMALLINT CHECK (mes BETWEEN 1 AND 12),
+    inicio DATE NOT NULL,
+    fim DATE,
+    ativa BOOLEAN NOT NULL DEFAULT true,
+    criado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+    CHECK ((frequencia = 'mensal') = (mes IS NULL)),
+    CHECK (fim IS NULL OR fim >= inicio)
+);
+
+ALTER TABLE despesa ADD COLUMN IF NOT EXISTS recorrencia_id INTEGER
+    REFERENCES despesa_recorrente(id) ON DELETE SET NULL;
+ALTER TABLE despesa ADD COLUMN IF NOT EXISTS recorrencia_data DATE;
+
+-- Chave de idempotência da materialização (ON CONFLICT ... DO NOTHING)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_despesa_recorrencia
+ON despesa (recorrencia_id, recorrencia_data) WHERE recorrencia_id IS NOT NULL;
+
+
+-- Mesma regra de utils/date_utils.calcular_mes_vigente, para uso em SQL
+CREATE OR REPLACE FUNCTION calcular_mes_vigente(data_compra DATE, tipo_pg TEXT, dia_limite INTEGER)
+RETURNS VARCHAR(7) AS $$
+    SELECT CASE
+        WHEN lower(trim(tipo_pg)) NOT IN ('credito', 'crédito', 'cartao de credito',
+                                          'cartão de crédito', 'cartão', 'cartao')
+             OR extract(day FROM data_compra) <= dia_limite
+        THEN to_char(data_compra, 'YYYY-MM')
+        ELSE to_char(data_compra + interval '1 month', 'YYYY-MM')
+    END
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+
+-- Gera as ocorrências vencidas (até hoje) de todas as regras ativas nos meses
+-- de `de` a `ate` (qualquer dia do mês). Devolve as novas linhas por mes_vigente.
+CREATE OR REPLACE FUNCTION materializar_despesas_recorrentes(de DATE, ate DATE)
+RETURNS TABLE (mes_vigente VARCHAR(7), quantidade BIGINT) AS $$
+    WITH ocorrencias AS (
+        SELECT r.id AS recorrencia_id, r.descricao, r.valor, r.tipo_pg, r.colaborador_id,
+               r.categoria, r.inicio, r.fim, c.dia_fechamento,
+               (m + (least(r.dia, extract(day FROM m + interval '1 month - 1 day')::int) - 1)
+                    * interval '1 day')::date AS data
+        FROM despesa_recorrente r
+        JOIN colaborador c ON c.id = r.colaborador_id
+        CROSS JOIN LATERAL generate_series(
+            greatest(date_trunc('month', de::timestamp), date_trunc('month', r.inicio::timestamp)),
+            least(date_trunc('month', ate::timestamp),
+                  date_trunc('month', coalesce(r.fim, ate)::timestamp),
+                  date_trunc('month', current_date::timestamp)),
+            interval '1 month'
+        ) AS m
+        WHERE r.ativa
+          AND (r.frequencia = 'mensal' OR extract(month FROM m) = r.mes)
+    ),
+    novas AS (
+        INSERT INTO despesa (
+            data_compra, mes_vigente, descricao, valor, tipo_pg, colaborador_id, categoria,
+            recorrencia_id, recorrencia_data
+        )
+        SELECT o.data, calcular_mes_vigente(o.data, o.tipo_pg, o.dia_fechamento), o.descricao,
+               o.valor, o.tipo_pg, o.colaborador_id, o.categoria, o.recorrencia_id, o.data
+        FROM ocorrencias o
+        WHERE o.data BETWEEN o.inicio AND coalesce(o.fim, 'infinity'::date)
+          AND o.data <= current_date
+        ORDER BY o.data, o.recorrencia_id
+        ON CONFLICT (recorrencia_id, recorrencia_data) WHERE recorrencia_id IS NOT NULL DO NOTHING
+        RETURNING despesa.mes_vigente
+    )
+    SELECT n.mes_vigente, COUNT(*) FROM novas n GROUP BY n.mes_vigente ORDER BY n.mes_vigente
+$$ LANGUAGE sql;
@@ -0,0 +1,120 @@
+-- Migration 008: Log de alterações para sincronização incremental (GET /api/changes)
+-- Todo INSERT/UPDATE/DELETE em despesa, renda_mensal, colaborador e divisao_mensal
+-- grava uma linha em alteracao (triggers por statement com transition tables):
+-- a linha nova completa em `dados`, ou um tombstone (dados NULL) na exclusão.
+-- O cliente guarda o último `id` recebido e pede só o que veio depois: um
+-- cliente em dia custa uma varredura vazia no índice da chave primária.
+--
+-- Ids da sequence não seguem a ordem de commit: uma transação longa pode
+-- gravar id 10 e commitar depois de outra que gravou id 11. Por isso a API
+-- só entrega linhas até a primeira cuja transação (xid) não é anterior ao
+-- xmin do snapshot atual, i.e. que ainda poderia ter vizinhas invisíveis.
+--
+-- Limpeza: SELECT purgar_alteracoes(now() - interval '90 days');
+--      ou: flask --app app purgar-alteracoes --dias 90
+
+CREATE TABLE IF NOT EXISTS alteracao (
+    id BIGSERIAL PRIMARY KEY,
+    tabela VARCHAR(30) NOT NULL,
+    -- Chave primária da linha alterada (mes_ano em divisao_mensal)
+    chave TEXT NOT NULL,
+    operacao CHAR(1) NOT NULL CHECK (operacao IN ('I', 'U', 'D')),
+    dados JSONB,
+    xid BIGINT NOT NULL DEFAULT txid_current(),
+    criado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Cabeça segura do log (GET /api/changes sem ?since=)
+CREATE INDEX IF NOT EXISTS idx_alteracao_xid ON alteracao (xid);
+CREATE INDEX IF NOT EXISTS idx_alteracao_criado_em ON alteracao (criado_em);
+
+-- Maior id já removido por purgar_alteracoes(); cursores anteriores expiraram
+CREATE TABLE IF NOT EXISTS alteracao_purga (
+    unica BOOLEAN PRIMARY KEY DEFAULT true CHECK (unica),
+    ate BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO alteracao_purga DEFAULT VALUES ON CONFLICT DO NOTHING;
+
+
+-- TG_ARGV[0]: coluna da chave primária
+CREATE OR REPLACE FUNCTION registrar_alteracao() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO alteracao (tabela, chave, operacao)
+        SELECT TG_TABLE_NAME, to_jsonb(a) ->> TG_ARGV[0], 'D'
+        FROM antigas a;
+    ELSE
+        -- O snapshot do resumo (divisao_mensal) é grande e tem endpoint próprio
+        INSERT INTO alteracao (tabela, chave, operacao, dados)
+        SELECT TG_TABLE_NAME, to_jsonb(n) ->> TG_ARGV[0], left(TG_OP, 1), to_jsonb(n) - 'snapshot'
+        FROM novas n;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Transition tables exigem um trigger por evento
+DO $$
+DECLARE
+    t RECORD;
+BEGIN
+    FOR t IN SELECT * FROM (VALUES
+        ('despesa', 'id'),
+        ('renda_mensal', 'id'),
+        ('colaborador', 'id'),
+        ('divisao_mensal', 'mes_ano')
+    ) AS v(tabela, chave) LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_alteracao_ins ON %I', t.tabela, t.tabela);
+        EXECUTE format(
+            'CREATE TRIGGER trg_%s_alteracao_ins AFTER INSERT ON %I '
+            'REFERENCING NEW TABLE AS novas '
+            'FOR EACH STATEMENT EXECUTE FUNCTION registrar_alteracao(%L)',
+            t.tabela, t.tabela, t.chave);
+
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_alteracao_upd ON %I', t.tabela, t.tabela);
+        EXECUTE format(
+            'CREATE TRIGGER trg_%s_alteracao_upd AFTER UPDATE ON %I '
+            'REFERENCING NEW TABLE AS novas '
+            'FOR EACH STATEMENT EXECUTE FUNCTION registrar_alteracao(%L)',
+            t.tabela, t.tabela, t.chave);
+
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_alteracao_del ON %I', t.tabela, t.tabela);
+        EXECUTE format(
+            'CREATE TRIGGER trg_%s_alteracao_del AFTER DELETE ON %I '
+            'REFERENCING OLD TABLE AS antigas '
+            'FOR EACH STATEMENT EXECUTE FUNCTION registrar_alteracao(%L)',
+            t.tabela, t.tabela, t.chave);
+    END LOOP;
+END;
+$$;
+
+
+-- Remove as alterações anteriores a `antes` e avança o horizonte de purga.
+-- Devolve quantas linhas saíram.
+CREATE OR REPLACE FUNCTION purgar_alteracoes(antes TIMESTAMPTZ) RETURNS BIGINT AS $$
+    WITH removidas AS (
+        DELETE FROM alteracao WHERE criado_em < antes RETURNING id
+    ),
+    horizonte AS (
+        UPDATE alteracao_purga p
+        SET ate = greatest(p.ate, (SELECT max(id) FROM removidas))
+        WHERE EXISTS (SELECT 1 FROM removidas)
+    )
+    SELECT COUNT(*) FROM removidas
+$$ LANGUAGE sql;
+
+
+-- Carga inicial: o estado atual entra como inserções, assim ?since=0 reconstrói tudo
+INSERT INTO alteracao (tabela, chave, operacao, dados)
+SELECT 'colaborador', id::text, 'I', to_jsonb(c) FROM colaborador c
+WHERE NOT EXISTS (SELECT 1 FROM alteracao WHERE tabela = 'colaborador');
+INSERT INTO alteracao (tabela, chave, operacao, dados)
+SELECT 'renda_mensal', id::text, 'I', to_jsonb(r) FROM renda_mensal r
+WHERE NOT EXISTS (SELECT 1 FROM alteracao WHERE tabela = 'renda_mensal');
+INSERT INTO alteracao (tabela, chave, operacao, dados)
+SELECT 'despesa', id::text, 'I', to_jsonb(d) FROM despesa d
+WHERE NOT EXISTS (SELECT 1 FROM alteracao WHERE tabela = 'despesa');
+INSERT INTO alteracao (tabela, chave, operacao, dados)
+SELECT 'divisao_mensal', mes_ano, 'I', to_jsonb(dm) - 'snapshot' FROM divisao_mensal dm
+WHERE NOT EXISTS (SELECT 1 FROM alteracao WHERE tabela = 'divisao_mensal');
@@ -0,0 +1,13 @@
+-- Migration 009: Tokens JWT revogados (logout), compartilhados entre workers
+-- Substitui o set em memória de routes/auth.py, que cada worker tinha o seu.
+-- Cada linha vale até o `exp` do próprio token: depois disso o token já é
+-- recusado por expiração e a linha é apagada em segundo plano
+-- (utils/tokens.purgar_expirados, a cada TOKEN_PURGE_INTERVAL segundos).
+
+CREATE TABLE IF NOT EXISTS token_revogado (
+    jti TEXT PRIMARY KEY,
+    expira_em TIMESTAMPTZ NOT NULL,
+    revogado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_token_revogado_expira_em ON token_revogado (expira_em);
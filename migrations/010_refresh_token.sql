@@ -0,0 +1,19 @@
+-- Migration 010: Refresh tokens rotativos (POST /api/auth/refresh)
+-- O login emite um refresh token; cada uso o troca por um novo da mesma
+-- família e marca o anterior como usado. Apresentar de novo um token já
+-- usado (vazado e reaproveitado) revoga a família inteira.
+--
+-- Só o SHA-256 do jti é guardado: um dump da tabela não vale como token.
+-- Linhas vencidas de um usuário são apagadas no próximo login dele.
+
+CREATE TABLE IF NOT EXISTS refresh_token (
+    jti_hash CHAR(64) PRIMARY KEY,
+    usuario_id INTEGER NOT NULL REFERENCES usuario(id) ON DELETE CASCADE,
+    familia UUID NOT NULL,
+    expira_em TIMESTAMPTZ NOT NULL,
+    usado_em TIMESTAMPTZ,
+    criado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_refresh_token_familia ON refresh_token (familia);
+CREATE INDEX IF NOT EXISTS idx_refresh_token_usuario_expira ON refresh_token (usuario_id, expira_em);
@@ -0,0 +1,38 @@
+-- Migration 011: Avisa os workers quando um usuário muda
+-- Cada worker guarda em memória os usuários ativos (utils/usuarios.py) para
+-- resolver o JWT de cada request sem ir ao banco. Qualquer UPDATE/DELETE em
+-- usuario — inclusive feito direto no SQL, como desativar uma conta —
+-- publica os ids no canal de invalidação (utils/invalidation.py), entregue
+-- no commit. Acima de 500 ids a mensagem manda limpar o cache inteiro, para
+-- caber no limite de 8000 bytes do NOTIFY.
+
+CREATE OR REPLACE FUNCTION usuario_notify_trigger() RETURNS trigger AS $$
+DECLARE
+    ids integer[];
+BEGIN
+    SELECT array_agg(DISTINCT id) INTO ids FROM antigas;
+    IF ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify(
+        'controle_familiar_invalidacao',
+        json_build_object(
+            'topic', 'usuarios',
+            'data', CASE WHEN cardinality(ids) <= 500 THEN json_build_object('ids', ids) END
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_usuario_notify_upd ON usuario;
+CREATE TRIGGER trg_usuario_notify_upd
+    AFTER UPDATE ON usuario
+    REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION usuario_notify_trigger();
+
+DROP TRIGGER IF EXISTS trg_usuario_notify_del ON usuario;
+CREATE TRIGGER trg_usuario_notify_del
+    AFTER DELETE ON usuario
+    REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION usuario_notify_trigger();
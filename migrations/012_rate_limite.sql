@@ -0,0 +1,17 @@
+-- Migration 012: Contadores compartilhados do rate limit (RATE_LIMIT_SHARED=true)
+-- Uma linha por chave (endpoint|período|escopo|ip ou usuário) e janela fixa;
+-- utils/rate_limit.py incrementa com upsert e estima a janela deslizante com
+-- a janela anterior. Só é usada com RATE_LIMIT_SHARED ligado.
+--
+-- UNLOGGED: perder os contadores num crash só zera os limites. Linhas
+-- vencidas são apagadas periodicamente pelos próprios workers.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limite (
+    chave TEXT NOT NULL,
+    janela BIGINT NOT NULL,
+    contagem INTEGER NOT NULL,
+    expira_em TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (chave, janela)
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limite_expira ON rate_limite (expira_em);
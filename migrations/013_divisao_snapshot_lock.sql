@@ -0,0 +1,71 @@
+-- Migration 013: Serializa o snapshot da divisão com as escritas do mês
+-- Os triggers da migration 003 só marcam snapshots que já existem: uma
+-- despesa gravada entre o cálculo do resumo e a gravação do primeiro
+-- snapshot do mês ficava fora dele sem ser sinalizada.
+--
+-- Agora cada statement em despesa/renda_mensal toma um advisory lock
+-- compartilhado por mês afetado (até o fim da transação), e
+-- POST /api/divisao/<mes>/marcar-pago toma o mesmo lock exclusivo antes de
+-- calcular: a marcação espera as escritas em andamento do mês, e escritas
+-- que chegam durante a marcação esperam por ela e então marcam o snapshot
+-- como desatualizado. A chave é divisao_lock_chave(mes).
+
+CREATE OR REPLACE FUNCTION divisao_lock_chave(mes TEXT) RETURNS BIGINT AS $$
+    SELECT hashtext('divisao_mensal:' || mes)::bigint
+$$ LANGUAGE sql IMMUTABLE;
+
+
+CREATE OR REPLACE FUNCTION divisao_snapshot_despesa_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM pg_advisory_xact_lock_shared(divisao_lock_chave(mes))
+        FROM (SELECT DISTINCT mes_vigente AS mes FROM novas ORDER BY 1) m;
+        UPDATE divisao_mensal SET snapshot_desatualizado = true
+        WHERE snapshot IS NOT NULL AND NOT snapshot_desatualizado
+          AND mes_ano IN (SELECT mes_vigente FROM novas);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM pg_advisory_xact_lock_shared(divisao_lock_chave(mes))
+        FROM (SELECT DISTINCT mes_vigente AS mes FROM antigas ORDER BY 1) m;
+        UPDATE divisao_mensal SET snapshot_desatualizado = true
+        WHERE snapshot IS NOT NULL AND NOT snapshot_desatualizado
+          AND mes_ano IN (SELECT mes_vigente FROM antigas);
+    ELSE
+        PERFORM pg_advisory_xact_lock_shared(divisao_lock_chave(mes))
+        FROM (SELECT mes_vigente AS mes FROM novas
+              UNION SELECT mes_vigente FROM antigas ORDER BY 1) m;
+        UPDATE divisao_mensal SET snapshot_desatualizado = true
+        WHERE snapshot IS NOT NULL AND NOT snapshot_desatualizado
+          AND mes_ano IN (SELECT mes_vigente FROM novas
+                          UNION SELECT mes_vigente FROM antigas);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION divisao_snapshot_renda_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM pg_advisory_xact_lock_shared(divisao_lock_chave(mes))
+        FROM (SELECT DISTINCT mes_ano AS mes FROM novas ORDER BY 1) m;
+        UPDATE divisao_mensal SET snapshot_desatualizado = true
+        WHERE snapshot IS NOT NULL AND NOT snapshot_desatualizado
+          AND mes_ano IN (SELECT mes_ano FROM novas);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM pg_advisory_xact_lock_shared(divisao_lock_chave(mes))
+        FROM (SELECT DISTINCT mes_ano AS mes FROM antigas ORDER BY 1) m;
+        UPDATE divisao_mensal SET snapshot_desatualizado = true
+        WHERE snapshot IS NOT NULL AND NOT snapshot_desatualizado
+          AND mes_ano IN (SELECT mes_ano FROM antigas);
+    ELSE
+        PERFORM pg_advisory_xact_lock_shared(divisao_lock_chave(mes))
+        FROM (SELECT mes_ano AS mes FROM novas
+              UNION SELECT mes_ano FROM antigas ORDER BY 1) m;
+        UPDATE divisao_mensal SET snapshot_desatualizado = true
+        WHERE snapshot IS NOT NULL AND NOT snapshot_desatualizado
+          AND mes_ano IN (SELECT mes_ano FROM novas
+                          UNION SELECT mes_ano FROM antigas);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,35 @@
+-- Migration 014: Cursor de GET /api/changes por (xid, id)
+-- A regra da migration 008 (parar na primeira linha com xid >= xmin) só
+-- enxerga linhas visíveis: uma transação ainda aberta com id menor não
+-- aparece, não interrompe a página e seu id fica para trás do cursor para
+-- sempre. Ex.: T2 grava id 5, T1 grava id 6 e segue aberta, T2 grava id 7 e
+-- commita; o feed entregava 5 e 7, e o 6 nunca.
+--
+-- Agora só saem linhas de transações já terminadas (xid < xmin do
+-- snapshot), em ordem de (xid, id), e o cursor é esse par. Toda transação
+-- que ainda vai commitar tem xid >= xmin, maior que qualquer xid já
+-- entregue, então nada pode surgir atrás do cursor. Cursores antigos (só
+-- o id) recebem 410 CURSOR_EXPIRED e o cliente sincroniza do zero.
+
+CREATE INDEX IF NOT EXISTS idx_alteracao_xid_id ON alteracao (xid, id);
+DROP INDEX IF EXISTS idx_alteracao_xid;
+
+-- Horizonte de purga também em (xid, id); ate_xid = 0 mantém o horizonte
+-- antigo valendo para o cursor inicial (0)
+ALTER TABLE alteracao_purga ADD COLUMN IF NOT EXISTS ate_xid BIGINT NOT NULL DEFAULT 0;
+
+
+-- Remove as alterações anteriores a `antes` e avança o horizonte de purga
+-- até o maior (xid, id) removido. Devolve quantas linhas saíram.
+CREATE OR REPLACE FUNCTION purgar_alteracoes(antes TIMESTAMPTZ) RETURNS BIGINT AS $$
+    WITH removidas AS (
+        DELETE FROM alteracao WHERE criado_em < antes RETURNING xid, id
+    ),
+    horizonte AS (
+        UPDATE alteracao_purga p
+        SET ate_xid = u.xid, ate = u.id
+        FROM (SELECT xid, id FROM removidas ORDER BY xid DESC, id DESC LIMIT 1) u
+        WHERE (u.xid, u.id) > (p.ate_xid, p.ate)
+    )
+    SELECT COUNT(*) FROM removidas
+$$ LANGUAGE sql;
@@ -0,0 +1,144 @@
+# routes/alteracoes.py
+"""
+Change feed for incremental client sync - Protected with JWT authentication.
+
+All endpoints require valid JWT token.
+"""
+import json
+import logging
+import re
+from decimal import Decimal
+
+from flask import Blueprint, current_app, request
+from flask_jwt_extended import jwt_required
+
+from connection import get_db_cursor
+from utils.json_utils import json_response
+
+logger = logging.getLogger(__name__)
+alteracoes_bp = Blueprint('alteracoes', __name__)
+
+# Rows of alteracao after the cursor, in (xid, id) order, from transactions
+# that have already finished (xid below the snapshot's xmin). Every
+# transaction that may still commit has xid >= xmin, above anything handed
+# out, so nothing can show up behind a cursor later
+# (migrations/014_alteracao_cursor_xid.sql). The purge horizon rides along,
+# so an up-to-date client costs one round trip and an empty index scan.
+ALTERACOES_SQL = """
+    SELECT p.ate_xid AS purga_xid, p.ate AS purga, a.*
+    FROM alteracao_purga p
+    LEFT JOIN LATERAL (
+        SELECT xid, id, tabela, chave, operacao, dados::text AS dados
+        FROM alteracao
+        WHERE (xid, id) > (%s, %s)
+          AND xid < txid_snapshot_xmin(txid_current_snapshot())
+        ORDER BY xid, id
+        LIMIT %s
+    ) a ON true
+    ORDER BY a.xid, a.id
+"""
+
+# Current cursor: everything from transactions below xmin is already done
+CABECA_SQL = "SELECT txid_snapshot_xmin(txid_current_snapshot()) AS xmin"
+
+CURSOR_RE = re.compile(r'^(\d+):(\d+)$')
+
+
+def _error_response(message: str, code: str, status: int = 400):
+    return json_response({'error': message, 'code': code}, status)
+
+
+def _success_response(data, status: int = 200):
+    return json_response(data, status)
+
+
+def _codificar_cursor(xid: int, id: int) -> str:
+    return f"{xid}:{id}"
+
+
+def _alteracao(row: dict) -> dict:
+    return {
+        'seq': row['id'],
+        'tabela': row['tabela'],
+        'chave': row['chave'],
+        'operacao': row['operacao'],
+        # Parsed here so valores keep their exact Decimal (sent as strings)
+        'dados': json.loads(row['dados'], parse_float=Decimal) if row['dados'] else None,
+    }
+
+
+@alteracoes_bp.route('/changes', methods=['GET'])
+@jwt_required()
+def listar_alteracoes():
+    """
+    Changes to despesa, renda_mensal, colaborador and divisao_mensal after a cursor.
+
+    Sync protocol:
+        1. ``GET /changes`` (no ``since``) returns only the current cursor;
+           the client then loads the lists it needs.
+        2. ``GET /changes?since=<cursor>`` returns what changed afterwards,
+           oldest first, in pages of ``?limit=`` entries. Each entry carries
+           the whole new row (operacao I/U) or is a tombstone (D, dados
+           null); entries are idempotent, so replaying some is harmless.
+        3. Repeat with the returned ``cursor`` while ``tem_mais`` is true.
+
+    Cursors are opaque ``<xid>:<id>`` strings (``0`` = the whole log). A
+    cursor older than the last purge, or an id-only cursor issued before
+    migration 014, gets 410 CURSOR_EXPIRED: the client must reload from
+    step 1.
+    """
+    since = request.args.get('since')
+    limit = request.args.get('limit')
+
+    tamanho = current_app.config.get('CHANGES_PAGE_SIZE', 500)
+    if limit:
+        maximo = current_app.config.get('CHANGES_PAGE_MAX', 5000)
+        if not limit.isdigit() or not (1 <= int(limit) <= maximo):
+            return _error_response(f'limit deve estar entre 1 e {maximo}', 'INVALID_LIMIT')
+        tamanho = int(limit)
+    if since == '0':
+        since = (0, 0)  # From the start of the log
+    elif since is not None:
+        if since.isdigit():
+            # Cursor from before migration 014 (id only): can't be placed safely
+            return _error_response(
+                'Cursor em formato antigo; sincronize do zero', 'CURSOR_EXPIRED', 410
+            )
+        match = CURSOR_RE.match(since)
+        if not match:
+            return _error_response('Cursor inválido', 'INVALID_CURSOR')
+        since = (int(match.group(1)), int(match.group(2)))
+
+    try:
+        with get_db_cursor(commit=False, readonly=True) as cur:
+            if since is None:
+                cur.execute(CABECA_SQL)
+                cabeca = _codificar_cursor(cur.fetchone()['xmin'], 0)
+                return _success_response({'alteracoes': [], 'cursor': cabeca, 'tem_mais': False})
+
+            # One extra row tells whether there's a next page
+            cur.execute(ALTERACOES_SQL, (*since, tamanho + 1))
+            rows = cur.fetchall()
+
+        if rows and since < (rows[0]['purga_xid'], rows[0]['purga']):
+            return _error_response(
+                'Cursor anterior à última limpeza do log; sincronize do zero',
+                'CURSOR_EXPIRED', 410
+            )
+        rows = [row for row in rows if row['id'] is not None]
+
+        tem_mais = len(rows) > tamanho
+        rows = rows[:tamanho]
+        ultima = (rows[-1]['xid'], rows[-1]['id']) if rows else since
+        cursor = _codificar_cursor(*ultima)
+        response = _success_response({
+            'alteracoes': [_alteracao(row) for row in rows],
+            'cursor': cursor,
+            'tem_mais': tem_mais,
+        })
+        response.headers['X-Next-Cursor'] = cursor
+        return response
+
+    except Exception as e:
+        logger.error(f"ERRO GET /api/changes: {str(e)}", exc_info=True)
+        return _error_response('Erro ao buscar alterações', 'FETCH_FAILED', 500)
@@ -3,43 +3,114 @@
 Authentication routes for Controle Financeiro Familiar API.
 
 Security features:
-- Password hashing with werkzeug (PBKDF2)
+- Password hashing with werkzeug, in a per-worker process pool (utils/senhas.py)
 - Input validation (email, username, password strength)
 - JWT token generation with claims
 - Standardized error responses
-- Token blacklist for logout (in-memory, Redis recommended for production)
+- Token revocation on logout, shared by every worker (utils/tokens.py)
+- Rotating refresh tokens with reuse detection, stored hashed (refresh_token)
 """
+import hashlib
 import re
 import logging
+import uuid
 from datetime import timedelta
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import (
     create_access_token,
+    create_refresh_token,
+    current_user,
+    decode_token,
     jwt_required,
     get_jwt_identity,
     get_jwt,
     verify_jwt_in_request
 )
-from werkzeug.security import generate_password_hash, check_password_hash
-
 from connection import get_db_connection, get_db_cursor
 from psycopg2.extras import RealDictCursor
+from utils import rate_limit
+from utils.senhas import HashIndisponivel, password_hasher
+from utils.tokens import revogar_token, token_blocklist
+from utils.usuarios import buscar_usuario
 
 logger = logging.getLogger(__name__)
 auth_bp = Blueprint('auth', __name__)
 
-# In-memory token blacklist (use Redis in production)
-_token_blacklist: set[str] = set()
+
+# Rotate a refresh token in one statement: mark the presented token used
+# and insert its successor in the same family. Presenting a token that was
+# already used (stolen and replayed, or replayed by the thief's victim)
+# deletes the whole family, logging both parties out.
+ROTACIONAR_REFRESH_SQL = """
+    WITH atual AS (
+        UPDATE refresh_token
+        SET usado_em = now()
+        WHERE jti_hash = %(jti_hash)s AND usado_em IS NULL AND expira_em > now()
+        RETURNING usuario_id, familia
+    ),
+    novo AS (
+        INSERT INTO refresh_token (jti_hash, usuario_id, familia, expira_em)
+        SELECT %(novo_hash)s, a.usuario_id, a.familia, to_timestamp(%(novo_exp)s)
+        FROM atual a
+        JOIN usuario u ON u.id = a.usuario_id AND u.ativo
+        RETURNING usuario_id
+    ),
+    reuso AS (
+        DELETE FROM refresh_token r
+        USING refresh_token usado
+        WHERE usado.jti_hash = %(jti_hash)s
+          AND usado.usado_em IS NOT NULL
+          AND r.familia = usado.familia
+          AND NOT EXISTS (SELECT 1 FROM atual)
+        RETURNING r.jti_hash
+    )
+    SELECT u.id, u.username, (SELECT COUNT(*) FROM reuso) AS revogados,
+           EXISTS (SELECT 1 FROM atual) AS marcado
+    FROM (SELECT 1) x
+    LEFT JOIN novo n ON true
+    LEFT JOIN usuario u ON u.id = n.usuario_id
+"""
+
+# Second look when ROTACIONAR_REFRESH_SQL neither rotated nor revoked: if a
+# concurrent refresh used the same token, this statement's UPDATE waited
+# for it and then skipped the row, but `reuso` still read the snapshot
+# from before that commit. A fresh statement sees the row as used.
+REVOGAR_FAMILIA_REUSADA_SQL = """
+    DELETE FROM refresh_token r
+    USING refresh_token usado
+    WHERE usado.jti_hash = %(jti_hash)s
+      AND usado.usado_em IS NOT NULL
+      AND r.familia = usado.familia
+"""
+
+
+def _hash_jti(jti: str) -> str:
+    return hashlib.sha256(jti.encode()).hexdigest()
+
+
+def _novo_access_token(user_id, username: str, familia: str) -> str:
+    return create_access_token(
+        identity=str(user_id),
+        # fam: refresh token family, revoked by logout
+        additional_claims={'username': username, 'fam': familia},
+        expires_delta=timedelta(hours=current_app.config.get('JWT_ACCESS_TOKEN_EXPIRES_HOURS', 1))
+    )
 
 
-def _add_to_blacklist(jti: str) -> None:
-    """Add token JTI to blacklist."""
-    _token_blacklist.add(jti)
+def _novo_refresh_token(user_id, familia: str) -> tuple[str, str, int]:
+    """A new refresh token, its jti hash and its exp."""
+    token = create_refresh_token(
+        identity=str(user_id),
+        additional_claims={'fam': familia},
+        expires_delta=timedelta(days=current_app.config.get('JWT_REFRESH_TOKEN_EXPIRES_DAYS', 30))
+    )
+    claims = decode_token(token)
+    return token, _hash_jti(claims['jti']), claims['exp']
 
 
 def _is_blacklisted(jti: str) -> bool:
-    """Check if token JTI is blacklisted."""
-    return jti in _token_blacklist
+    """Check if token JTI was revoked (in-memory mirror of token_revogado)."""
+    return token_blocklist.revogado(lambda: get_db_cursor(commit=False), jti)
 
 
 def _validate_email(email: str) -> bool:
@@ -87,6 +158,15 @@ def _success_response(data: dict, status: int = 200) -> tuple:
     return jsonify(data), status
 
 
+def _busy_response() -> tuple:
+    """503 while the password hashing pool is saturated."""
+    return (
+        jsonify({'error': 'Servidor ocupado, tente novamente em instantes', 'code': 'AUTH_BUSY'}),
+        503,
+        {'Retry-After': str(current_app.config.get('PASSWORD_HASH_RETRY_AFTER', 2))},
+    )
+
+
 # ─── REGISTRO ─────────────────────────────────────────────
 @auth_bp.route('/auth/register', methods=['POST', 'OPTIONS'])
 def register():
@@ -115,8 +195,12 @@ def register():
     if not valid:
         return _error_response(msg, 'WEAK_PASSWORD')
 
-    # Hash password
-    password_hash = generate_password_hash(password)
+    # Hash password (off the request thread)
+    try:
+        password_hash = password_hasher.gerar(password)
+    except HashIndisponivel as e:
+        logger.warning(f"Registro recusado: {e}")
+        return _busy_response()
 
     try:
         with get_db_cursor() as cur:
@@ -144,6 +228,22 @@ def register():
         return _error_response('Erro interno ao criar conta', 'REGISTRATION_FAILED', 500)
 
 
+def _atualizar_hash(user: dict, password: str) -> None:
+    """Re-hash a just-verified password with the configured method/cost (best effort)."""
+    try:
+        novo_hash = password_hasher.gerar(password)
+        with get_db_cursor() as cur:
+            # Skipped if the password changed concurrently
+            cur.execute(
+                "UPDATE usuario SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                (novo_hash, user['id'], user['password_hash'])
+            )
+        logger.info(f"Hash de senha atualizado (id={user['id']})")
+    except Exception as e:
+        # The login itself succeeded; the upgrade is retried on the next one
+        logger.warning(f"Falha ao atualizar hash de senha (id={user['id']}): {e}")
+
+
 # ─── LOGIN ───────────────────────────────────────────────
 @auth_bp.route('/auth/login', methods=['POST', 'OPTIONS'])
 def login():
@@ -166,20 +266,32 @@ def login():
                 cur.execute("SELECT * FROM usuario WHERE username = %s AND ativo = true", (username,))
                 user = cur.fetchone()
 
-        if not user or not check_password_hash(user['password_hash'], password):
+        if not user or not password_hasher.verificar(user['password_hash'], password):
             logger.warning(f"Tentativa de login falhada para: {username}")
+            rate_limit.registrar_falha()
             return _error_response('Credenciais inválidas', 'INVALID_CREDENTIALS', 401)
 
-        # Create access token with user claims
-        access_token = create_access_token(
-            identity=str(user['id']),
-            additional_claims={'username': user['username']},
-            expires_delta=timedelta(hours=current_app.config.get('JWT_ACCESS_TOKEN_EXPIRES_HOURS', 1))
-        )
+        if password_hasher.precisa_rehash(user['password_hash']):
+            _atualizar_hash(user, password)
+
+        # Access token plus the first refresh token of a new family
+        familia = str(uuid.uuid4())
+        access_token = _novo_access_token(user['id'], user['username'], familia)
+        refresh_token, jti_hash, exp = _novo_refresh_token(user['id'], familia)
+        with get_db_cursor() as cur:
+            cur.execute(
+                "DELETE FROM refresh_token WHERE usuario_id = %s AND expira_em < now()",
+                (user['id'],)
+            )
+            cur.execute("""
+                INSERT INTO refresh_token (jti_hash, usuario_id, familia, expira_em)
+                VALUES (%s, %s, %s, to_timestamp(%s))
+            """, (jti_hash, user['id'], familia, exp))
 
         logger.info(f"Login bem-sucedido: {username} (id={user['id']})")
         return _success_response({
             'access_token': access_token,
+            'refresh_token': refresh_token,
             'user': {
                 'id': user['id'],
                 'username': user['username'],
@@ -187,6 +299,9 @@ def login():
             }
         })
 
+    except HashIndisponivel as e:
+        logger.warning(f"Login recusado: {e}")
+        return _busy_response()
     except Exception as e:
         logger.error(f"Erro no login: {e}")
         return _error_response('Erro interno no servidor', 'LOGIN_FAILED', 500)
@@ -196,17 +311,15 @@ def login():
 @auth_bp.route('/auth/status', methods=['GET'])
 @jwt_required()
 def auth_status():
-    """Verify current token validity and return user info."""
-    try:
-        current_user_id = get_jwt_identity()
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT id, username, email FROM usuario WHERE id = %s AND ativo = true", (current_user_id,))
-                user = cur.fetchone()
-
-        if not user:
-            return _error_response('Usuário não encontrado ou inativo', 'USER_NOT_FOUND', 401)
+    """
+    Verify current token validity and return user info.
 
+    The user was already resolved from the token by the JWT user lookup
+    (cached per worker, utils/usuarios.py); missing or inactive users never
+    get here.
+    """
+    try:
+        user = current_user
         return _success_response({
             'logged_in': True,
             'user': {
@@ -225,10 +338,14 @@ def auth_status():
 @auth_bp.route('/auth/logout', methods=['POST'])
 @jwt_required()
 def logout():
-    """Logout - adds token to blacklist."""
+    """Logout - revokes the token for every worker until it expires, and its refresh tokens."""
     try:
-        jti = get_jwt()['jti']
-        _add_to_blacklist(jti)
+        claims = get_jwt()
+        jti = claims['jti']
+        with get_db_cursor() as cur:
+            revogar_token(cur, jti, claims['exp'])
+            if claims.get('fam'):
+                cur.execute("DELETE FROM refresh_token WHERE familia = %s", (claims['fam'],))
         logger.info(f"Token revogado (jti={jti[:8]}...)")
         return _success_response({'message': 'Logout bem-sucedido'})
     except Exception as e:
@@ -236,28 +353,48 @@ def logout():
         return _error_response('Erro interno', 'LOGOUT_FAILED', 500)
 
 
-# ─── TOKEN REFRESH (OPTIONAL) ────────────────────────────
+# ─── TOKEN REFRESH ───────────────────────────────────────
 @auth_bp.route('/auth/refresh', methods=['POST'])
 @jwt_required(refresh=True)
 def refresh():
-    """Generate new access token using refresh token."""
-    try:
-        current_user_id = get_jwt_identity()
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT username FROM usuario WHERE id = %s AND ativo = true", (current_user_id,))
-                user = cur.fetchone()
+    """
+    Trade a refresh token for a new access token and a new refresh token.
 
-        if not user:
-            return _error_response('Usuário não encontrado', 'USER_NOT_FOUND', 401)
+    Each refresh token works once (ROTACIONAR_REFRESH_SQL, one primary key
+    lookup, no password check); replaying a used one revokes its family,
+    including when both uses arrive at the same time.
+    """
+    try:
+        claims = get_jwt()
+        familia = claims.get('fam')
+        if not familia:
+            return _error_response('Refresh token inválido', 'REFRESH_TOKEN_INVALID', 401)
 
-        access_token = create_access_token(
-            identity=str(current_user_id),
-            additional_claims={'username': user['username']},
-            expires_delta=timedelta(hours=current_app.config.get('JWT_ACCESS_TOKEN_EXPIRES_HOURS', 1))
-        )
+        refresh_token, novo_hash, novo_exp = _novo_refresh_token(get_jwt_identity(), familia)
+        jti_hash = _hash_jti(claims['jti'])
+        with get_db_cursor() as cur:
+            cur.execute(ROTACIONAR_REFRESH_SQL, {
+                'jti_hash': jti_hash,
+                'novo_hash': novo_hash,
+                'novo_exp': novo_exp,
+            })
+            rotacao = cur.fetchone()
+            revogados = rotacao['revogados']
+            if not rotacao['marcado'] and not revogados:
+                cur.execute(REVOGAR_FAMILIA_REUSADA_SQL, {'jti_hash': jti_hash})
+                revogados = cur.rowcount
+
+        if revogados:
+            logger.warning(f"Refresh token reutilizado: família {familia[:8]}... revogada "
+                           f"({revogados} token(s), usuário {get_jwt_identity()})")
+            return _error_response('Refresh token já utilizado; faça login novamente', 'REFRESH_TOKEN_REUSED', 401)
+        if not rotacao['id']:
+            return _error_response('Refresh token inválido ou expirado', 'REFRESH_TOKEN_INVALID', 401)
 
-        return _success_response({'access_token': access_token})
+        return _success_response({
+            'access_token': _novo_access_token(rotacao['id'], rotacao['username'], familia),
+            'refresh_token': refresh_token,
+        })
 
     except Exception as e:
         logger.error(f"Erro ao renovar token: {e}")
@@ -267,11 +404,18 @@ def refresh():
 # ─── BLACKLIST CHECK (used by JWT) ───────────────────────
 @auth_bp.record_once
 def _load_jwt_blacklist_check(state):
-    """Register token blacklist callback with JWT manager."""
+    """Register token blacklist and user lookup callbacks with the app's JWT manager."""
     from flask_jwt_extended import JWTManager
-    jwt = JWTManager(state.app)
+    # Reuse the app's manager: a new one would replace it and drop the
+    # error handlers registered in create_app()
+    jwt = state.app.extensions.get('flask-jwt-extended') or JWTManager(state.app)
 
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
         jti = jwt_payload['jti']
-        return _is_blacklisted(jti)
\ No newline at end of file
+        return _is_blacklisted(jti)
+
+    @jwt.user_lookup_loader
+    def load_current_user(jwt_header, jwt_payload):
+        # None makes flask-jwt-extended answer with user_lookup_error_loader
+        return buscar_usuario(lambda: get_db_cursor(commit=False), int(jwt_payload['sub']))
\ No newline at end of file
@@ -5,10 +5,14 @@ Colaboradores routes - Protected with JWT authentication.
 All endpoints require valid JWT token.
 Users can only access their own family's collaborators (future: multi-family support).
 """
+from datetime import date
 from flask import Blueprint, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from connection import get_db_connection, get_db_cursor
 from psycopg2.extras import RealDictCursor
+from utils.cache import TODOS_GRUPOS, cached_response, invalidar
+from utils.colaboradores import invalidar_colaboradores
+from utils.columnar import campos_solicitados, lista_response, select_list
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,23 +29,96 @@ def _success_response(data: dict, status: int = 200):
     return json_response(data, status)
 
 
+# ?fields= of GET /colaboradores -> SQL expression
+CAMPOS_COLABORADOR = {
+    'id': 'id',
+    'nome': 'nome',
+    'dia_fechamento': 'dia_fechamento',
+}
+
+
 def _get_current_user_id() -> int:
     """Get current user ID from JWT identity."""
     return int(get_jwt_identity())
 
 
+# Re-apply the closing day to a colaborador's credit despesas in one UPDATE.
+# calcular_mes_vigente() is the SQL twin of utils/date_utils.calcular_mes_vigente
+# (migrations/007_despesa_recorrente.sql); installment k stays k-1 months after
+# the first one. Only rows whose month actually changes are written, and the
+# statement-level triggers keep despesa_agregado_mensal and the snapshot flags
+# in step.
+RECALCULAR_MES_VIGENTE_SQL = """
+    WITH movidas AS (
+        UPDATE despesa d
+        SET mes_vigente = n.novo
+        FROM (
+            SELECT id, mes_vigente AS anterior,
+                   to_char(
+                       to_date(calcular_mes_vigente(data_compra, tipo_pg, %(dia)s), 'YYYY-MM')
+                       + (coalesce(parcela_numero, 1) - 1) * interval '1 month',
+                       'YYYY-MM') AS novo
+            FROM despesa
+            WHERE colaborador_id = %(colaborador_id)s
+              AND tipo_pg = 'credito'
+              AND data_compra >= %(desde)s
+            FOR UPDATE
+        ) n
+        WHERE d.id = n.id AND n.novo <> n.anterior
+        RETURNING n.anterior, n.novo
+    )
+    SELECT anterior AS de, novo AS para, COUNT(*) AS quantidade
+    FROM movidas
+    GROUP BY anterior, novo
+    ORDER BY anterior, novo
+"""
+
+
+def recalcular_mes_vigente(cur, colaborador_id: int, dia_fechamento: int, desde: date = date.min) -> dict:
+    """
+    Recompute mes_vigente of a colaborador's credit despesas bought on/after `desde`.
+
+    Returns:
+        dict: despesas (rows moved), meses (every month that lost or gained
+            rows) and movimentos ({"de", "para", "quantidade"})
+    """
+    cur.execute(RECALCULAR_MES_VIGENTE_SQL, {
+        'colaborador_id': colaborador_id,
+        'dia': dia_fechamento,
+        'desde': desde,
+    })
+    movimentos = cur.fetchall()
+    return {
+        'despesas': sum(m['quantidade'] for m in movimentos),
+        'meses': sorted({m['de'] for m in movimentos} | {m['para'] for m in movimentos}),
+        'movimentos': movimentos,
+    }
+
+
 @colaboradores_bp.route('/colaboradores', methods=['GET'])
 @jwt_required()
+@cached_response('colaboradores')
 def listar_colaboradores():
-    """List all collaborators for the current user's family."""
+    """
+    List all collaborators for the current user's family.
+
+    Supports ``?fields=`` and the columnar format (utils/columnar.py).
+    """
     try:
         logger.info("GET /api/colaboradores - Iniciando")
-        with get_db_connection() as conn:
+        try:
+            campos = campos_solicitados(CAMPOS_COLABORADOR)
+        except ValueError as e:
+            return _error_response(str(e), 'INVALID_FIELDS')
+        with get_db_connection(readonly=True) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT id, nome, dia_fechamento FROM colaborador ORDER BY nome")
+                cur.execute(
+                    f"SELECT {select_list(campos or list(CAMPOS_COLABORADOR), CAMPOS_COLABORADOR)} "
+                    "FROM colaborador ORDER BY nome"
+                )
                 colaboradores = cur.fetchall()
         logger.info(f"GET /api/colaboradores - Encontrados {len(colaboradores)} registros")
-        return _success_response(colaboradores)
+        return lista_response(colaboradores, campos)
     except Exception as e:
         logger.error(f"ERRO GET /api/colaboradores: {str(e)}", exc_info=True)
         return _error_response('Erro ao buscar colaboradores', 'FETCH_FAILED', 500)
@@ -75,6 +152,8 @@ def criar_colaborador():
                 (nome, dia)
             )
             colaborador_id = cur.fetchone()['id']
+            invalidar(cur, TODOS_GRUPOS)
+            invalidar_colaboradores(cur)
 
         logger.info(f"Colaborador criado: {nome} (id={colaborador_id})")
         return _success_response({
@@ -119,11 +198,33 @@ def colaborador_por_id(id: int):
                 except (ValueError, TypeError):
                     return _error_response('dia_fechamento deve ser um número', 'INVALID_DAY')
 
+                # Credit despesas follow the new closing day: all of them, or
+                # only purchases from `recalcular_desde` on (YYYY-MM-DD);
+                # "recalcular": false keeps every mes_vigente as it is
+                desde = date.min
+                if data.get('recalcular_desde'):
+                    try:
+                        desde = date.fromisoformat(str(data['recalcular_desde']))
+                    except ValueError:
+                        return _error_response('recalcular_desde deve estar no formato YYYY-MM-DD', 'INVALID_DATE')
+                recalcular = data.get('recalcular', True) is not False and (
+                    dia != colaborador['dia_fechamento'] or bool(data.get('recalcular_desde'))
+                )
+
                 cur.execute(
                     "UPDATE colaborador SET nome = %s, dia_fechamento = %s WHERE id = %s",
                     (nome, dia, id)
                 )
-                return _success_response({"message": "Colaborador atualizado com sucesso"})
+                resultado = {"message": "Colaborador atualizado com sucesso"}
+                if recalcular:
+                    resultado['mes_vigente_recalculado'] = recalcular_mes_vigente(cur, id, dia, desde)
+                    logger.info(
+                        f"Colaborador {id}: dia_fechamento={dia}, "
+                        f"{resultado['mes_vigente_recalculado']['despesas']} despesa(s) mudaram de mês"
+                    )
+                invalidar(cur, TODOS_GRUPOS)
+                invalidar_colaboradores(cur)
+                return _success_response(resultado)
 
             else:  # DELETE
                 # Verificar despesas vinculadas
@@ -156,6 +257,8 @@ def colaborador_por_id(id: int):
                 
                 # Pode deletar com segurança
                 cur.execute("DELETE FROM colaborador WHERE id = %s", (id,))
+                invalidar(cur, TODOS_GRUPOS)
+                invalidar_colaboradores(cur)
                 return _success_response({"message": "Colaborador excluído com sucesso"})
 
     except Exception as e:
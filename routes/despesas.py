@@ -6,14 +6,23 @@ All endpoints require valid JWT token.
 """
 from decimal import Decimal, InvalidOperation
 from datetime import date
-from flask import Blueprint, request
+from urllib.parse import urlencode
+from flask import Blueprint, current_app, request
 from flask_jwt_extended import jwt_required
 from connection import get_db_connection, get_db_cursor
-from psycopg2.extras import RealDictCursor
-from utils.date_utils import calcular_mes_vigente
+from psycopg2.extras import RealDictCursor, execute_values
+from utils.cache import GRUPOS_DESPESA, cached_response, invalidar
+from utils.colaboradores import buscar_colaborador, buscar_colaboradores
+from utils.columnar import campos_solicitados, lista_response, select_list
+from utils.date_utils import adicionar_meses, calcular_mes_vigente
 from utils.json_utils import json_response
 from datetime import datetime
+from operator import itemgetter
+import base64
 import logging
+import uuid
+
+import psycopg2.errors
 
 logger = logging.getLogger(__name__)
 despesas_bp = Blueprint('despesas', __name__)
@@ -25,6 +34,39 @@ CATEGORIAS_VALIDAS = {
 
 TIPOS_PG_VALIDOS = {'credito', 'debito', 'pix', 'dinheiro', 'outros'}
 
+PARCELAS_MAX = 48
+
+# Columns written by POST /despesas and /despesas/batch (see linhas_despesa)
+INSERIR_DESPESAS_SQL = """
+    INSERT INTO despesa (
+        data_compra, mes_vigente, descricao, valor, tipo_pg, colaborador_id, categoria,
+        parcela_grupo, parcela_numero, parcela_total
+    ) VALUES %s RETURNING id, mes_vigente, valor, parcela_numero
+"""
+
+# Batch variant: each row carries its position in the batch (posicao). Ids
+# are drawn in a CTE so they can be matched back by posicao rather than by
+# RETURNING order, which PostgreSQL doesn't guarantee.
+INSERIR_DESPESAS_LOTE_SQL = """
+    WITH v AS (
+        SELECT nextval(pg_get_serial_sequence('despesa', 'id')) AS id, v.*
+        FROM (VALUES %s) AS v (
+            posicao, data_compra, mes_vigente, descricao, valor, tipo_pg, colaborador_id,
+            categoria, parcela_grupo, parcela_numero, parcela_total
+        )
+    ), inseridas AS (
+        INSERT INTO despesa (
+            id, data_compra, mes_vigente, descricao, valor, tipo_pg, colaborador_id, categoria,
+            parcela_grupo, parcela_numero, parcela_total
+        )
+        SELECT id, data_compra::date, mes_vigente, descricao, valor::numeric, tipo_pg,
+               colaborador_id::integer, categoria, parcela_grupo::uuid,
+               parcela_numero::smallint, parcela_total::smallint
+        FROM v
+    )
+    SELECT posicao, id FROM v
+"""
+
 
 def _error_response(message: str, code: str, status: int = 400):
     return json_response({'error': message, 'code': code}, status)
@@ -45,110 +87,634 @@ def normalizar_tipo_pg(tipo: str) -> str:
     return 'outros'
 
 
+class DespesaInvalida(Exception):
+    """A despesa payload failed validation."""
+
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+def validar_despesa(data) -> dict:
+    """
+    Validate and normalize a despesa payload (everything but the colaborador lookup).
+
+    Returns:
+        dict: data_compra (date), descricao, valor (Decimal), tipo_pg,
+            colaborador_id (int), categoria, parcelas (int, default 1)
+
+    Raises:
+        DespesaInvalida: With the same messages/codes as POST /despesas
+    """
+    if not isinstance(data, dict) or not data:
+        raise DespesaInvalida('Dados JSON inválidos', 'INVALID_JSON')
+
+    required = ['data_compra', 'descricao', 'valor', 'tipo_pg', 'colaborador_id', 'categoria']
+    missing = [f for f in required if not data.get(f)]
+    if missing:
+        raise DespesaInvalida(f'Campos obrigatórios faltando: {missing}', 'MISSING_FIELDS')
+
+    try:
+        data_compra = datetime.strptime(str(data['data_compra']).split('T')[0], '%Y-%m-%d').date()
+        valor = Decimal(str(data['valor']))
+        colab_id = int(data['colaborador_id'])
+    except (ValueError, TypeError, InvalidOperation):
+        raise DespesaInvalida('Dados inválidos (data, valor ou colaborador_id)', 'INVALID_DATA')
+    if not valor.is_finite() or valor <= Decimal('0'):
+        raise DespesaInvalida('Valor deve ser positivo', 'INVALID_VALUE')
+
+    # NOVA VALIDAÇÃO: data_compra não pode ser no futuro
+    if data_compra > date.today():
+        raise DespesaInvalida('Data da compra não pode ser no futuro', 'FUTURE_DATE')
+
+    tipo_pg = normalizar_tipo_pg(str(data['tipo_pg']))
+    categoria = data['categoria']
+
+    if tipo_pg not in TIPOS_PG_VALIDOS:
+        raise DespesaInvalida('tipo_pg inválido', 'INVALID_TIPO_PG')
+    if categoria not in CATEGORIAS_VALIDAS:
+        raise DespesaInvalida('categoria inválida', 'INVALID_CATEGORY')
+
+    parcelas = data.get('parcelas')
+    if parcelas is None:
+        parcelas = 1
+    if isinstance(parcelas, bool) or not isinstance(parcelas, int) or not (1 <= parcelas <= PARCELAS_MAX):
+        raise DespesaInvalida(f'parcelas deve estar entre 1 e {PARCELAS_MAX}', 'INVALID_INSTALLMENTS')
+    if valor * 100 < parcelas:
+        raise DespesaInvalida('Valor menor que um centavo por parcela', 'INVALID_VALUE')
+
+    return {
+        'data_compra': data_compra,
+        'descricao': data['descricao'],
+        'valor': valor,
+        'tipo_pg': tipo_pg,
+        'colaborador_id': colab_id,
+        'categoria': categoria,
+        'parcelas': parcelas,
+    }
+
+
+def dividir_parcelas(valor: Decimal, parcelas: int) -> list[Decimal]:
+    """Split valor into installments adding up to it exactly; the first one takes the leftover cents."""
+    centavos = int(valor.quantize(Decimal('0.01')) * 100)
+    base, resto = divmod(centavos, parcelas)
+    return [(Decimal(base + (resto if i == 0 else 0)) / 100).quantize(Decimal('0.01')) for i in range(parcelas)]
+
+
+def linhas_despesa(despesa: dict, dia_fechamento: int) -> list[tuple]:
+    """
+    Rows for INSERIR_DESPESAS_SQL from a validar_despesa() result.
+
+    A purchase in N installments becomes N rows sharing a new
+    parcela_grupo; installment k lands k-1 months after the first
+    installment's mes_vigente, so a closing day past the end of a short
+    month can never put two installments in the same month.
+    """
+    mes_vigente = calcular_mes_vigente(despesa['data_compra'], despesa['tipo_pg'], dia_fechamento)
+    conta = (despesa['tipo_pg'], despesa['colaborador_id'], despesa['categoria'])
+    n = despesa['parcelas']
+    if n == 1:
+        return [(despesa['data_compra'], mes_vigente, despesa['descricao'], despesa['valor'],
+                 *conta, None, None, None)]
+
+    grupo = str(uuid.uuid4())
+    return [
+        (despesa['data_compra'], adicionar_meses(mes_vigente, i), despesa['descricao'], valor,
+         *conta, grupo, i + 1, n)
+        for i, valor in enumerate(dividir_parcelas(despesa['valor'], n))
+    ]
+
+
+# ?fields= of GET /despesas -> SQL expression
+CAMPOS_DESPESA = {
+    'id': 'd.id',
+    'data_compra': 'd.data_compra',
+    'mes_vigente': 'd.mes_vigente',
+    'descricao': 'd.descricao',
+    'valor': 'd.valor',
+    'tipo_pg': 'd.tipo_pg',
+    'colaborador_id': 'd.colaborador_id',
+    'colaborador_nome': 'c.nome',
+    'categoria': 'd.categoria',
+    'parcela_grupo': 'd.parcela_grupo',
+    'parcela_numero': 'd.parcela_numero',
+    'parcela_total': 'd.parcela_total',
+    'recorrencia_id': 'd.recorrencia_id',
+    'recorrencia_data': 'd.recorrencia_data',
+}
+
+
+def _mes_filtrado() -> list | None:
+    """Months covered by GET /despesas (None = every month)."""
+    mes = request.args.get('mes_vigente')
+    return [mes] if mes else None
+
+
+def _codificar_cursor(data_compra: str, id: int, posicao: int) -> str:
+    """Opaque cursor: last row's (data_compra, id) and rows returned so far."""
+    raw = f"{data_compra}|{id}|{posicao}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decodificar_cursor(token: str) -> tuple[date, int, int]:
+    """
+    Decode a cursor from _codificar_cursor.
+
+    Raises:
+        ValueError: Malformed cursor
+    """
+    raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+    data_compra, id, posicao = raw.split('|')
+    return date.fromisoformat(data_compra), int(id), int(posicao)
+
+
 @despesas_bp.route('/despesas', methods=['GET'])
 @jwt_required()
+@cached_response('despesas', meses=lambda **kw: _mes_filtrado())
 def listar_despesas():
-    """List expenses, optionally filtered by month."""
+    """
+    List expenses, newest first, optionally filtered by month.
+
+    Keyset pagination on (data_compra DESC, id DESC): ``?limit=`` sets the
+    page size (default DESPESAS_PAGE_SIZE, at most DESPESAS_PAGE_MAX) and
+    ``?cursor=`` takes the X-Next-Cursor of the previous page, so every
+    page costs the same index range scan. ``?mes_vigente=`` without limit
+    or cursor still returns the whole month.
+
+    ``?fields=id,valor,...`` (see CAMPOS_DESPESA) selects only those
+    columns; ``Accept: application/vnd.controle.columnar+json`` returns
+    them column-oriented (utils/columnar.py).
+
+    X-Total-Count comes from despesa_agregado_mensal, not COUNT(*).
+    """
     try:
         logger.info("GET /api/despesas - Iniciando")
-        mes = request.args.get('mes_vigente')
+        try:
+            campos = campos_solicitados(CAMPOS_DESPESA)
+        except ValueError as e:
+            return _error_response(str(e), 'INVALID_FIELDS')
+        if campos is None:
+            colunas_sql = "d.*, c.nome AS colaborador_nome"
+        else:
+            # data_compra and id always come along: the next cursor needs them
+            colunas_sql = select_list(
+                list(dict.fromkeys(['id', 'data_compra', *campos])), CAMPOS_DESPESA
+            )
+        juntar_colaborador = campos is None or 'colaborador_nome' in campos
 
-        with get_db_connection() as conn:
+        mes = request.args.get('mes_vigente')
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit')
+
+        paginar = bool(limit or cursor or not mes)
+        tamanho = current_app.config.get('DESPESAS_PAGE_SIZE', 100)
+        if limit:
+            maximo = current_app.config.get('DESPESAS_PAGE_MAX', 500)
+            if not limit.isdigit() or not (1 <= int(limit) <= maximo):
+                return _error_response(f'limit deve estar entre 1 e {maximo}', 'INVALID_LIMIT')
+            tamanho = int(limit)
+
+        posicao = 0
+        filtros, params = [], []
+        if mes:
+            filtros.append("d.mes_vigente = %s")
+            params.append(mes)
+        if cursor:
+            try:
+                ultima_data, ultimo_id, posicao = _decodificar_cursor(cursor)
+            except ValueError:
+                return _error_response('Cursor inválido', 'INVALID_CURSOR')
+            filtros.append("(d.data_compra, d.id) < (%s, %s)")
+            params.extend([ultima_data, ultimo_id])
+        if paginar:
+            params.append(tamanho + 1)  # one extra row tells whether there's a next page
+
+        with get_db_connection(readonly=True) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                if mes:
-                    cur.execute("""
-                        SELECT d.*, c.nome AS colaborador_nome
-                        FROM despesa d
-                        JOIN colaborador c ON d.colaborador_id = c.id
-                        WHERE d.mes_vigente = %s
-                        ORDER BY d.data_compra DESC
-                    """, (mes,))
-                else:
-                    cur.execute("""
-                        SELECT d.*, c.nome AS colaborador_nome
-                        FROM despesa d
-                        JOIN colaborador c ON d.colaborador_id = c.id
-                        ORDER BY d.data_compra DESC
-                        LIMIT 100
-                    """)
+                cur.execute(f"""
+                    SELECT {colunas_sql}
+                    FROM despesa d
+                    {'JOIN colaborador c ON d.colaborador_id = c.id' if juntar_colaborador else ''}
+                    {'WHERE ' + ' AND '.join(filtros) if filtros else ''}
+                    ORDER BY d.data_compra DESC, d.id DESC
+                    {'LIMIT %s' if paginar else ''}
+                """, params)
                 despesas = cur.fetchall()
 
-        # Convert date to string, keep Decimal as-is (json_response handles it)
-        for d in despesas:
-            if d.get('data_compra'):
-                d['data_compra'] = d['data_compra'].strftime('%Y-%m-%d')
-
+                cur.execute(f"""
+                    SELECT COALESCE(SUM(quantidade), 0) AS total
+                    FROM despesa_agregado_mensal
+                    {'WHERE mes_vigente = %s' if mes else ''}
+                """, [mes] if mes else [])
+                total = cur.fetchone()['total']
+
+        proximo = None
+        if paginar and len(despesas) > tamanho:
+            despesas = despesas[:tamanho]
+            ultima = despesas[-1]
+            proximo = _codificar_cursor(
+                ultima['data_compra'].isoformat(), ultima['id'], posicao + len(despesas)
+            )
+
+        # Dates and Decimals are serialized as strings by lista_response
         logger.info(f"GET /api/despesas - Encontrados {len(despesas)} registros")
-        return _success_response(despesas)
+        response = lista_response(despesas, campos)
+        response.headers['X-Total-Count'] = str(total)
+        if despesas:
+            response.headers['Content-Range'] = f"despesas {posicao}-{posicao + len(despesas) - 1}/{total}"
+        else:
+            response.headers['Content-Range'] = f"despesas */{total}"
+        if proximo:
+            args = request.args.to_dict()
+            args.update(cursor=proximo, limit=str(tamanho))
+            response.headers['X-Next-Cursor'] = proximo
+            response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+        return response
 
     except Exception as e:
         logger.error(f"ERRO GET /api/despesas: {str(e)}", exc_info=True)
         return _error_response('Erro ao buscar despesas', 'FETCH_FAILED', 500)
 
 
-@despesas_bp.route('/despesas', methods=['POST'])
+# Search expressions: must match the indexes in migrations/005_despesa_busca.sql
+BUSCA_TSVECTOR = "to_tsvector('portuguese', f_unaccent(d.descricao))"
+BUSCA_TSQUERY = "websearch_to_tsquery('portuguese', f_unaccent(%(q)s))"
+BUSCA_NORMALIZADA = "lower(f_unaccent(d.descricao))"
+
+BUSCA_MIN_CARACTERES = 3
+
+
+class BuscaInvalida(Exception):
+    """A /despesas/search parameter is invalid."""
+
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+def _lista_arg(nome: str) -> list[str]:
+    """Repeatable and/or comma-separated query arg (?categoria=a,b&categoria=c)."""
+    return [v.strip() for valor in request.args.getlist(nome) for v in valor.split(',') if v.strip()]
+
+
+def _filtros_busca() -> tuple[list, dict]:
+    """
+    Parse the /despesas/search filters into SQL conditions and named params.
+
+    Raises:
+        BuscaInvalida: Invalid filter value
+    """
+    filtros, params = [], {}
+
+    q = ' '.join(request.args.get('q', '').split())
+    if q:
+        if len(q) < BUSCA_MIN_CARACTERES:
+            raise BuscaInvalida(f'q deve ter ao menos {BUSCA_MIN_CARACTERES} caracteres', 'QUERY_TOO_SHORT')
+        # Full-text match on whole words/stems, or substring via trigrams
+        filtros.append(
+            f"({BUSCA_TSVECTOR} @@ {BUSCA_TSQUERY}"
+            f" OR {BUSCA_NORMALIZADA} LIKE ('%%' || lower(f_unaccent(%(padrao)s)) || '%%'))"
+        )
+        params['q'] = q
+        params['padrao'] = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    categorias = _lista_arg('categoria')
+    if categorias:
+        if not set(categorias) <= CATEGORIAS_VALIDAS:
+            raise BuscaInvalida('categoria inválida', 'INVALID_CATEGORY')
+        filtros.append("d.categoria = ANY(%(categorias)s)")
+        params['categorias'] = categorias
+
+    tipos = _lista_arg('tipo_pg')
+    if tipos:
+        tipos = [normalizar_tipo_pg(t) for t in tipos]
+        filtros.append("d.tipo_pg = ANY(%(tipos)s)")
+        params['tipos'] = tipos
+
+    colaboradores = _lista_arg('colaborador_id')
+    if colaboradores:
+        if not all(c.isdigit() for c in colaboradores):
+            raise BuscaInvalida('colaborador_id deve ser um número inteiro', 'INVALID_DATA')
+        filtros.append("d.colaborador_id = ANY(%(colaboradores)s)")
+        params['colaboradores'] = [int(c) for c in colaboradores]
+
+    for nome, operador in (('de', '>='), ('ate', '<=')):
+        valor = request.args.get(nome)
+        if valor:
+            try:
+                params[nome] = date.fromisoformat(valor)
+            except ValueError:
+                raise BuscaInvalida(f'{nome} deve estar no formato YYYY-MM-DD', 'INVALID_DATE')
+            filtros.append(f"d.data_compra {operador} %({nome})s")
+
+    for nome, operador in (('valor_min', '>='), ('valor_max', '<=')):
+        valor = request.args.get(nome)
+        if valor:
+            try:
+                params[nome] = Decimal(valor)
+            except InvalidOperation:
+                raise BuscaInvalida(f'{nome} deve ser um número', 'INVALID_VALUE')
+            if not params[nome].is_finite():
+                raise BuscaInvalida(f'{nome} deve ser um número', 'INVALID_VALUE')
+            filtros.append(f"d.valor {operador} %({nome})s")
+
+    return filtros, params
+
+
+def _codificar_cursor_busca(relevancia: float | None, data_compra: str, id: int, posicao: int) -> str:
+    """Opaque search cursor: last row's (relevancia, data_compra, id) and rows returned so far."""
+    raw = f"{'' if relevancia is None else repr(relevancia)}|{data_compra}|{id}|{posicao}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decodificar_cursor_busca(token: str) -> tuple[float | None, date, int, int]:
+    """
+    Decode a cursor from _codificar_cursor_busca.
+
+    Raises:
+        ValueError: Malformed cursor
+    """
+    raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+    relevancia, data_compra, id, posicao = raw.split('|')
+    return (float(relevancia) if relevancia else None), date.fromisoformat(data_compra), int(id), int(posicao)
+
+
+@despesas_bp.route('/despesas/search', methods=['GET'])
 @jwt_required()
-def criar_despesa():
-    """Create a new expense."""
+def buscar_despesas():
+    """
+    Search expenses with combinable filters.
+
+    Query params (all optional, combined with AND):
+        q: Text in descricao, accent-insensitive; matches Portuguese
+            full-text (websearch syntax: "quoted phrase", -exclude, or)
+            or any substring of at least 3 characters via trigrams
+        categoria, tipo_pg, colaborador_id: One or more values
+            (repeat the param or separate with commas)
+        de, ate: data_compra range (YYYY-MM-DD, inclusive)
+        valor_min, valor_max: valor range (inclusive)
+        limit, cursor: Keyset pagination as in GET /despesas
+
+    With ``q`` the results are ranked by ``relevancia`` (ts_rank plus
+    trigram similarity), then newest first; without it they are newest
+    first. Unlike GET /despesas there is no X-Total-Count: counting every
+    match would cost as much as returning them.
+    """
     try:
-        data = request.get_json()
-        if not data:
-            return _error_response('Dados JSON inválidos', 'INVALID_JSON')
+        try:
+            filtros, params = _filtros_busca()
+        except BuscaInvalida as e:
+            return _error_response(e.message, e.code)
+
+        tamanho = current_app.config.get('DESPESAS_PAGE_SIZE', 100)
+        limit = request.args.get('limit')
+        if limit:
+            maximo = current_app.config.get('DESPESAS_PAGE_MAX', 500)
+            if not limit.isdigit() or not (1 <= int(limit) <= maximo):
+                return _error_response(f'limit deve estar entre 1 e {maximo}', 'INVALID_LIMIT')
+            tamanho = int(limit)
+        params['limite'] = tamanho + 1  # one extra row tells whether there's a next page
+
+        ranquear = 'q' in params
+        posicao = 0
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                relevancia, ultima_data, ultimo_id, posicao = _decodificar_cursor_busca(cursor)
+            except ValueError:
+                return _error_response('Cursor inválido', 'INVALID_CURSOR')
+            if ranquear != (relevancia is not None):
+                return _error_response('Cursor inválido', 'INVALID_CURSOR')
+            params.update(c_relevancia=relevancia, c_data=ultima_data, c_id=ultimo_id)
+
+        where = 'WHERE ' + ' AND '.join(filtros) if filtros else ''
+        if ranquear:
+            # Every match has to be ranked before the first page anyway; the
+            # GIN indexes keep the match set cheap to find.
+            sql = f"""
+                SELECT * FROM (
+                    SELECT d.*, c.nome AS colaborador_nome,
+                           (ts_rank({BUSCA_TSVECTOR}, {BUSCA_TSQUERY})
+                            + similarity({BUSCA_NORMALIZADA}, lower(f_unaccent(%(q)s))))::float8 AS relevancia
+                    FROM despesa d
+                    JOIN colaborador c ON d.colaborador_id = c.id
+                    {where}
+                ) r
+                {'WHERE (r.relevancia, r.data_compra, r.id) < (%(c_relevancia)s, %(c_data)s, %(c_id)s)' if cursor else ''}
+                ORDER BY r.relevancia DESC, r.data_compra DESC, r.id DESC
+                LIMIT %(limite)s
+            """
+        else:
+            if cursor:
+                filtros.append("(d.data_compra, d.id) < (%(c_data)s, %(c_id)s)")
+                where = 'WHERE ' + ' AND '.join(filtros)
+            sql = f"""
+                SELECT d.*, c.nome AS colaborador_nome
+                FROM despesa d
+                JOIN colaborador c ON d.colaborador_id = c.id
+                {where}
+                ORDER BY d.data_compra DESC, d.id DESC
+                LIMIT %(limite)s
+            """
+
+        with get_db_connection(readonly=True) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(sql, params)
+                despesas = cur.fetchall()
 
-        # Validation
-        required = ['data_compra', 'descricao', 'valor', 'tipo_pg', 'colaborador_id', 'categoria']
-        missing = [f for f in required if not data.get(f)]
-        if missing:
-            return _error_response(f'Campos obrigatórios faltando: {missing}', 'MISSING_FIELDS')
+        proximo = None
+        if len(despesas) > tamanho:
+            despesas = despesas[:tamanho]
+            ultima = despesas[-1]
+            proximo = _codificar_cursor_busca(
+                ultima.get('relevancia'), ultima['data_compra'].isoformat(),
+                ultima['id'], posicao + len(despesas)
+            )
 
+        for d in despesas:
+            for campo in ('data_compra', 'recorrencia_data'):
+                if d.get(campo):
+                    d[campo] = d[campo].strftime('%Y-%m-%d')
+
+        response = _success_response(despesas)
+        if despesas:
+            response.headers['Content-Range'] = f"despesas {posicao}-{posicao + len(despesas) - 1}/*"
+        if proximo:
+            args = request.args.to_dict(flat=False)
+            args.update(cursor=[proximo], limit=[str(tamanho)])
+            response.headers['X-Next-Cursor'] = proximo
+            response.headers['Link'] = f'<{request.base_url}?{urlencode(args, doseq=True)}>; rel="next"'
+        return response
+
+    except Exception as e:
+        logger.error(f"ERRO GET /api/despesas/search: {str(e)}", exc_info=True)
+        return _error_response('Erro ao buscar despesas', 'FETCH_FAILED', 500)
+
+
+@despesas_bp.route('/despesas', methods=['POST'])
+@jwt_required()
+def criar_despesa():
+    """
+    Create a new expense.
+
+    With ``"parcelas": N`` (2..PARCELAS_MAX) ``valor`` is the purchase
+    total: N linked rows are inserted in one statement, each with its
+    share of the cents and its own mes_vigente (see linhas_despesa).
+    """
+    try:
         try:
-            data_compra = datetime.strptime(data['data_compra'].split('T')[0], '%Y-%m-%d').date()
-            valor = Decimal(str(data['valor']))
-            if valor <= Decimal('0'):
-                return _error_response('Valor deve ser positivo', 'INVALID_VALUE')
-            colab_id = int(data['colaborador_id'])
-        except (ValueError, TypeError, InvalidOperation):
-            return _error_response('Dados inválidos (data, valor ou colaborador_id)', 'INVALID_DATA')
-
-        # NOVA VALIDAÇÃO: data_compra não pode ser no futuro
-        if data_compra > date.today():
-            return _error_response('Data da compra não pode ser no futuro', 'FUTURE_DATE')
-
-        tipo_pg = normalizar_tipo_pg(data['tipo_pg'])
-        categoria = data['categoria']
-
-        if tipo_pg not in TIPOS_PG_VALIDOS:
-            return _error_response('tipo_pg inválido', 'INVALID_TIPO_PG')
-        if categoria not in CATEGORIAS_VALIDAS:
-            return _error_response('categoria inválida', 'INVALID_CATEGORY')
-
-        # Get collaborator's closing day
+            despesa = validar_despesa(request.get_json(silent=True))
+        except DespesaInvalida as e:
+            return _error_response(e.message, e.code)
+
+        # Get collaborator's closing day (per-worker cache: no query on the hot path)
         with get_db_connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT dia_fechamento FROM colaborador WHERE id = %s", (colab_id,))
-                colab = cur.fetchone()
+                colab = buscar_colaborador(cur, despesa['colaborador_id'])
                 if not colab:
                     return _error_response('Colaborador não encontrado', 'COLLABORATOR_NOT_FOUND', 404)
 
-                mes_vigente = calcular_mes_vigente(data_compra, tipo_pg, colab['dia_fechamento'])
+                linhas = linhas_despesa(despesa, colab['dia_fechamento'])
 
-                # Insert expense
-                cur.execute("""
-                    INSERT INTO despesa (
-                        data_compra, mes_vigente, descricao, valor, tipo_pg, colaborador_id, categoria
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id
-                """, (data_compra, mes_vigente, data['descricao'], valor, tipo_pg, colab_id, categoria))
-                despesa_id = cur.fetchone()['id']
+                # Insert expense (all installments in one statement)
+                criadas = execute_values(cur, INSERIR_DESPESAS_SQL, linhas, page_size=len(linhas), fetch=True)
+                invalidar(cur, GRUPOS_DESPESA, [row['mes_vigente'] for row in criadas])
+            conn.commit()
 
-        logger.info(f"Despesa criada: id={despesa_id}, mes={mes_vigente}")
-        return _success_response({
+        # RETURNING order isn't guaranteed; the first installment leads
+        criadas.sort(key=lambda row: row['parcela_numero'] or 0)
+        despesa_id, mes_vigente = criadas[0]['id'], criadas[0]['mes_vigente']
+        logger.info(f"Despesa criada: id={despesa_id}, mes={mes_vigente}, parcelas={len(criadas)}")
+        resultado = {
             'id': despesa_id,
             'mes_vigente': mes_vigente,
             'message': 'Despesa criada com sucesso'
+        }
+        if len(criadas) > 1:
+            resultado['parcela_grupo'] = linhas[0][7]
+            resultado['parcelas'] = criadas
+        return _success_response(resultado, 201)
+
+    except psycopg2.errors.ForeignKeyViolation:
+        # Colaborador deleted by another worker an instant ago
+        return _error_response('Colaborador não encontrado', 'COLLABORATOR_NOT_FOUND', 404)
+    except Exception as e:
+        logger.error(f"ERRO POST /api/despesas: {str(e)}", exc_info=True)
+        return _error_response('Erro interno', 'CREATE_FAILED', 500)
+
+
+@despesas_bp.route('/despesas/batch', methods=['POST'])
+@jwt_required()
+def criar_despesas_em_lote():
+    """
+    Create many expenses in one request and one transaction.
+
+    Body: ``{"despesas": [...], "modo": "atomico" | "parcial"}`` (or just
+    the array, atomic). Every item is validated like POST /despesas; the
+    colaboradores' closing days come from a single query and all rows go
+    in with one multi-row INSERT (so the statement-level triggers run
+    once for the whole batch). Items with ``parcelas`` expand into one
+    row per installment, each listed in ``criadas`` with the item's indice.
+
+    - atomico (default): any invalid item rejects the batch with 400 and
+      the per-item errors; nothing is inserted.
+    - parcial: valid items are inserted, invalid ones are reported.
+
+    Errors are ``{"indice", "error", "code"}`` with the item's position.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if isinstance(data, list):
+            data = {'despesas': data}
+        if not isinstance(data, dict) or not isinstance(data.get('despesas'), list):
+            return _error_response('Envie {"despesas": [...]}', 'INVALID_JSON')
+
+        itens = data['despesas']
+        modo = data.get('modo', 'atomico')
+        if modo not in ('atomico', 'parcial'):
+            return _error_response("modo deve ser 'atomico' ou 'parcial'", 'INVALID_MODE')
+        maximo = current_app.config.get('DESPESAS_BATCH_MAX', 2000)
+        if not itens:
+            return _error_response('Lista de despesas vazia', 'EMPTY_BATCH')
+        if len(itens) > maximo:
+            return _error_response(f'Máximo de {maximo} despesas por lote', 'BATCH_TOO_LARGE')
+
+        validas, erros = [], []
+        for indice, item in enumerate(itens):
+            try:
+                validas.append((indice, validar_despesa(item)))
+            except DespesaInvalida as e:
+                erros.append({'indice': indice, 'error': e.message, 'code': e.code})
+
+        if erros and modo == 'atomico':
+            return json_response({
+                'error': 'Lote rejeitado: há despesas inválidas',
+                'code': 'VALIDATION_FAILED',
+                'erros': erros
+            }, 400)
+
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                colaboradores = buscar_colaboradores(cur, {d['colaborador_id'] for _, d in validas})
+                dia_fechamento = {id: c['dia_fechamento'] for id, c in colaboradores.items()}
+
+                linhas, posicoes = [], []
+                for indice, d in validas:
+                    dia = dia_fechamento.get(d['colaborador_id'])
+                    if dia is None:
+                        erros.append({'indice': indice, 'error': 'Colaborador não encontrado',
+                                      'code': 'COLLABORATOR_NOT_FOUND'})
+                        continue
+                    novas = linhas_despesa(d, dia)
+                    linhas.extend(novas)
+                    posicoes.extend((indice, linha[1]) for linha in novas)
+
+                if erros and modo == 'atomico':
+                    erros.sort(key=itemgetter('indice'))
+                    return json_response({
+                        'error': 'Lote rejeitado: há despesas inválidas',
+                        'code': 'VALIDATION_FAILED',
+                        'erros': erros
+                    }, 400)
+                if not linhas:
+                    erros.sort(key=itemgetter('indice'))
+                    return json_response({
+                        'error': 'Nenhuma despesa válida no lote',
+                        'code': 'VALIDATION_FAILED',
+                        'erros': erros
+                    }, 400)
+
+                # One INSERT for the whole batch; ids come back keyed by row position
+                ids = execute_values(
+                    cur, INSERIR_DESPESAS_LOTE_SQL,
+                    [(posicao, *linha) for posicao, linha in enumerate(linhas)],
+                    page_size=len(linhas), fetch=True
+                )
+                invalidar(cur, GRUPOS_DESPESA, [mes for _, mes in posicoes])
+            conn.commit()
+
+        id_por_posicao = {row['posicao']: row['id'] for row in ids}
+        criadas = [
+            {'indice': indice, 'id': id_por_posicao[posicao], 'mes_vigente': mes}
+            for posicao, (indice, mes) in enumerate(posicoes)
+        ]
+        erros.sort(key=itemgetter('indice'))
+        logger.info(f"Lote de despesas: {len(criadas)} criadas, {len(erros)} rejeitadas ({modo})")
+        return _success_response({
+            'criadas': criadas,
+            'erros': erros,
+            'total_criadas': len(criadas),
+            'total_erros': len(erros),
+            'message': 'Despesas criadas com sucesso'
         }, 201)
 
+    except psycopg2.errors.ForeignKeyViolation:
+        # Colaborador deleted by another worker an instant ago
+        return _error_response('Colaborador não encontrado', 'COLLABORATOR_NOT_FOUND', 404)
     except Exception as e:
-        logger.error(f"ERRO POST /api/despesas: {str(e)}", exc_info=True)
+        logger.error(f"ERRO POST /api/despesas/batch: {str(e)}", exc_info=True)
         return _error_response('Erro interno', 'CREATE_FAILED', 500)
 
 
@@ -183,29 +749,134 @@ def despesa_por_id(id: int):
                     return _error_response('Dados inválidos', 'INVALID_DATA')
 
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute("SELECT dia_fechamento FROM colaborador WHERE id = %s", (colab_id,))
-                    colab = cur.fetchone()
+                    colab = buscar_colaborador(cur, colab_id)
                     if not colab:
                         return _error_response('Colaborador não encontrado', 'COLLABORATOR_NOT_FOUND', 404)
 
-                    mes_vigente = calcular_mes_vigente(data_compra, tipo_pg, colab['dia_fechamento'])
+                    mes_base = calcular_mes_vigente(data_compra, tipo_pg, colab['dia_fechamento'])
 
+                    # Installment k of a group stays k-1 months after the first (as in linhas_despesa)
                     cur.execute("""
-                        UPDATE despesa
-                        SET data_compra=%s, mes_vigente=%s, descricao=%s, valor=%s,
-                            tipo_pg=%s, colaborador_id=%s, categoria=%s
-                        WHERE id=%s
-                    """, (data_compra, mes_vigente, data['descricao'], valor,
+                        UPDATE despesa d
+                        SET data_compra=%s,
+                            mes_vigente=to_char(
+                                to_date(%s, 'YYYY-MM')
+                                    + (COALESCE(anterior.parcela_numero, 1) - 1) * interval '1 month',
+                                'YYYY-MM'),
+                            descricao=%s, valor=%s, tipo_pg=%s, colaborador_id=%s, categoria=%s
+                        FROM (SELECT id, mes_vigente, parcela_numero FROM despesa WHERE id=%s FOR UPDATE) anterior
+                        WHERE d.id = anterior.id
+                        RETURNING anterior.mes_vigente AS mes_anterior, d.mes_vigente
+                    """, (data_compra, mes_base, data['descricao'], valor,
                           tipo_pg, colab_id, categoria, id))
+                    atualizada = cur.fetchone()
+                    if not atualizada:
+                        return _error_response('Despesa não encontrada', 'NOT_FOUND', 404)
+                    invalidar(cur, GRUPOS_DESPESA, [atualizada['mes_anterior'], atualizada['mes_vigente']])
                     conn.commit()
                     return _success_response({'message': 'Atualizado com sucesso'})
 
             else:  # DELETE
                 with conn.cursor() as cur:
-                    cur.execute("DELETE FROM despesa WHERE id = %s", (id,))
+                    cur.execute("DELETE FROM despesa WHERE id = %s RETURNING mes_vigente", (id,))
+                    removida = cur.fetchone()
+                    if not removida:
+                        return _error_response('Despesa não encontrada', 'NOT_FOUND', 404)
+                    invalidar(cur, GRUPOS_DESPESA, [removida['mes_vigente']])
                     conn.commit()
                     return _success_response({'message': 'Deletado com sucesso'})
 
+    except psycopg2.errors.ForeignKeyViolation:
+        # Colaborador deleted by another worker an instant ago
+        return _error_response('Colaborador não encontrado', 'COLLABORATOR_NOT_FOUND', 404)
     except Exception as e:
         logger.error(f"Erro em despesa_por_id: {e}")
-        return _error_response('Erro interno', 'OPERATION_FAILED', 500)
\ No newline at end of file
+        return _error_response('Erro interno', 'OPERATION_FAILED', 500)
+
+@despesas_bp.route('/despesas/parcelas/<uuid:grupo>', methods=['PUT', 'DELETE'])
+@jwt_required()
+def parcelas_por_grupo(grupo: uuid.UUID):
+    """
+    Update or delete every installment of a purchase in one statement.
+
+    PUT takes the same payload as POST /despesas with ``valor`` as the new
+    purchase total (``parcelas`` is ignored: the count can't change); the
+    cents are re-split and every installment's mes_vigente recomputed.
+    DELETE removes the whole group, or with ``?a_partir=<n>`` only the
+    installments from number n on (e.g. a purchase cancelled midway).
+    """
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                if request.method == 'PUT':
+                    try:
+                        despesa = validar_despesa(request.get_json(silent=True))
+                    except DespesaInvalida as e:
+                        return _error_response(e.message, e.code)
+
+                    colab = buscar_colaborador(cur, despesa['colaborador_id'])
+                    if not colab:
+                        return _error_response('Colaborador não encontrado', 'COLLABORATOR_NOT_FOUND', 404)
+
+                    # Same split as dividir_parcelas: the first installment takes the leftover cents
+                    try:
+                        cur.execute("""
+                            UPDATE despesa d
+                            SET data_compra = %(data_compra)s,
+                                mes_vigente = to_char(
+                                    to_date(%(mes_base)s, 'YYYY-MM') + (d.parcela_numero - 1) * interval '1 month',
+                                    'YYYY-MM'),
+                                descricao = %(descricao)s,
+                                valor = (%(centavos)s / d.parcela_total
+                                         + CASE WHEN d.parcela_numero = 1
+                                                THEN %(centavos)s %% d.parcela_total ELSE 0 END)::numeric / 100,
+                                tipo_pg = %(tipo_pg)s,
+                                colaborador_id = %(colaborador_id)s,
+                                categoria = %(categoria)s
+                            FROM (
+                                SELECT id, mes_vigente FROM despesa WHERE parcela_grupo = %(grupo)s FOR UPDATE
+                            ) anterior
+                            WHERE d.id = anterior.id
+                            RETURNING d.id, d.parcela_numero, d.mes_vigente, d.valor,
+                                      anterior.mes_vigente AS mes_anterior
+                        """, {
+                            **despesa,
+                            'mes_base': calcular_mes_vigente(
+                                despesa['data_compra'], despesa['tipo_pg'], colab['dia_fechamento']),
+                            'centavos': int(despesa['valor'].quantize(Decimal('0.01')) * 100),
+                            'grupo': str(grupo),
+                        })
+                    except psycopg2.errors.CheckViolation:
+                        return _error_response('Valor menor que um centavo por parcela', 'INVALID_VALUE')
+                    parcelas = sorted(cur.fetchall(), key=itemgetter('parcela_numero'))
+                    if not parcelas:
+                        return _error_response('Parcelamento não encontrado', 'NOT_FOUND', 404)
+                    invalidar(cur, GRUPOS_DESPESA,
+                              [p['mes_anterior'] for p in parcelas] + [p['mes_vigente'] for p in parcelas])
+                    conn.commit()
+                    for p in parcelas:
+                        del p['mes_anterior']
+                    return _success_response({'parcelas': parcelas, 'message': 'Atualizado com sucesso'})
+
+                else:  # DELETE
+                    a_partir = request.args.get('a_partir', '1')
+                    if not a_partir.isdigit() or int(a_partir) < 1:
+                        return _error_response('a_partir deve ser um número de parcela', 'INVALID_DATA')
+                    cur.execute("""
+                        DELETE FROM despesa
+                        WHERE parcela_grupo = %s AND parcela_numero >= %s
+                        RETURNING mes_vigente
+                    """, (str(grupo), int(a_partir)))
+                    removidas = cur.fetchall()
+                    if not removidas:
+                        return _error_response('Parcelamento não encontrado', 'NOT_FOUND', 404)
+                    invalidar(cur, GRUPOS_DESPESA, [r['mes_vigente'] for r in removidas])
+                    conn.commit()
+                    return _success_response({'removidas': len(removidas), 'message': 'Deletado com sucesso'})
+
+    except psycopg2.errors.ForeignKeyViolation:
+        # Colaborador deleted by another worker an instant ago
+        return _error_response('Colaborador não encontrado', 'COLLABORATOR_NOT_FOUND', 404)
+    except Exception as e:
+        logger.error(f"Erro em parcelas_por_grupo: {e}")
+        return _error_response('Erro interno', 'OPERATION_FAILED', 500)
@@ -8,7 +8,11 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from connection import get_db_connection, get_db_cursor
 from psycopg2.extras import RealDictCursor
+from routes.resumo import ResumoIndisponivel, calcular_resumo
+from utils.cache import GRUPOS_DIVISAO, invalidar
+from utils.json_utils import DecimalEncoder
 from datetime import date
+import json
 import re
 import logging
 
@@ -35,10 +39,13 @@ def obter_status_divisao(mes_ano: str):
         return _error_response("Formato de mês inválido. Use YYYY-MM.", 'INVALID_MONTH')
 
     try:
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(
-                    "SELECT paga, data_acerto FROM divisao_mensal WHERE mes_ano = %s",
+                    """
+                    SELECT paga, data_acerto, snapshot_em, snapshot_desatualizado
+                    FROM divisao_mensal WHERE mes_ano = %s
+                    """,
                     (mes_ano,)
                 )
                 row = cur.fetchone()
@@ -47,13 +54,17 @@ def obter_status_divisao(mes_ano: str):
                     return _success_response({
                         "mes_ano": mes_ano,
                         "paga": row['paga'],
-                        "data_acerto": row['data_acerto'].isoformat() if row['data_acerto'] else None
+                        "data_acerto": row['data_acerto'].isoformat() if row['data_acerto'] else None,
+                        "snapshot_em": row['snapshot_em'].isoformat() if row['snapshot_em'] else None,
+                        "snapshot_desatualizado": row['snapshot_desatualizado']
                     })
                 else:
                     return _success_response({
                         "mes_ano": mes_ano,
                         "paga": False,
-                        "data_acerto": None
+                        "data_acerto": None,
+                        "snapshot_em": None,
+                        "snapshot_desatualizado": False
                     })
     except Exception as e:
         logger.error(f"Erro em obter_status_divisao: {e}")
@@ -63,6 +74,15 @@ def obter_status_divisao(mes_ano: str):
 @divisao_bp.route('/divisao/<mes_ano>/marcar-pago', methods=['POST'])
 @jwt_required()
 def marcar_divisao_como_paga(mes_ano: str):
+    """
+    Mark the month as settled and freeze its resumo as a snapshot.
+
+    The month's advisory lock (migration 013) is taken exclusively first:
+    despesa/renda writes to the month hold it shared until they commit, so
+    the resumo is computed only after those in flight are done, and writes
+    arriving meanwhile wait for this transaction and then flag the snapshot
+    as outdated. Marking an already paid month again refreshes the snapshot.
+    """
     if not validar_mes_ano(mes_ano):
         return _error_response("Formato de mês inválido. Use YYYY-MM.", 'INVALID_MONTH')
 
@@ -77,6 +97,9 @@ def marcar_divisao_como_paga(mes_ano: str):
 
     try:
         with get_db_cursor() as cur:
+            # Before any row lock on divisao_mensal: writers take the shared
+            # lock first and the divisao_mensal row afterwards
+            cur.execute("SELECT pg_advisory_xact_lock(divisao_lock_chave(%s))", (mes_ano,))
             cur.execute("""
                 INSERT INTO divisao_mensal (mes_ano, paga, data_acerto)
                 VALUES (%s, true, %s)
@@ -84,13 +107,31 @@ def marcar_divisao_como_paga(mes_ano: str):
                 DO UPDATE SET paga = true, data_acerto = EXCLUDED.data_acerto
                 RETURNING mes_ano, paga, data_acerto
             """, (mes_ano, data_acerto))
-            conn.commit()
             result = cur.fetchone()
 
+            try:
+                snapshot = json.dumps(calcular_resumo(cur, mes_ano), cls=DecimalEncoder)
+            except ResumoIndisponivel as e:
+                # Still settled; resumo keeps being computed (and failing) live
+                logger.warning(f"Divisão {mes_ano} paga sem snapshot: {e.message}")
+                snapshot = None
+
+            cur.execute("""
+                UPDATE divisao_mensal
+                SET snapshot = %s::jsonb,
+                    snapshot_em = CASE WHEN %s::jsonb IS NULL THEN NULL ELSE now() END,
+                    snapshot_desatualizado = false
+                WHERE mes_ano = %s
+                RETURNING snapshot_em
+            """, (snapshot, snapshot, mes_ano))
+            snapshot_em = cur.fetchone()['snapshot_em']
+            invalidar(cur, GRUPOS_DIVISAO, [mes_ano])
+
             return _success_response({
                 "mes_ano": result['mes_ano'],
                 "paga": result['paga'],
-                "data_acerto": result['data_acerto'].isoformat() if result['data_acerto'] else None
+                "data_acerto": result['data_acerto'].isoformat() if result['data_acerto'] else None,
+                "snapshot_em": snapshot_em.isoformat() if snapshot_em else None
             })
 
     except Exception as e:
@@ -108,7 +149,8 @@ def desmarcar_divisao_como_paga(mes_ano: str):
         with get_db_cursor() as cur:
             cur.execute("""
                 UPDATE divisao_mensal
-                SET paga = false, data_acerto = NULL
+                SET paga = false, data_acerto = NULL,
+                    snapshot = NULL, snapshot_em = NULL, snapshot_desatualizado = false
                 WHERE mes_ano = %s
                 RETURNING mes_ano, paga, data_acerto
             """, (mes_ano,))
@@ -120,8 +162,8 @@ def desmarcar_divisao_como_paga(mes_ano: str):
                     RETURNING mes_ano, paga, data_acerto
                 """, (mes_ano,))
 
-            conn.commit()
             result = cur.fetchone()
+            invalidar(cur, GRUPOS_DIVISAO, [mes_ano])
             return _success_response({
                 "mes_ano": result['mes_ano'],
                 "paga": result['paga'],
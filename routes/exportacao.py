@@ -0,0 +1,238 @@
+# routes/exportacao.py
+"""
+Exportação de despesas e rendas (CSV/NDJSON) - Protected with JWT authentication.
+
+All endpoints require valid JWT token.
+"""
+import csv
+import io
+import json
+import logging
+import re
+import zlib
+from datetime import date
+from typing import Iterator
+
+import psycopg2.extensions
+from flask import Blueprint, Response, current_app, request, stream_with_context
+from flask_jwt_extended import jwt_required
+
+from connection import get_db_connection
+from utils.json_utils import DecimalEncoder, json_response
+
+logger = logging.getLogger(__name__)
+exportacao_bp = Blueprint('exportacao', __name__)
+
+MES_ANO_RE = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+COLUNAS_DESPESA = (
+    'id', 'data_compra', 'mes_vigente', 'descricao', 'valor', 'tipo_pg',
+    'colaborador_id', 'colaborador_nome', 'categoria',
+    'parcela_grupo', 'parcela_numero', 'parcela_total',
+)
+
+COLUNAS_RENDA = ('id', 'colaborador_id', 'colaborador_nome', 'mes_ano', 'valor')
+
+
+def _error_response(message: str, code: str, status: int = 400):
+    return json_response({'error': message, 'code': code}, status)
+
+
+class FiltroInvalido(Exception):
+    """A query string filter has an invalid value."""
+
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+def _data_arg(nome: str) -> date | None:
+    valor = request.args.get(nome)
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise FiltroInvalido(f"{nome} deve estar no formato YYYY-MM-DD", 'INVALID_DATE')
+
+
+def _mes_arg(nome: str) -> str | None:
+    valor = request.args.get(nome)
+    if valor and not MES_ANO_RE.match(valor):
+        raise FiltroInvalido(f"{nome} deve estar no formato YYYY-MM", 'INVALID_MONTH')
+    return valor or None
+
+
+def _colaborador_arg() -> int | None:
+    valor = request.args.get('colaborador_id')
+    if not valor:
+        return None
+    if not valor.isdigit():
+        raise FiltroInvalido("colaborador_id deve ser um número inteiro", 'INVALID_DATA')
+    return int(valor)
+
+
+def _linhas_csv(colunas: tuple, lotes: Iterator[list]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(colunas)
+    for lote in lotes:
+        writer.writerows(lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # empty export: header only
+        yield buffer.getvalue()
+
+
+def _linhas_ndjson(colunas: tuple, lotes: Iterator[list]) -> Iterator[str]:
+    for lote in lotes:
+        yield ''.join(
+            json.dumps(
+                {c: v.isoformat() if isinstance(v, date) else v for c, v in zip(colunas, row)},
+                cls=DecimalEncoder, ensure_ascii=False,
+            ) + '\n'
+            for row in lote
+        )
+
+
+def _gzip(partes: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for parte in partes:
+        comprimido = compressor.compress(parte)
+        if comprimido:
+            yield comprimido
+    yield compressor.flush()
+
+
+def _exportar(nome: str, sql: str, params: list, colunas: tuple):
+    """
+    Stream ``sql`` as CSV or NDJSON (``?formato=``), optionally gzipped (``?gzip=true``).
+
+    Rows come from a server-side (named) cursor fetched ``EXPORT_ITERSIZE``
+    at a time; each batch is encoded and sent before the next one is
+    fetched, so memory holds one batch regardless of the export size and
+    the first bytes go out right after the first batch.
+    """
+    formato = request.args.get('formato', 'csv').lower()
+    if formato not in FORMATOS:
+        return _error_response("formato deve ser 'csv' ou 'ndjson'", 'INVALID_FORMAT')
+    comprimir = request.args.get('gzip', '').lower() in ('1', 'true')
+    itersize = current_app.config.get('EXPORT_ITERSIZE', 2000)
+
+    def lotes() -> Iterator[list]:
+        with get_db_connection(readonly=True) as conn:
+            with conn.cursor(name=f'export_{nome}', cursor_factory=psycopg2.extensions.cursor) as cur:
+                cur.itersize = itersize
+                cur.execute(sql, params)
+                while True:
+                    lote = cur.fetchmany(itersize)
+                    if not lote:
+                        break
+                    yield lote
+
+    def gerar() -> Iterator[bytes]:
+        try:
+            encoder = _linhas_csv if formato == 'csv' else _linhas_ndjson
+            partes = (texto.encode('utf-8') for texto in encoder(colunas, lotes()))
+            yield from (_gzip(partes) if comprimir else partes)
+        except Exception as e:
+            # Headers are gone already: the client sees a truncated file
+            logger.error(f"ERRO exportando {nome}: {e}", exc_info=True)
+            raise
+
+    arquivo = f"{nome}-{date.today().isoformat()}.{formato}{'.gz' if comprimir else ''}"
+    response = Response(
+        stream_with_context(gerar()),
+        content_type='application/gzip' if comprimir else FORMATOS[formato],
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{arquivo}"'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let proxies buffer the stream
+    return response
+
+
+@exportacao_bp.route('/export/despesas', methods=['GET'])
+@jwt_required()
+def exportar_despesas():
+    """
+    Export despesas ordered by (data_compra, id).
+
+    Filters: ?de=&ate= (YYYY-MM-DD, data_compra), ?mes_vigente=YYYY-MM,
+    ?colaborador_id=
+    """
+    try:
+        de, ate = _data_arg('de'), _data_arg('ate')
+        mes = _mes_arg('mes_vigente')
+        colaborador_id = _colaborador_arg()
+    except FiltroInvalido as e:
+        return _error_response(e.message, e.code)
+
+    filtros, params = [], []
+    if de:
+        filtros.append("d.data_compra >= %s")
+        params.append(de)
+    if ate:
+        filtros.append("d.data_compra <= %s")
+        params.append(ate)
+    if mes:
+        filtros.append("d.mes_vigente = %s")
+        params.append(mes)
+    if colaborador_id is not None:
+        filtros.append("d.colaborador_id = %s")
+        params.append(colaborador_id)
+
+    sql = f"""
+        SELECT d.id, d.data_compra, d.mes_vigente, d.descricao, d.valor, d.tipo_pg,
+               d.colaborador_id, c.nome AS colaborador_nome, d.categoria,
+               d.parcela_grupo, d.parcela_numero, d.parcela_total
+        FROM despesa d
+        JOIN colaborador c ON d.colaborador_id = c.id
+        {'WHERE ' + ' AND '.join(filtros) if filtros else ''}
+        ORDER BY d.data_compra, d.id
+    """
+    return _exportar('despesas', sql, params, COLUNAS_DESPESA)
+
+
+@exportacao_bp.route('/export/rendas', methods=['GET'])
+@jwt_required()
+def exportar_rendas():
+    """
+    Export rendas ordered by (mes_ano, colaborador).
+
+    Filters: ?de=&ate= (YYYY-MM, inclusive), ?mes=YYYY-MM, ?colaborador_id=
+    """
+    try:
+        de, ate = _mes_arg('de'), _mes_arg('ate')
+        mes = _mes_arg('mes')
+        colaborador_id = _colaborador_arg()
+    except FiltroInvalido as e:
+        return _error_response(e.message, e.code)
+
+    filtros, params = [], []
+    if de:
+        filtros.append("r.mes_ano >= %s")
+        params.append(de)
+    if ate:
+        filtros.append("r.mes_ano <= %s")
+        params.append(ate)
+    if mes:
+        filtros.append("r.mes_ano = %s")
+        params.append(mes)
+    if colaborador_id is not None:
+        filtros.append("r.colaborador_id = %s")
+        params.append(colaborador_id)
+
+    sql = f"""
+        SELECT r.id, r.colaborador_id, c.nome AS colaborador_nome, r.mes_ano, r.valor
+        FROM renda_mensal r
+        JOIN colaborador c ON r.colaborador_id = c.id
+        {'WHERE ' + ' AND '.join(filtros) if filtros else ''}
+        ORDER BY r.mes_ano, c.nome, r.id
+    """
+    return _exportar('rendas', sql, params, COLUNAS_RENDA)
@@ -0,0 +1,264 @@
+# routes/importacao.py
+"""
+Importação de extratos (CSV/OFX) - Protected with JWT authentication.
+
+All endpoints require valid JWT token.
+"""
+import json
+import logging
+
+from flask import Blueprint, current_app, request
+from flask_jwt_extended import jwt_required
+from psycopg2.extras import RealDictCursor
+
+from connection import get_db_connection
+from routes.despesas import CATEGORIAS_VALIDAS, TIPOS_PG_VALIDOS, normalizar_tipo_pg
+from utils.cache import GRUPOS_DESPESA, invalidar
+from utils.colaboradores import buscar_colaborador
+from utils.importacao import (
+    CopyStream,
+    FormatoInvalido,
+    Relatorio,
+    abrir_texto,
+    ler_csv,
+    ler_ofx,
+    preparar_linhas,
+)
+from utils.json_utils import json_response
+
+logger = logging.getLogger(__name__)
+importacao_bp = Blueprint('importacao', __name__)
+
+# Rows shown in the dry-run preview and duplicate report
+LIMITE_AMOSTRA = 50
+
+
+def _error_response(message: str, code: str, status: int = 400):
+    return json_response({'error': message, 'code': code}, status)
+
+
+def _success_response(data: dict, status: int = 200):
+    return json_response(data, status)
+
+
+def _flag(nome: str) -> bool:
+    return request.form.get(nome, request.args.get(nome, '')).lower() in ('1', 'true', 'sim')
+
+
+# Staging table: one row per statement line, dropped with the transaction
+STAGING_SQL = """
+    CREATE TEMP TABLE importacao_staging (
+        linha INTEGER NOT NULL,
+        data_compra DATE NOT NULL,
+        mes_vigente VARCHAR(7) NOT NULL,
+        descricao TEXT NOT NULL,
+        valor NUMERIC(10, 2) NOT NULL,
+        tipo_pg VARCHAR(20) NOT NULL,
+        colaborador_id INTEGER NOT NULL,
+        categoria VARCHAR(30) NOT NULL,
+        duplicada BOOLEAN NOT NULL DEFAULT false
+    ) ON COMMIT DROP
+"""
+
+COPY_SQL = """
+    COPY importacao_staging
+        (linha, data_compra, mes_vigente, descricao, valor, tipo_pg, colaborador_id, categoria)
+    FROM STDIN WITH (FORMAT csv)
+"""
+
+# A line is a duplicate when the colaborador already has as many despesas
+# with the same date, value and description as its occurrence number in
+# the file: re-importing a statement flags everything, while two genuine
+# identical purchases on the same day in a new statement both go in.
+DUPLICADAS_SQL = """
+    UPDATE importacao_staging s
+    SET duplicada = true
+    FROM (
+        SELECT n.linha
+        FROM (
+            SELECT linha, data_compra, valor, lower(descricao) AS chave,
+                   row_number() OVER (
+                       PARTITION BY data_compra, valor, lower(descricao) ORDER BY linha
+                   ) AS ocorrencia
+            FROM importacao_staging
+        ) n
+        JOIN (
+            SELECT data_compra, valor, lower(descricao) AS chave, COUNT(*) AS quantidade
+            FROM despesa
+            WHERE colaborador_id = %(colaborador_id)s
+              AND data_compra BETWEEN %(de)s AND %(ate)s
+            GROUP BY data_compra, valor, lower(descricao)
+        ) e USING (data_compra, valor, chave)
+        WHERE n.ocorrencia <= e.quantidade
+    ) d
+    WHERE s.linha = d.linha
+"""
+
+INSERIR_SQL = """
+    INSERT INTO despesa (data_compra, mes_vigente, descricao, valor, tipo_pg, colaborador_id, categoria)
+    SELECT data_compra, mes_vigente, descricao, valor, tipo_pg, colaborador_id, categoria
+    FROM importacao_staging
+    WHERE NOT duplicada
+    ORDER BY linha
+"""
+
+
+def _linha_json(row: dict) -> dict:
+    row = dict(row)
+    row['data_compra'] = row['data_compra'].isoformat()
+    return row
+
+
+@importacao_bp.route('/importacao/extrato', methods=['POST'])
+@jwt_required()
+def importar_extrato():
+    """
+    Import a bank statement (multipart upload) as despesas.
+
+    Form fields:
+        arquivo: CSV or OFX file
+        colaborador_id: Owner of the expenses
+        formato: 'csv' | 'ofx' (default: file extension)
+        tipo_pg: Payment type of every line (default 'credito')
+        categoria: Fixed categoria (default: guessed from the description)
+        encoding: File encoding (default utf-8-sig)
+        colunas: CSV header mapping, JSON {"data", "descricao", "valor"}
+        inverter_sinal: CSV lists expenses as negative values
+        dry_run: Only parse and report, write nothing
+        ignorar_erros: Import the valid lines even if some were rejected
+
+    The file is streamed through the parsing generators straight into
+    ``COPY FROM STDIN`` on a temporary staging table; duplicates against
+    existing despesas are flagged in SQL and the rest is moved into
+    despesa with a single INSERT ... SELECT.
+    """
+    arquivo = request.files.get('arquivo')
+    if arquivo is None or not arquivo.filename:
+        return _error_response('Envie o extrato no campo "arquivo"', 'MISSING_FILE')
+
+    formato = (request.form.get('formato') or arquivo.filename.rsplit('.', 1)[-1]).lower()
+    if formato not in ('csv', 'ofx'):
+        return _error_response("formato deve ser 'csv' ou 'ofx'", 'INVALID_FORMAT')
+
+    try:
+        colaborador_id = int(request.form.get('colaborador_id', ''))
+    except ValueError:
+        return _error_response('colaborador_id é obrigatório', 'MISSING_FIELDS')
+
+    tipo_pg = normalizar_tipo_pg(request.form.get('tipo_pg', 'credito'))
+    if tipo_pg not in TIPOS_PG_VALIDOS:
+        return _error_response('tipo_pg inválido', 'INVALID_TIPO_PG')
+    categoria = request.form.get('categoria') or None
+    if categoria is not None and categoria not in CATEGORIAS_VALIDAS:
+        return _error_response('categoria inválida', 'INVALID_CATEGORY')
+
+    colunas = None
+    if request.form.get('colunas'):
+        try:
+            colunas = json.loads(request.form['colunas'])
+        except ValueError:
+            colunas = None
+        if not isinstance(colunas, dict):
+            return _error_response('colunas deve ser um objeto JSON', 'INVALID_COLUMNS')
+
+    dry_run = _flag('dry_run')
+    ignorar_erros = _flag('ignorar_erros')
+
+    try:
+        texto = abrir_texto(arquivo.stream, request.form.get('encoding') or 'utf-8-sig')
+    except LookupError:
+        return _error_response('encoding desconhecido', 'INVALID_ENCODING')
+
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                colab = buscar_colaborador(cur, colaborador_id)
+                if not colab:
+                    return _error_response('Colaborador não encontrado', 'COLLABORATOR_NOT_FOUND', 404)
+
+                if formato == 'csv':
+                    linhas = ler_csv(texto, colunas, inverter_sinal=_flag('inverter_sinal'))
+                else:
+                    linhas = ler_ofx(texto)
+                relatorio = Relatorio()
+                despesas = preparar_linhas(
+                    linhas, colaborador_id, colab['dia_fechamento'], tipo_pg, categoria,
+                    relatorio, current_app.config.get('IMPORTACAO_MAX_LINHAS', 50000)
+                )
+
+                cur.execute(STAGING_SQL)
+                stream = CopyStream(despesas)
+                cur.copy_expert(COPY_SQL, stream)
+                if stream.erro is not None:
+                    raise stream.erro
+
+                if relatorio.linhas:
+                    cur.execute(DUPLICADAS_SQL, {
+                        'colaborador_id': colaborador_id,
+                        'de': relatorio.data_min,
+                        'ate': relatorio.data_max,
+                    })
+
+                cur.execute("""
+                    SELECT mes_vigente,
+                           COUNT(*) FILTER (WHERE NOT duplicada) AS novas,
+                           COUNT(*) FILTER (WHERE duplicada) AS duplicadas
+                    FROM importacao_staging
+                    GROUP BY mes_vigente
+                    ORDER BY mes_vigente
+                """)
+                meses = cur.fetchall()
+                total_novas = sum(m['novas'] for m in meses)
+                total_duplicadas = sum(m['duplicadas'] for m in meses)
+
+                cur.execute("""
+                    SELECT linha, data_compra, descricao, valor
+                    FROM importacao_staging WHERE duplicada
+                    ORDER BY linha LIMIT %s
+                """, (LIMITE_AMOSTRA,))
+                duplicadas = [_linha_json(r) for r in cur.fetchall()]
+
+                resultado = {
+                    'formato': formato,
+                    'dry_run': dry_run,
+                    'total_linhas': relatorio.linhas,
+                    'novas': total_novas,
+                    'duplicadas': total_duplicadas,
+                    'total_erros': relatorio.total_erros,
+                    'erros': [e._asdict() for e in relatorio.erros],
+                    'meses': meses,
+                    'amostra_duplicadas': duplicadas,
+                }
+
+                if dry_run:
+                    cur.execute("""
+                        SELECT linha, data_compra, mes_vigente, descricao, valor, tipo_pg, categoria, duplicada
+                        FROM importacao_staging
+                        ORDER BY linha LIMIT %s
+                    """, (LIMITE_AMOSTRA,))
+                    resultado['preview'] = [_linha_json(r) for r in cur.fetchall()]
+                    return _success_response(resultado)
+
+                if relatorio.total_erros and not ignorar_erros:
+                    return json_response({
+                        'error': 'Extrato com linhas inválidas; corrija ou envie ignorar_erros=true',
+                        'code': 'VALIDATION_FAILED',
+                        **resultado
+                    }, 400)
+
+                if total_novas:
+                    cur.execute(INSERIR_SQL)
+                    invalidar(cur, GRUPOS_DESPESA, [m['mes_vigente'] for m in meses if m['novas']])
+            conn.commit()
+
+        logger.info(
+            f"Extrato importado ({formato}, colaborador={colaborador_id}): "
+            f"{total_novas} novas, {total_duplicadas} duplicadas, {relatorio.total_erros} erros"
+        )
+        return _success_response({**resultado, 'message': 'Extrato importado com sucesso'}, 201)
+
+    except FormatoInvalido as e:
+        return _error_response(e.message, e.code)
+    except Exception as e:
+        logger.error(f"ERRO POST /api/importacao/extrato: {str(e)}", exc_info=True)
+        return _error_response('Erro ao importar extrato', 'IMPORT_FAILED', 500)
@@ -0,0 +1,276 @@
+# routes/recorrencias.py
+"""
+Despesas recorrentes routes - Protected with JWT authentication.
+
+All endpoints require valid JWT token.
+"""
+import logging
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from flask import Blueprint, request
+from flask_jwt_extended import jwt_required
+
+from connection import get_db_cursor
+from routes.despesas import (
+    CATEGORIAS_VALIDAS,
+    TIPOS_PG_VALIDOS,
+    DespesaInvalida,
+    normalizar_tipo_pg,
+)
+from routes.resumo import MAX_MESES_PERIODO, MES_ANO_RE
+from utils.cache import GRUPOS_DESPESA, invalidar
+from utils.colaboradores import buscar_colaborador
+from utils.json_utils import json_response
+
+logger = logging.getLogger(__name__)
+recorrencias_bp = Blueprint('recorrencias', __name__)
+
+FREQUENCIAS_VALIDAS = {'mensal', 'anual'}
+
+COLUNAS_RECORRENCIA = (
+    'descricao', 'valor', 'tipo_pg', 'colaborador_id', 'categoria',
+    'frequencia', 'dia', 'mes', 'inicio', 'fim', 'ativa',
+)
+
+
+def _error_response(message: str, code: str, status: int = 400):
+    return json_response({'error': message, 'code': code}, status)
+
+
+def _success_response(data, status: int = 200):
+    return json_response(data, status)
+
+
+def _data(valor, campo: str) -> date:
+    try:
+        return datetime.strptime(str(valor).split('T')[0], '%Y-%m-%d').date()
+    except ValueError:
+        raise DespesaInvalida(f'{campo} deve estar no formato YYYY-MM-DD', 'INVALID_DATE')
+
+
+def validar_recorrencia(data) -> dict:
+    """
+    Validate and normalize a recurrence rule payload.
+
+    Returns:
+        dict: The COLUNAS_RECORRENCIA values
+
+    Raises:
+        DespesaInvalida: Invalid payload
+    """
+    if not isinstance(data, dict) or not data:
+        raise DespesaInvalida('Dados JSON inválidos', 'INVALID_JSON')
+
+    required = ['descricao', 'valor', 'tipo_pg', 'colaborador_id', 'categoria', 'frequencia', 'dia', 'inicio']
+    missing = [f for f in required if not data.get(f)]
+    if missing:
+        raise DespesaInvalida(f'Campos obrigatórios faltando: {missing}', 'MISSING_FIELDS')
+
+    try:
+        valor = Decimal(str(data['valor']))
+        colab_id = int(data['colaborador_id'])
+        dia = int(data['dia'])
+        mes = int(data['mes']) if data.get('mes') else None
+    except (ValueError, TypeError, InvalidOperation):
+        raise DespesaInvalida('Dados inválidos (valor, colaborador_id, dia ou mes)', 'INVALID_DATA')
+    if not valor.is_finite() or valor <= Decimal('0'):
+        raise DespesaInvalida('Valor deve ser positivo', 'INVALID_VALUE')
+
+    tipo_pg = normalizar_tipo_pg(str(data['tipo_pg']))
+    if tipo_pg not in TIPOS_PG_VALIDOS:
+        raise DespesaInvalida('tipo_pg inválido', 'INVALID_TIPO_PG')
+    if data['categoria'] not in CATEGORIAS_VALIDAS:
+        raise DespesaInvalida('categoria inválida', 'INVALID_CATEGORY')
+
+    frequencia = data['frequencia']
+    if frequencia not in FREQUENCIAS_VALIDAS:
+        raise DespesaInvalida("frequencia deve ser 'mensal' ou 'anual'", 'INVALID_FREQUENCY')
+    if not (1 <= dia <= 31):
+        raise DespesaInvalida('dia deve estar entre 1 e 31', 'INVALID_DAY')
+    if frequencia == 'anual' and not (mes and 1 <= mes <= 12):
+        raise DespesaInvalida('Recorrências anuais precisam de mes entre 1 e 12', 'INVALID_MONTH')
+    if frequencia == 'mensal':
+        mes = None
+
+    inicio = _data(data['inicio'], 'inicio')
+    fim = _data(data['fim'], 'fim') if data.get('fim') else None
+    if fim is not None and fim < inicio:
+        raise DespesaInvalida('fim deve ser igual ou posterior a inicio', 'INVALID_RANGE')
+
+    return {
+        'descricao': data['descricao'],
+        'valor': valor,
+        'tipo_pg': tipo_pg,
+        'colaborador_id': colab_id,
+        'categoria': data['categoria'],
+        'frequencia': frequencia,
+        'dia': dia,
+        'mes': mes,
+        'inicio': inicio,
+        'fim': fim,
+        'ativa': bool(data.get('ativa', True)),
+    }
+
+
+def materializar_recorrencias(cur, de: str, ate: str) -> list[dict]:
+    """
+    Generate the due despesas of every active rule for the months de..ate.
+
+    One set-based INSERT in SQL (materializar_despesas_recorrentes, see
+    migrations/007_despesa_recorrente.sql); occurrences already generated
+    are skipped by the (recorrencia_id, recorrencia_data) unique key, so
+    any range can be re-run. Invalidates the months that got new rows.
+
+    Args:
+        cur: Cursor of the caller's transaction
+        de, ate: First and last month (YYYY-MM)
+
+    Returns:
+        list[dict]: {"mes_vigente", "quantidade"} of the new rows
+    """
+    cur.execute(
+        "SELECT * FROM materializar_despesas_recorrentes(%s, %s)",
+        (f"{de}-01", f"{ate}-01")
+    )
+    meses = cur.fetchall()
+    if meses:
+        invalidar(cur, GRUPOS_DESPESA, [m['mes_vigente'] for m in meses])
+    return meses
+
+
+def _json(row: dict) -> dict:
+    for campo in ('inicio', 'fim'):
+        if row.get(campo):
+            row[campo] = row[campo].isoformat()
+    row.pop('criado_em', None)
+    return row
+
+
+@recorrencias_bp.route('/recorrencias', methods=['GET'])
+@jwt_required()
+def listar_recorrencias():
+    """List recurrence rules."""
+    try:
+        with get_db_cursor(commit=False, readonly=True) as cur:
+            cur.execute("""
+                SELECT r.*, c.nome AS colaborador_nome
+                FROM despesa_recorrente r
+                JOIN colaborador c ON r.colaborador_id = c.id
+                ORDER BY r.ativa DESC, r.descricao, r.id
+            """)
+            return _success_response([_json(r) for r in cur.fetchall()])
+    except Exception as e:
+        logger.error(f"ERRO GET /api/recorrencias: {str(e)}", exc_info=True)
+        return _error_response('Erro ao buscar recorrências', 'FETCH_FAILED', 500)
+
+
+@recorrencias_bp.route('/recorrencias', methods=['POST'])
+@jwt_required()
+def criar_recorrencia():
+    """
+    Create a recurrence rule.
+
+    Nothing is generated until the next materialization (POST
+    /recorrencias/materializar or ``flask materializar-recorrencias``).
+    """
+    try:
+        try:
+            regra = validar_recorrencia(request.get_json(silent=True))
+        except DespesaInvalida as e:
+            return _error_response(e.message, e.code)
+
+        with get_db_cursor() as cur:
+            if not buscar_colaborador(cur, regra['colaborador_id']):
+                return _error_response('Colaborador não encontrado', 'COLLABORATOR_NOT_FOUND', 404)
+            cur.execute(f"""
+                INSERT INTO despesa_recorrente ({', '.join(COLUNAS_RECORRENCIA)})
+                VALUES ({', '.join(['%s'] * len(COLUNAS_RECORRENCIA))})
+                RETURNING id
+            """, [regra[c] for c in COLUNAS_RECORRENCIA])
+            recorrencia_id = cur.fetchone()['id']
+
+        logger.info(f"Recorrência criada: id={recorrencia_id}")
+        return _success_response({'id': recorrencia_id, 'message': 'Recorrência criada com sucesso'}, 201)
+
+    except Exception as e:
+        logger.error(f"ERRO POST /api/recorrencias: {str(e)}", exc_info=True)
+        return _error_response('Erro interno', 'CREATE_FAILED', 500)
+
+
+@recorrencias_bp.route('/recorrencias/<int:id>', methods=['PUT', 'DELETE'])
+@jwt_required()
+def recorrencia_por_id(id: int):
+    """
+    Update or delete a recurrence rule.
+
+    Changes apply to occurrences materialized afterwards; despesas already
+    generated are kept (on DELETE they just lose the link to the rule).
+    """
+    try:
+        with get_db_cursor() as cur:
+            if request.method == 'PUT':
+                try:
+                    regra = validar_recorrencia(request.get_json(silent=True))
+                except DespesaInvalida as e:
+                    return _error_response(e.message, e.code)
+
+                if not buscar_colaborador(cur, regra['colaborador_id']):
+                    return _error_response('Colaborador não encontrado', 'COLLABORATOR_NOT_FOUND', 404)
+                cur.execute(f"""
+                    UPDATE despesa_recorrente
+                    SET {', '.join(f'{c} = %s' for c in COLUNAS_RECORRENCIA)}
+                    WHERE id = %s
+                    RETURNING id
+                """, [regra[c] for c in COLUNAS_RECORRENCIA] + [id])
+                if not cur.fetchone():
+                    return _error_response('Recorrência não encontrada', 'NOT_FOUND', 404)
+                return _success_response({'message': 'Atualizado com sucesso'})
+
+            else:  # DELETE
+                cur.execute("DELETE FROM despesa_recorrente WHERE id = %s RETURNING id", (id,))
+                if not cur.fetchone():
+                    return _error_response('Recorrência não encontrada', 'NOT_FOUND', 404)
+                return _success_response({'message': 'Deletado com sucesso'})
+
+    except Exception as e:
+        logger.error(f"Erro em recorrencia_por_id (id={id}): {str(e)}", exc_info=True)
+        return _error_response('Erro interno', 'OPERATION_FAILED', 500)
+
+
+@recorrencias_bp.route('/recorrencias/materializar', methods=['POST'])
+@jwt_required()
+def materializar():
+    """
+    Generate the due despesas of every active rule.
+
+    Body (optional): ``{"de": "YYYY-MM", "ate": "YYYY-MM"}``, both
+    defaulting to the current month; occurrences after today are never
+    generated. Safe to repeat: existing occurrences are skipped.
+    """
+    data = request.get_json(silent=True) or {}
+    hoje = date.today().strftime('%Y-%m')
+    de, ate = data.get('de') or hoje, data.get('ate') or hoje
+    if not isinstance(de, str) or not isinstance(ate, str) or not MES_ANO_RE.match(de) or not MES_ANO_RE.match(ate):
+        return _error_response('de e ate devem estar no formato YYYY-MM', 'INVALID_MONTH')
+    if de > ate:
+        return _error_response("'de' deve ser anterior ou igual a 'ate'.", 'INVALID_RANGE')
+    meses_periodo = (int(ate[:4]) - int(de[:4])) * 12 + int(ate[5:]) - int(de[5:]) + 1
+    if meses_periodo > MAX_MESES_PERIODO:
+        return _error_response(f"Período máximo de {MAX_MESES_PERIODO} meses.", 'RANGE_TOO_LARGE')
+
+    try:
+        with get_db_cursor() as cur:
+            meses = materializar_recorrencias(cur, de, ate)
+        total = sum(m['quantidade'] for m in meses)
+        logger.info(f"Recorrências materializadas ({de}..{ate}): {total} despesas")
+        return _success_response({
+            'de': de,
+            'ate': ate,
+            'criadas': total,
+            'meses': meses,
+            'message': 'Recorrências materializadas com sucesso'
+        })
+    except Exception as e:
+        logger.error(f"ERRO POST /api/recorrencias/materializar: {str(e)}", exc_info=True)
+        return _error_response('Erro ao materializar recorrências', 'MATERIALIZE_FAILED', 500)
@@ -9,6 +9,10 @@ from flask import Blueprint, request
 from flask_jwt_extended import jwt_required
 from connection import get_db_connection, get_db_cursor
 from psycopg2.extras import RealDictCursor
+import psycopg2.errors
+from utils.cache import GRUPOS_RENDA, cached_response, invalidar
+from utils.colaboradores import buscar_colaborador
+from utils.columnar import campos_solicitados, lista_response, select_list
 import re
 import logging
 
@@ -26,6 +30,16 @@ def _success_response(data: dict, status: int = 200):
     return json_response(data, status)
 
 
+# ?fields= of GET /rendas -> SQL expression
+CAMPOS_RENDA = {
+    'id': 'rm.id',
+    'colaborador_id': 'rm.colaborador_id',
+    'mes_ano': 'rm.mes_ano',
+    'valor': 'rm.valor',
+    'nome': 'c.nome',
+}
+
+
 def validar_mes_ano(mes_ano: str) -> bool:
     return bool(re.match(r'^\d{4}-(0[1-9]|1[0-2])$', mes_ano))
 
@@ -48,29 +62,42 @@ def validar_renda_data(data: dict) -> list:
     return errors
 
 
+def _mes_filtrado() -> list | None:
+    """Months covered by GET /rendas (None = every month)."""
+    mes = request.args.get('mes')
+    return [mes] if mes else None
+
+
 @rendas_bp.route('/rendas', methods=['GET', 'POST'])
 @jwt_required()
+@cached_response('rendas', meses=lambda **kw: _mes_filtrado())
 def rendas():
     try:
         if request.method == 'GET':
             mes = request.args.get('mes')
-            with get_db_connection() as conn:
+            try:
+                campos = campos_solicitados(CAMPOS_RENDA)
+            except ValueError as e:
+                return _error_response(str(e), 'INVALID_FIELDS')
+            colunas_sql = "rm.*, c.nome" if campos is None else select_list(campos, CAMPOS_RENDA)
+            juntar = "JOIN colaborador c ON rm.colaborador_id = c.id" if campos is None or 'nome' in campos else ""
+            with get_db_connection(readonly=True) as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     if mes:
                         if not validar_mes_ano(mes):
                             return _error_response("Formato de mês inválido. Use YYYY-MM.", 'INVALID_MONTH')
-                        cur.execute("""
-                            SELECT rm.*, c.nome FROM renda_mensal rm
-                            JOIN colaborador c ON rm.colaborador_id = c.id
+                        cur.execute(f"""
+                            SELECT {colunas_sql} FROM renda_mensal rm
+                            {juntar}
                             WHERE rm.mes_ano = %s
                         """, (mes,))
                     else:
-                        cur.execute("""
-                            SELECT rm.*, c.nome FROM renda_mensal rm
-                            JOIN colaborador c ON rm.colaborador_id = c.id
+                        cur.execute(f"""
+                            SELECT {colunas_sql} FROM renda_mensal rm
+                            {juntar}
                         """)
                     # Decimal values are preserved from database (RealDictCursor returns Decimal)
-                    return _success_response(cur.fetchall())
+                    return lista_response(cur.fetchall(), campos)
 
         else:  # POST
             data = request.get_json()
@@ -79,8 +106,7 @@ def rendas():
                 return _error_response(errors[0], 'VALIDATION_FAILED', 400)
 
             with get_db_cursor() as cur:
-                cur.execute("SELECT id FROM colaborador WHERE id = %s", (data['colaborador_id'],))
-                if not cur.fetchone():
+                if not buscar_colaborador(cur, data['colaborador_id']):
                     return _error_response("Colaborador não encontrado", 'COLLABORATOR_NOT_FOUND', 404)
 
                 valor = Decimal(str(data['valor']))
@@ -93,11 +119,15 @@ def rendas():
                     RETURNING id
                 """, (data['colaborador_id'], data['mes_ano'], valor))
                 result = cur.fetchone()
+                invalidar(cur, GRUPOS_RENDA, [data['mes_ano']])
                 return _success_response({
                     "id": result['id'],
                     "message": "Renda registrada/atualizada com sucesso"
                 }, 201)
 
+    except psycopg2.errors.ForeignKeyViolation:
+        # Colaborador deleted by another worker an instant ago
+        return _error_response("Colaborador não encontrado", 'COLLABORATOR_NOT_FOUND', 404)
     except Exception as e:
         logger.error(f"Erro em /rendas: {e}")
         return _error_response("Erro interno no processamento de rendas", 'OPERATION_FAILED', 500)
@@ -109,8 +139,9 @@ def renda_id(id: int):
     try:
         with get_db_connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT id FROM renda_mensal WHERE id = %s", (id,))
-                if not cur.fetchone():
+                cur.execute("SELECT id, mes_ano FROM renda_mensal WHERE id = %s", (id,))
+                renda = cur.fetchone()
+                if not renda:
                     return _error_response("Renda não encontrada", 'NOT_FOUND', 404)
 
                 if request.method == 'PUT':
@@ -126,11 +157,13 @@ def renda_id(id: int):
                         return _error_response("Valor deve ser um número válido", 'INVALID_VALUE')
 
                     cur.execute("UPDATE renda_mensal SET valor = %s WHERE id = %s", (valor, id))
+                    invalidar(cur, GRUPOS_RENDA, [renda['mes_ano']])
                     conn.commit()
                     return _success_response({"message": "Renda atualizada com sucesso"})
 
                 else:  # DELETE
                     cur.execute("DELETE FROM renda_mensal WHERE id = %s", (id,))
+                    invalidar(cur, GRUPOS_RENDA, [renda['mes_ano']])
                     conn.commit()
                     return _success_response({"message": "Renda deletada com sucesso"})
 
@@ -5,10 +5,13 @@ Resumo Financeiro routes - Protected with JWT authentication.
 All endpoints require valid JWT token.
 """
 from decimal import Decimal, ROUND_HALF_UP
-from flask import Blueprint
+from itertools import groupby
+from operator import itemgetter
+from flask import Blueprint, request
 from flask_jwt_extended import jwt_required
 from connection import get_db_connection
 from psycopg2.extras import RealDictCursor
+from utils.cache import cached_response
 import re
 import logging
 
@@ -26,114 +29,291 @@ def _success_response(data: dict, status: int = 200):
     return json_response(data, status)
 
 
+CENTAVO = Decimal('0.01')
+
+# Maximum span of /api/resumo?de=&ate= (20 years)
+MAX_MESES_PERIODO = 240
+
+MES_ANO_RE = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+# Everything the summaries of a month range need in one round trip: for each
+# (month, colaborador) the income and payments, plus the month totals and
+# the missing-income count. Zero rows for a month = no colaboradores.
+# Payments come from despesa_agregado_mensal (migration 002), so the cost is
+# O(meses x colaboradores), not O(despesas). The shares are rounded in
+# _montar_resumo, with the same Decimal rounding the per-query code used.
+#
+# With %(usar_snapshots)s, settled months (migration 003) ride along: a
+# month whose snapshot is current comes back as a single row carrying it
+# and isn't computed; a month whose snapshot is outdated is computed live,
+# its rows carrying snapshot_em/snapshot_desatualizado.
+RESUMO_SQL = """
+    WITH meses AS (
+        SELECT to_char(m, 'YYYY-MM') AS mes
+        FROM generate_series(
+            to_date(%(de)s, 'YYYY-MM'), to_date(%(ate)s, 'YYYY-MM'), interval '1 month'
+        ) AS m
+    ),
+    snapshots AS (
+        SELECT mes_ano AS mes, snapshot, snapshot_em, snapshot_desatualizado
+        FROM divisao_mensal
+        WHERE %(usar_snapshots)s AND paga AND snapshot IS NOT NULL
+          AND mes_ano BETWEEN %(de)s AND %(ate)s
+    ),
+    calcular AS (
+        SELECT m.mes FROM meses m
+        WHERE NOT EXISTS (
+            SELECT 1 FROM snapshots s WHERE s.mes = m.mes AND NOT s.snapshot_desatualizado
+        )
+    ),
+    pagamentos AS (
+        SELECT mes_vigente AS mes, colaborador_id, SUM(total) AS pagou
+        FROM despesa_agregado_mensal
+        WHERE mes_vigente IN (SELECT mes FROM calcular)
+        GROUP BY mes_vigente, colaborador_id
+    ),
+    base AS (
+        SELECT m.mes, c.id, c.nome, r.valor AS renda, COALESCE(p.pagou, 0) AS pagou
+        FROM calcular m
+        CROSS JOIN colaborador c
+        LEFT JOIN renda_mensal r ON r.colaborador_id = c.id AND r.mes_ano = m.mes
+        LEFT JOIN pagamentos p ON p.colaborador_id = c.id AND p.mes = m.mes
+    ),
+    calculadas AS (
+        SELECT b.*,
+               SUM(b.pagou) OVER w AS total_despesas,
+               COALESCE(SUM(b.renda) OVER w, 0) AS total_renda,
+               COUNT(*) FILTER (WHERE b.renda IS NULL) OVER w AS sem_renda
+        FROM base b
+        WINDOW w AS (PARTITION BY b.mes)
+    )
+    SELECT l.*, s.snapshot, s.snapshot_em, s.snapshot_desatualizado
+    FROM (
+        SELECT * FROM calculadas
+        UNION ALL
+        SELECT s.mes, NULL, NULL, NULL, NULL, NULL, NULL, NULL
+        FROM snapshots s
+        WHERE NOT s.snapshot_desatualizado
+    ) l
+    LEFT JOIN snapshots s ON s.mes = l.mes
+    ORDER BY l.mes, l.nome, l.id
+"""
+
+
+class ResumoIndisponivel(Exception):
+    """The month's summary cannot be computed (e.g. missing incomes)."""
+
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+def _montar_resumo(mes_ano: str, rows: list) -> dict:
+    """
+    Build one month's summary from its rows of RESUMO_SQL (ordered by nome).
+
+    Raises:
+        ResumoIndisponivel: Missing incomes or zero income
+    """
+    totais = rows[0]
+    if totais['sem_renda']:
+        colaboradores_sem_renda = [r['nome'] for r in rows if r['renda'] is None]
+        raise ResumoIndisponivel(
+            f"Rendas não registradas para: {', '.join(colaboradores_sem_renda)}",
+            'MISSING_INCOMES'
+        )
+
+    total_despesas = totais['total_despesas']
+    total_renda = totais['total_renda']
+    if total_renda == 0:
+        raise ResumoIndisponivel("Renda total zero para o mês", 'ZERO_INCOME')
+
+    colaboradores = []
+    soma_partes = Decimal('0')
+    for r in rows:
+        perc = r['renda'] / total_renda
+        deve_pagar = (total_despesas * perc).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+        soma_partes += deve_pagar
+        saldo = r['pagou'] - deve_pagar
+        colaboradores.append({
+            "id": r['id'],
+            "nome": r['nome'],
+            "renda": r['renda'].quantize(CENTAVO),
+            "percentual": (perc * 100).quantize(CENTAVO),
+            "deve_pagar": deve_pagar,
+            "pagou": r['pagou'].quantize(CENTAVO),
+            "saldo": saldo.quantize(CENTAVO),
+            "status": "positivo" if saldo >= 0 else "negativo"
+        })
+
+    # Ajustar centavo residual no último colaborador (ordem por nome)
+    diferenca = total_despesas - soma_partes
+    if diferenca != Decimal('0'):
+        colaboradores[-1]['deve_pagar'] += diferenca
+        colaboradores[-1]['saldo'] -= diferenca
+
+    colaboradores.sort(key=lambda x: x['saldo'], reverse=True)
+
+    return {
+        "mes": mes_ano,
+        "total_despesas": total_despesas.quantize(CENTAVO),
+        "total_renda": total_renda.quantize(CENTAVO),
+        "saldo_total": (total_renda - total_despesas).quantize(CENTAVO),
+        "total_colaboradores": len(colaboradores),
+        "colaboradores": colaboradores
+    }
+
+
+def _resumo_do_mes(mes_ano: str, rows: list) -> dict:
+    """
+    One month's summary from its rows of RESUMO_SQL: the stored snapshot if
+    current, else computed (flagged as outdated if the month was settled).
+
+    Raises:
+        ResumoIndisponivel: Missing incomes or zero income
+    """
+    primeira = rows[0]
+    if primeira['snapshot_em'] is None:
+        return _montar_resumo(mes_ano, rows)
+    if primeira['snapshot'] is not None and not primeira['snapshot_desatualizado']:
+        resumo = dict(primeira['snapshot'])
+    else:
+        # Changed after the settlement: the frozen numbers no longer hold
+        resumo = _montar_resumo(mes_ano, rows)
+    resumo['snapshot'] = {
+        "congelado_em": primeira['snapshot_em'].isoformat(),
+        "desatualizado": primeira['snapshot_desatualizado'],
+    }
+    return resumo
+
+
+def _linhas_por_mes(cur, de: str, ate: str, usar_snapshots: bool) -> dict:
+    """Rows of RESUMO_SQL grouped by month; every month of [de, ate] present."""
+    cur.execute(RESUMO_SQL, {'de': de, 'ate': ate, 'usar_snapshots': usar_snapshots})
+    por_mes = {mes: list(linhas) for mes, linhas in groupby(cur.fetchall(), key=itemgetter('mes'))}
+    # A month left to compute with no rows at all means no colaboradores
+    if len(por_mes) < (int(ate[:4]) - int(de[:4])) * 12 + int(ate[5:]) - int(de[5:]) + 1:
+        raise ResumoIndisponivel("Nenhum colaborador cadastrado", 'NO_COLLABORATORS')
+    return por_mes
+
+
+def calcular_resumos(cur, de: str, ate: str, usar_snapshots: bool = False) -> list[dict]:
+    """
+    Compute the summaries of every month in [de, ate] with a single query.
+
+    Months that cannot be computed (missing or zero income) are reported
+    in place as ``{"mes", "error", "code"}`` instead of aborting the range.
+
+    Args:
+        cur: Open cursor (RealDictCursor)
+        de: First month (YYYY-MM)
+        ate: Last month (YYYY-MM), inclusive
+        usar_snapshots: Serve settled months from their current snapshot
+            (see _resumo_do_mes), in the same query
+
+    Returns:
+        list[dict]: One entry per month, in chronological order
+
+    Raises:
+        ResumoIndisponivel: No colaboradores registered
+    """
+    resumos = []
+    for mes, linhas in _linhas_por_mes(cur, de, ate, usar_snapshots).items():
+        try:
+            resumos.append(_resumo_do_mes(mes, linhas))
+        except ResumoIndisponivel as e:
+            resumos.append({"mes": mes, "error": e.message, "code": e.code})
+    return resumos
+
+
+def calcular_resumo(cur, mes_ano: str, usar_snapshots: bool = False) -> dict:
+    """
+    Compute the month's summary with a single query.
+
+    Args:
+        cur: Open cursor (RealDictCursor)
+        mes_ano: Month in YYYY-MM format
+        usar_snapshots: Serve a settled month from its current snapshot
+
+    Returns:
+        dict: Summary payload (Decimal values)
+
+    Raises:
+        ResumoIndisponivel: No colaboradores, missing incomes or zero income
+    """
+    return _resumo_do_mes(mes_ano, _linhas_por_mes(cur, mes_ano, mes_ano, usar_snapshots)[mes_ano])
+
+
+def _usar_snapshots() -> bool:
+    """Settled months are served from their snapshot unless ?recalcular=true."""
+    return request.args.get('recalcular', '').lower() not in ('1', 'true')
+
+
+def _meses_periodo() -> list | None:
+    """Months covered by a successful /resumo?de=&ate= response."""
+    de = request.args.get('de', '')
+    ate = request.args.get('ate', '')
+    if not MES_ANO_RE.match(de) or not MES_ANO_RE.match(ate):
+        return None
+    ano, mes = int(de[:4]), int(de[5:])
+    meses = []
+    while f"{ano}-{mes:02d}" <= ate:
+        meses.append(f"{ano}-{mes:02d}")
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return meses
+
+
+@resumo_bp.route('/resumo')
+@jwt_required()
+@cached_response('resumo', meses=lambda **kw: _meses_periodo())
+def resumo_periodo():
+    """Summaries of every month in ?de=YYYY-MM&ate=YYYY-MM (one query)."""
+    de = request.args.get('de', '')
+    ate = request.args.get('ate', '')
+    if not MES_ANO_RE.match(de) or not MES_ANO_RE.match(ate):
+        return _error_response("Parâmetros de e ate são obrigatórios no formato YYYY-MM.", 'INVALID_MONTH')
+    if de > ate:
+        return _error_response("'de' deve ser anterior ou igual a 'ate'.", 'INVALID_RANGE')
+
+    total_meses = (int(ate[:4]) - int(de[:4])) * 12 + int(ate[5:]) - int(de[5:]) + 1
+    if total_meses > MAX_MESES_PERIODO:
+        return _error_response(f"Período máximo de {MAX_MESES_PERIODO} meses.", 'RANGE_TOO_LARGE')
+
+    try:
+        with get_db_connection(readonly=True) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                resumos = calcular_resumos(cur, de, ate, usar_snapshots=_usar_snapshots())
+
+        return _success_response({
+            "de": de,
+            "ate": ate,
+            "total_meses": len(resumos),
+            "meses": resumos
+        })
+
+    except ResumoIndisponivel as e:
+        return _error_response(e.message, e.code)
+    except Exception as e:
+        logger.error(f"Erro ao gerar resumo de {de} a {ate}: {e}")
+        return _error_response("Erro interno no cálculo do resumo", 'CALCULATION_FAILED', 500)
+
+
 @resumo_bp.route('/resumo/<mes_ano>')
 @jwt_required()
+@cached_response('resumo', meses=lambda mes_ano: [mes_ano])
 def resumo(mes_ano: str):
     # Validar formato do mês
-    if not re.match(r'^\d{4}-(0[1-9]|1[0-2])$', mes_ano):
+    if not MES_ANO_RE.match(mes_ano):
         return _error_response("Formato de mês inválido. Use YYYY-MM.", 'INVALID_MONTH')
 
     try:
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # 1. Verificar colaboradores
-                cur.execute("SELECT COUNT(*) as total FROM colaborador")
-                total_colabs = cur.fetchone()['total']
-                if total_colabs == 0:
-                    return _error_response("Nenhum colaborador cadastrado", 'NO_COLLABORATORS')
-
-                # 2. Total de despesas como Decimal
-                cur.execute("""
-                    SELECT COALESCE(SUM(valor), 0) AS total
-                    FROM despesa
-                    WHERE mes_vigente = %s
-                """, (mes_ano,))
-                total_despesas = Decimal(str(cur.fetchone()['total']))
-
-                # 3. Rendas por colaborador
-                cur.execute("""
-                    SELECT c.id, c.nome, r.valor
-                    FROM colaborador c
-                    LEFT JOIN renda_mensal r ON c.id = r.colaborador_id AND r.mes_ano = %s
-                    ORDER BY c.nome
-                """, (mes_ano,))
-                rendas = cur.fetchall()
-
-                # Converter valores para Decimal
-                for r in rendas:
-                    if r['valor'] is not None:
-                        r['valor'] = Decimal(str(r['valor']))
-
-                # Verificar rendas faltantes
-                colaboradores_sem_renda = [r['nome'] for r in rendas if r['valor'] is None]
-                if colaboradores_sem_renda:
-                    return _error_response(
-                        f"Rendas não registradas para: {', '.join(colaboradores_sem_renda)}",
-                        'MISSING_INCOMES',
-                        400
-                    )
-
-                total_renda = sum(r['valor'] for r in rendas if r['valor'])
-                if total_renda == 0:
-                    return _error_response("Renda total zero para o mês", 'ZERO_INCOME')
-
-                # 4. OTIMIZAÇÃO: Uma query para todos os pagamentos (elimina N+1)
-                cur.execute("""
-                    SELECT colaborador_id, COALESCE(SUM(valor), 0) AS total
-                    FROM despesa
-                    WHERE mes_vigente = %s
-                    GROUP BY colaborador_id
-                """, (mes_ano,))
-                pagamentos_dict = {
-                    row['colaborador_id']: Decimal(str(row['total']))
-                    for row in cur.fetchall()
-                }
-
-                # 5. Montar resposta com cálculo de divisão preciso
-                colaboradores = []
-                partes = []
-
-                for r in rendas:
-                    valor_renda = r['valor'] or Decimal('0')
-                    perc = valor_renda / total_renda
-                    deve_pagar = (total_despesas * perc).quantize(
-                        Decimal('0.01'),
-                        rounding=ROUND_HALF_UP
-                    )
-                    partes.append(deve_pagar)
-
-                    pagou = pagamentos_dict.get(r['id'], Decimal('0'))
-                    saldo = pagou - deve_pagar
-
-                    colaboradores.append({
-                        "id": r['id'],
-                        "nome": r['nome'],
-                        "renda": valor_renda.quantize(Decimal('0.01')),
-                        "percentual": (perc * 100).quantize(Decimal('0.01')),
-                        "deve_pagar": deve_pagar,
-                        "pagou": pagou.quantize(Decimal('0.01')),
-                        "saldo": saldo.quantize(Decimal('0.01')),
-                        "status": "positivo" if saldo >= 0 else "negativo"
-                    })
-
-                # Ajustar centavo residual no último colaborador
-                soma_partes = sum(partes)
-                diferenca = total_despesas - soma_partes
-                if diferenca != Decimal('0') and colaboradores:
-                    colaboradores[-1]['deve_pagar'] += diferenca
-                    colaboradores[-1]['saldo'] -= diferenca
-
-                colaboradores.sort(key=lambda x: x['saldo'], reverse=True)
-
-                return _success_response({
-                    "mes": mes_ano,
-                    "total_despesas": total_despesas.quantize(Decimal('0.01')),
-                    "total_renda": total_renda.quantize(Decimal('0.01')),
-                    "saldo_total": (total_renda - total_despesas).quantize(Decimal('0.01')),
-                    "total_colaboradores": len(colaboradores),
-                    "colaboradores": colaboradores
-                })
+                return _success_response(calcular_resumo(cur, mes_ano, usar_snapshots=_usar_snapshots()))
 
+    except ResumoIndisponivel as e:
+        return _error_response(e.message, e.code)
     except Exception as e:
         logger.error(f"Erro ao gerar resumo para {mes_ano}: {e}")
-        return _error_response("Erro interno no cálculo do resumo", 'CALCULATION_FAILED', 500)
\ No newline at end of file
+        return _error_response("Erro interno no cálculo do resumo", 'CALCULATION_FAILED', 500)
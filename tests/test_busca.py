@@ -0,0 +1,66 @@
+"""GET /despesas/search: filter parsing and keyset cursors."""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+
+from routes.despesas import (
+    BuscaInvalida,
+    _codificar_cursor_busca,
+    _decodificar_cursor_busca,
+    _filtros_busca,
+)
+
+app = Flask(__name__)
+
+
+def _filtros(query: str):
+    with app.test_request_context(f'/api/despesas/search?{query}'):
+        return _filtros_busca()
+
+
+def test_combines_filters_with_named_params():
+    filtros, params = _filtros(
+        'q=mercado&categoria=saude,alimentacao&colaborador_id=1&colaborador_id=2'
+        '&de=2024-01-01&valor_max=99.90'
+    )
+
+    assert len(filtros) == 5
+    assert params['q'] == 'mercado'
+    assert params['categorias'] == ['saude', 'alimentacao']
+    assert params['colaboradores'] == [1, 2]
+    assert params['de'] == date(2024, 1, 1)
+    assert params['valor_max'] == Decimal('99.90')
+
+
+def test_like_wildcards_in_q_are_escaped():
+    _, params = _filtros('q=50%25_off')
+
+    assert params['padrao'] == '50\\%\\_off'
+
+
+@pytest.mark.parametrize('query, code', [
+    ('q=ab', 'QUERY_TOO_SHORT'),
+    ('categoria=viagem', 'INVALID_CATEGORY'),
+    ('colaborador_id=x', 'INVALID_DATA'),
+    ('de=01/02/2024', 'INVALID_DATE'),
+    ('valor_min=abc', 'INVALID_VALUE'),
+    ('valor_min=NaN', 'INVALID_VALUE'),
+])
+def test_invalid_filters_are_rejected(query, code):
+    with pytest.raises(BuscaInvalida) as erro:
+        _filtros(query)
+    assert erro.value.code == code
+
+
+@pytest.mark.parametrize('relevancia', [0.123456789, None])
+def test_cursor_round_trip(relevancia):
+    token = _codificar_cursor_busca(relevancia, '2024-03-07', 42, 50)
+
+    assert _decodificar_cursor_busca(token) == (relevancia, date(2024, 3, 7), 42, 50)
+
+
+def test_malformed_cursor_raises_value_error():
+    with pytest.raises(ValueError):
+        _decodificar_cursor_busca('bm9wZQ')
@@ -0,0 +1,113 @@
+"""ConnectionPool: checkout timeout, wait queue, recycling and LIFO reuse."""
+import threading
+import time
+
+import pytest
+from psycopg2 import extensions as _ext
+from psycopg2.pool import PoolError
+
+import connection
+from connection import ConnectionPool
+
+
+class FakeInfo:
+    transaction_status = _ext.TRANSACTION_STATUS_IDLE
+
+
+class FakeConn:
+    def __init__(self):
+        self.closed = 0
+        self.info = FakeInfo()
+        self.autocommit = False
+
+    def close(self):
+        self.closed = 1
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fake_connect(monkeypatch):
+    monkeypatch.setattr(connection.psycopg2, 'connect', lambda **kwargs: FakeConn())
+
+
+def _pool(**kwargs):
+    kwargs.setdefault('check_idle', -1)  # no ping round trip
+    return ConnectionPool(0, kwargs.pop('maxconn', 1), **kwargs)
+
+
+def test_checkout_times_out_when_pool_is_full():
+    pool = _pool(timeout=0.05)
+    pool.getconn()
+
+    inicio = time.monotonic()
+    with pytest.raises(PoolError, match='timeout'):
+        pool.getconn()
+    assert time.monotonic() - inicio >= 0.05
+    assert pool.stats()['timeouts'] == 1
+    assert pool.stats()['waiting'] == 0
+
+
+def test_waiter_gets_connection_returned_before_deadline():
+    pool = _pool(timeout=2)
+    conn = pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(conn,)).start()
+
+    assert pool.getconn() is conn
+    assert pool.stats()['reused'] == 1
+
+
+def test_rejects_immediately_when_wait_queue_is_full():
+    pool = _pool(timeout=2, max_waiting=1)
+    conn = pool.getconn()
+    esperando = threading.Thread(target=pool.getconn)
+    esperando.start()
+    while pool.stats()['waiting'] < 1:
+        time.sleep(0.001)
+
+    inicio = time.monotonic()
+    with pytest.raises(PoolError, match='fila de espera cheia'):
+        pool.getconn()
+    assert time.monotonic() - inicio < 1
+
+    pool.putconn(conn)
+    esperando.join()
+
+
+def test_recycles_connection_past_max_lifetime(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(connection.time, 'monotonic', lambda: agora[0])
+    pool = _pool(max_lifetime=60)
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    agora[0] += 61
+    novo = pool.getconn()
+    assert novo is not conn
+    assert conn.closed
+    assert pool.stats()['recycled'] == 1
+
+
+def test_recycles_connection_after_max_uses():
+    pool = _pool(max_uses=2, max_lifetime=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    pool.putconn(conn)  # second use: closed on return
+
+    assert conn.closed
+    assert pool.stats()['idle'] == 0
+    assert pool.getconn() is not conn
+    assert pool.stats()['recycled'] == 1
+
+
+def test_reuses_most_recently_returned_connection():
+    pool = _pool(maxconn=3)
+    a, b, c = pool.getconn(), pool.getconn(), pool.getconn()
+    for conn in (a, b, c):
+        pool.putconn(conn)
+
+    assert pool.getconn() is c
+    assert pool.getconn() is b
+    assert pool.stats()['created'] == 3
@@ -0,0 +1,95 @@
+"""Statement parsing: amount separators and per-file decimal convention."""
+import io
+from decimal import Decimal, InvalidOperation
+
+import pytest
+
+from utils.importacao import (
+    ErroLinha,
+    LinhaExtrato,
+    ValorAmbiguo,
+    ler_csv,
+    ler_ofx,
+    parse_valor,
+    separador_decimal,
+)
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('1.234,56', Decimal('1234.56')),
+    ('1,234.56', Decimal('1234.56')),
+    ('R$ -12,30', Decimal('-12.30')),
+    ('R$\xa01.234,56', Decimal('1234.56')),
+    ('1234.56', Decimal('1234.56')),
+    ('(12.30)', Decimal('-12.30')),
+    ('12,3', Decimal('12.3')),
+    ('1.234.567', Decimal('1234567')),
+    ('1,234,567.89', Decimal('1234567.89')),
+    ('42', Decimal('42')),
+])
+def test_parse_valor(texto, esperado):
+    assert parse_valor(texto) == esperado
+
+
+@pytest.mark.parametrize('texto', ['1.234', '1,234', '-1.234'])
+def test_lone_separator_before_three_digits_is_ambiguous(texto):
+    with pytest.raises(ValorAmbiguo):
+        parse_valor(texto)
+
+
+@pytest.mark.parametrize('texto, decimal, esperado', [
+    ('1.234', ',', Decimal('1234')),
+    ('1.234', '.', Decimal('1.234')),
+    ('1,234', ',', Decimal('1.234')),
+    ('1,234', '.', Decimal('1234')),
+])
+def test_ambiguous_value_follows_file_convention(texto, decimal, esperado):
+    assert parse_valor(texto, decimal) == esperado
+
+
+@pytest.mark.parametrize('texto', ['abc', '1.23.45', '12,34,5', '1,2.3,4', 'NaN', ''])
+def test_parse_valor_rejects_garbage(texto):
+    with pytest.raises(InvalidOperation):
+        parse_valor(texto)
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('1.234,56', ','),
+    ('1,234.56', '.'),
+    ('1.234.567', ','),
+    ('12,3', ','),
+    ('12.30', '.'),
+    ('123', None),
+])
+def test_separador_decimal(texto, esperado):
+    assert separador_decimal(texto) == esperado
+
+
+def _csv(*valores: str) -> io.StringIO:
+    linhas = ['data;descricao;valor'] + [f'0{i + 1}/02/2024;item {i};{v}' for i, v in enumerate(valores)]
+    return io.StringIO('\n'.join(linhas) + '\n')
+
+
+def test_csv_resolves_ambiguous_lines_from_a_later_line():
+    itens = list(ler_csv(_csv('1.234', '12,50', '2.000')))
+
+    assert all(isinstance(i, LinhaExtrato) for i in itens)
+    assert {i.linha: i.valor for i in itens} == {
+        2: Decimal('1234'), 3: Decimal('12.50'), 4: Decimal('2000'),
+    }
+
+
+def test_csv_reports_unresolved_ambiguous_line_and_keeps_the_rest():
+    itens = list(ler_csv(_csv('1.234', '20')))
+
+    assert itens[0] == LinhaExtrato(3, itens[0].data_compra, 'item 1', Decimal('20'))
+    assert isinstance(itens[1], ErroLinha)
+    assert (itens[1].linha, itens[1].code) == (2, 'AMBIGUOUS_AMOUNT')
+
+
+def test_ofx_amount_is_a_plain_decimal():
+    ofx = io.StringIO(
+        '<OFX><STMTTRN><DTPOSTED>20240102<TRNAMT>-1.234<MEMO>mercado</STMTTRN>'
+        '<STMTTRN><DTPOSTED>20240103<TRNAMT>-12,5<MEMO>padaria</STMTTRN></OFX>'
+    )
+    assert [i.valor for i in ler_ofx(ofx)] == [Decimal('1.234'), Decimal('12.5')]
@@ -0,0 +1,76 @@
+"""Installment purchases: cent split and month offsets."""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from routes.despesas import dividir_parcelas, linhas_despesa
+from utils.date_utils import adicionar_meses
+
+
+@pytest.mark.parametrize('valor, parcelas', [
+    ('100.00', 3),
+    ('0.05', 5),
+    ('999.99', 12),
+    ('10', 7),
+    ('1234.567', 4),
+])
+def test_installments_add_up_to_the_total(valor, parcelas):
+    partes = dividir_parcelas(Decimal(valor), parcelas)
+
+    assert len(partes) == parcelas
+    assert sum(partes) == Decimal(valor).quantize(Decimal('0.01'))
+    assert all(p.as_tuple().exponent == -2 for p in partes)
+    assert max(partes) - min(partes) < Decimal('0.01') * parcelas
+
+
+def test_first_installment_takes_the_leftover_cents():
+    assert dividir_parcelas(Decimal('100.00'), 3) == [Decimal('33.34'), Decimal('33.33'), Decimal('33.33')]
+
+
+@pytest.mark.parametrize('mes, meses, esperado', [
+    ('2024-11', 1, '2024-12'),
+    ('2024-11', 2, '2025-01'),
+    ('2024-12', 1, '2025-01'),
+    ('2024-01', 12, '2025-01'),
+    ('2024-10', 27, '2027-01'),
+    ('2024-03', 0, '2024-03'),
+])
+def test_adicionar_meses_rolls_over_the_year(mes, meses, esperado):
+    assert adicionar_meses(mes, meses) == esperado
+
+
+def _despesa(parcelas: int, data_compra: date, valor: str = '300.00') -> dict:
+    return {
+        'data_compra': data_compra,
+        'descricao': 'geladeira',
+        'valor': Decimal(valor),
+        'tipo_pg': 'credito',
+        'colaborador_id': 1,
+        'categoria': 'casa_utilidades',
+        'parcelas': parcelas,
+    }
+
+
+def test_installments_land_in_consecutive_months_across_the_year():
+    # Bought after the closing day: the first installment is already January
+    linhas = linhas_despesa(_despesa(4, date(2024, 12, 20)), dia_fechamento=10)
+
+    assert [linha[1] for linha in linhas] == ['2025-01', '2025-02', '2025-03', '2025-04']
+    assert [linha[8:] for linha in linhas] == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    assert len({linha[7] for linha in linhas}) == 1
+    assert sum(linha[3] for linha in linhas) == Decimal('300.00')
+
+
+def test_closing_day_past_month_end_never_repeats_a_month():
+    linhas = linhas_despesa(_despesa(3, date(2024, 1, 31)), dia_fechamento=31)
+
+    assert [linha[1] for linha in linhas] == ['2024-01', '2024-02', '2024-03']
+
+
+def test_single_payment_has_no_installment_columns():
+    (linha,) = linhas_despesa(_despesa(1, date(2024, 12, 20)), dia_fechamento=10)
+
+    assert linha[1] == '2025-01'
+    assert linha[3] == Decimal('300.00')
+    assert linha[7:] == (None, None, None)
@@ -0,0 +1,132 @@
+"""Sliding-window rate limiter: rules, window rollover and Retry-After."""
+import pytest
+from flask import Flask
+
+from utils import rate_limit
+from utils.rate_limit import Regra, SlidingWindowLimiter, _espera, parse_regras
+
+CHAVE = ('auth.login', 60, 'ip', '10.0.0.1')
+
+
+def test_parse_regras():
+    regras = parse_regras('auth.login=10/60@ip, auth.login=5/60@user:falhas,rendas.rendas=120/60')
+
+    assert regras == {
+        'auth.login': [Regra(10, 60, 'ip'), Regra(5, 60, 'user', falhas=True)],
+        'rendas.rendas': [Regra(120, 60, 'ip')],
+    }
+
+
+@pytest.mark.parametrize('valor', ['auth.login', 'a=10@ip', 'a=0/60', 'a=10/60@grupo', 'a=10/60@user:todas'])
+def test_parse_regras_rejects_malformed_rules(valor):
+    with pytest.raises(ValueError):
+        parse_regras(valor)
+
+
+def test_rejects_past_the_limit_until_the_next_window():
+    limiter = SlidingWindowLimiter()
+    assert all(limiter.registrar(CHAVE, 10, 60, 1.0 + i) is None for i in range(10))
+
+    # Full current window: only the next one makes room
+    assert limiter.registrar(CHAVE, 10, 60, 30.0) == pytest.approx(30.0)
+    assert limiter.stats()['rejected'] == 1
+
+
+def test_previous_window_share_decays_after_rollover():
+    limiter = SlidingWindowLimiter()
+    for i in range(10):
+        limiter.registrar(CHAVE, 10, 60, 1.0 + i)
+
+    # 15s into the next window the previous 10 weigh 7.5: two more fit
+    assert limiter.registrar(CHAVE, 10, 60, 75.0) is None
+    assert limiter.registrar(CHAVE, 10, 60, 75.0) is None
+    # 9.5 + 1 > 10: the overflow of 0.5 decays at 10/60 per second
+    assert limiter.registrar(CHAVE, 10, 60, 75.0) == pytest.approx(3.0)
+    assert limiter.registrar(CHAVE, 10, 60, 78.0) is None
+
+
+def test_idle_window_clears_the_previous_count():
+    limiter = SlidingWindowLimiter()
+    for i in range(10):
+        limiter.registrar(CHAVE, 10, 60, 1.0 + i)
+
+    assert all(limiter.registrar(CHAVE, 10, 60, 125.0) is None for _ in range(10))
+
+
+@pytest.mark.parametrize('anterior, atual, agora, esperado', [
+    (0, 3, 10.0, None),
+    (0, 5, 10.0, 50.0),
+    (10, 0, 45.0, None),
+    # 10 * 0.5 + 1 > 5: the overflow of 1 decays at 10/60 per second
+    (10, 0, 30.0, 6.0),
+    # Current window full: wait for the next one
+    (10, 5, 30.0, 30.0),
+    (4, 2, 0.0, 30.0),
+])
+def test_espera(anterior, atual, agora, esperado):
+    espera = _espera(anterior, atual, 5, 60, agora)
+    assert espera == (None if esperado is None else pytest.approx(esperado))
+
+
+def test_check_without_counting_does_not_create_keys():
+    limiter = SlidingWindowLimiter()
+
+    assert limiter.registrar(CHAVE, 1, 60, 1.0, contar=False) is None
+    assert limiter.stats()['keys'] == 0
+    limiter.contar(CHAVE, 60, 2.0)
+    assert limiter.registrar(CHAVE, 1, 60, 3.0, contar=False) == pytest.approx(57.0)
+
+
+def test_lru_is_bounded_by_max_keys():
+    limiter = SlidingWindowLimiter(max_chaves=2)
+    for ip in ('a', 'b', 'c'):
+        limiter.registrar(('x', 60, 'ip', ip), 1, 60, 1.0)
+
+    assert limiter.stats()['keys'] == 2
+    # 'a' was evicted, so its counter starts over
+    assert limiter.registrar(('x', 60, 'ip', 'a'), 1, 60, 2.0) is None
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'limiter', SlidingWindowLimiter())
+    app = Flask(__name__)
+    app.config['RATE_LIMITS'] = 'ping=2/60@ip,login=2/60@user:falhas'
+
+    @app.route('/ping')
+    def ping():
+        return 'ok'
+
+    @app.route('/login', methods=['POST'])
+    def login():
+        from flask import request
+        if request.get_json()['password'] != 'certa':
+            rate_limit.registrar_falha()
+            return 'credenciais inválidas', 401
+        return 'ok'
+
+    rate_limit.init_app(app)
+    return app
+
+
+def test_429_with_retry_after_in_whole_seconds(app):
+    client = app.test_client()
+    assert [client.get('/ping').status_code for _ in range(2)] == [200, 200]
+
+    resposta = client.get('/ping')
+
+    assert resposta.status_code == 429
+    assert resposta.get_json()['code'] == 'RATE_LIMITED'
+    assert 1 <= int(resposta.headers['Retry-After']) <= 60
+
+
+def test_only_failed_logins_count_against_the_username(app):
+    client = app.test_client()
+    certa = {'username': 'ana', 'password': 'certa'}
+    errada = {'username': 'Ana', 'password': 'errada'}
+
+    assert [client.post('/login', json=certa).status_code for _ in range(5)] == [200] * 5
+    assert [client.post('/login', json=errada).status_code for _ in range(2)] == [401, 401]
+    assert client.post('/login', json=certa).status_code == 429
+    # Other usernames are unaffected
+    assert client.post('/login', json={'username': 'bia', 'password': 'certa'}).status_code == 200
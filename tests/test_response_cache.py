@@ -0,0 +1,119 @@
+"""ResponseCache: LRU eviction by bytes, invalidation and ETag/304."""
+import pytest
+from flask import Flask, jsonify
+
+from utils import cache, invalidation
+from utils.cache import ResponseCache, _Entrada
+
+
+def _entrada(tamanho_body: int, grupo: str = 'despesas', meses=None) -> _Entrada:
+    return _Entrada(b'x' * tamanho_body, 200, 'application/json', {}, grupo,
+                    frozenset(meses) if meses is not None else None)
+
+
+def test_evicts_least_recently_used_once_over_max_bytes():
+    entrada = _entrada(744)  # 1000 bytes with the bookkeeping overhead
+    rc = ResponseCache(max_bytes=8000)
+    rc.max_entry_bytes = 8000
+    for chave in 'abcdefgh':
+        rc.put((chave,), _entrada(744), rc.geracao)
+    assert rc.stats()['bytes'] == 8 * entrada.tamanho
+
+    rc.get(('a',))  # 'a' becomes most recently used; 'b' is now the oldest
+    rc.put(('i',), _entrada(744), rc.geracao)
+
+    assert rc.get(('b',)) is None
+    assert rc.get(('a',)) is not None
+    assert rc.stats()['bytes'] <= rc.max_bytes
+
+
+def test_large_entry_evicts_as_many_as_needed():
+    rc = ResponseCache(max_bytes=8000)
+    rc.max_entry_bytes = 8000
+    for chave in 'abcd':
+        rc.put((chave,), _entrada(744), rc.geracao)
+    rc.put(('grande',), _entrada(5744), rc.geracao)
+
+    assert [c for c in 'abcd' if rc.get((c,)) is not None] == ['c', 'd']
+    assert rc.get(('grande',)) is not None
+    assert rc.stats()['bytes'] == 8000
+
+
+def test_skips_entries_larger_than_max_entry_bytes():
+    rc = ResponseCache(max_bytes=8000)
+    rc.put(('a',), _entrada(2000), rc.geracao)
+    assert rc.get(('a',)) is None
+    assert rc.stats()['bytes'] == 0
+
+
+def test_invalidate_drops_matching_months_and_all_month_responses():
+    rc = ResponseCache(max_bytes=100000)
+    rc.put(('jan',), _entrada(10, meses={'2024-01'}), rc.geracao)
+    rc.put(('fev',), _entrada(10, meses={'2024-02'}), rc.geracao)
+    rc.put(('todos',), _entrada(10), rc.geracao)
+    rc.put(('rendas',), _entrada(10, grupo='rendas', meses={'2024-01'}), rc.geracao)
+
+    rc.invalidate(['despesas'], ['2024-01'])
+
+    assert rc.get(('jan',)) is None
+    assert rc.get(('todos',)) is None
+    assert rc.get(('fev',)) is not None
+    assert rc.get(('rendas',)) is not None
+
+
+def test_put_computed_across_an_invalidation_is_dropped():
+    rc = ResponseCache(max_bytes=100000)
+    geracao = rc.geracao
+    rc.invalidate()
+    rc.put(('a',), _entrada(10), geracao)
+    assert rc.get(('a',)) is None
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(invalidation, 'ensure_listener', lambda: None)
+    monkeypatch.setattr(invalidation, 'is_listening', lambda: True)
+    monkeypatch.setattr(cache, 'response_cache', ResponseCache(1024 * 1024))
+    monkeypatch.setattr(cache, '_enabled', True)
+
+    chamadas = []
+    app = Flask(__name__)
+
+    @app.route('/itens')
+    @cache.cached_response('despesas')
+    def itens():
+        chamadas.append(1)
+        return jsonify({'itens': [1, 2, 3]})
+
+    cliente = app.test_client()
+    cliente.chamadas = chamadas
+    return cliente
+
+
+def test_second_get_is_served_from_cache_with_same_etag(client):
+    primeira = client.get('/itens')
+    segunda = client.get('/itens')
+
+    assert primeira.status_code == segunda.status_code == 200
+    assert segunda.get_json() == {'itens': [1, 2, 3]}
+    assert primeira.headers['ETag'] == segunda.headers['ETag']
+    assert len(client.chamadas) == 1
+
+
+def test_matching_if_none_match_gets_304_without_body(client):
+    etag = client.get('/itens').headers['ETag']
+
+    resposta = client.get('/itens', headers={'If-None-Match': etag})
+
+    assert resposta.status_code == 304
+    assert resposta.data == b''
+    assert resposta.headers['ETag'] == etag
+
+
+def test_stale_if_none_match_gets_full_response(client):
+    client.get('/itens')
+
+    resposta = client.get('/itens', headers={'If-None-Match': '"outra"'})
+
+    assert resposta.status_code == 200
+    assert resposta.get_json() == {'itens': [1, 2, 3]}
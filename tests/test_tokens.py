@@ -0,0 +1,106 @@
+"""TokenBlocklist: in-memory mirror of token_revogado."""
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from utils import invalidation, tokens
+from utils.tokens import TokenBlocklist
+
+
+class FakeCursor:
+    def __init__(self, linhas):
+        self.linhas = linhas
+        self.consultas = []
+
+    def execute(self, sql, params=None):
+        self.consultas.append((sql, params))
+        self.params = params
+
+    def fetchall(self):
+        return [{'jti': jti, 'exp': exp} for jti, exp in self.linhas.items()]
+
+    def fetchone(self):
+        exp = self.linhas.get(self.params[0])
+        return {'?column?': 1} if exp is not None and exp > time.time() else None
+
+
+@pytest.fixture
+def banco(monkeypatch):
+    monkeypatch.setattr(invalidation, 'ensure_listener', lambda: None)
+    monkeypatch.setattr(invalidation, 'is_listening', lambda: True)
+    monkeypatch.setattr(tokens, 'ensure_purga', lambda: None)
+
+    cur = FakeCursor({'revogado': time.time() + 3600})
+
+    @contextmanager
+    def cur_factory():
+        yield cur
+
+    cur.factory = cur_factory
+    return cur
+
+
+def test_loads_the_table_once_then_answers_from_memory(banco):
+    blocklist = TokenBlocklist()
+
+    assert blocklist.revogado(banco.factory, 'revogado')
+    assert not blocklist.revogado(banco.factory, 'outro')
+    assert len(banco.consultas) == 1
+    assert blocklist.stats() == {'loaded': True, 'tokens': 1, 'loads': 1}
+
+
+def test_adicionar_reaches_a_loaded_mirror(banco):
+    blocklist = TokenBlocklist()
+    blocklist.revogado(banco.factory, 'revogado')
+
+    blocklist.adicionar('novo', time.time() + 60)
+
+    assert blocklist.revogado(banco.factory, 'novo')
+    assert len(banco.consultas) == 1
+
+
+def test_expired_entry_is_not_revoked_and_is_pruned(banco):
+    blocklist = TokenBlocklist()
+    blocklist.revogado(banco.factory, 'revogado')
+    blocklist.adicionar('velho', time.time() - 1)
+
+    assert not blocklist.revogado(banco.factory, 'velho')
+    blocklist.podar()
+    assert blocklist.stats()['tokens'] == 1
+
+
+def test_invalidate_forces_a_reload(banco):
+    blocklist = TokenBlocklist()
+    blocklist.revogado(banco.factory, 'revogado')
+
+    blocklist.invalidate()
+    blocklist.revogado(banco.factory, 'revogado')
+
+    assert len(banco.consultas) == 2
+    assert blocklist.stats()['loads'] == 2
+
+
+def test_reads_the_table_per_check_while_listener_is_down(banco, monkeypatch):
+    monkeypatch.setattr(invalidation, 'is_listening', lambda: False)
+    blocklist = TokenBlocklist()
+
+    assert blocklist.revogado(banco.factory, 'revogado')
+    assert not blocklist.revogado(banco.factory, 'outro')
+    assert [params for _, params in banco.consultas] == [('revogado',), ('outro',)]
+    assert not blocklist.stats()['loaded']
+
+
+def test_load_racing_a_change_is_not_kept(banco):
+    blocklist = TokenBlocklist()
+    ler = TokenBlocklist._ler
+
+    def ler_com_logout(cur):
+        jtis = ler(cur)
+        blocklist.adicionar('durante', time.time() + 60)  # arrives mid-load
+        return jtis
+
+    blocklist._ler = ler_com_logout
+    blocklist.revogado(banco.factory, 'revogado')
+
+    assert not blocklist.stats()['loaded']
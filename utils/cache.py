@@ -0,0 +1,250 @@
+"""Per-worker response cache with write invalidation and ETag/304 support.
+
+Cached GET responses are tagged with a group ('despesas', 'rendas',
+'resumo', 'colaboradores', ...) and the months they cover (or None when
+they span every month). Mutations call ``invalidar()`` inside their
+transaction, which drops the affected months in this worker at once and,
+through ``utils.invalidation``, in every other worker on commit.
+
+Responses carry a strong ETag; a request with a matching If-None-Match
+gets a 304 with no body. Entries are evicted LRU-first once the cache
+holds more than RESPONSE_CACHE_MAX_BYTES of bodies.
+
+All data is shared by the family (there is no per-user scoping), so
+cached responses are shared across authenticated users; JWT validation
+still runs before the cache is consulted.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Iterable, Optional
+
+from flask import make_response, request
+
+from connection import replica_checkouts
+from utils import invalidation
+
+TOPIC = 'cache'
+
+# Groups touched by each kind of mutation
+GRUPOS_DESPESA = ('despesas', 'resumo')
+GRUPOS_RENDA = ('rendas', 'resumo')
+GRUPOS_DIVISAO = ('divisao', 'resumo')
+TODOS_GRUPOS = None  # colaborador names appear in every response
+
+# Response headers worth replaying from the cache
+_HEADERS_CACHEADOS = ('X-Total-Count', 'Content-Range', 'X-Next-Cursor', 'Link', 'Vary')
+
+
+class _Entrada:
+    __slots__ = ('body', 'status', 'mimetype', 'headers', 'etag', 'grupo', 'meses', 'tamanho')
+
+    def __init__(self, body: bytes, status: int, mimetype: str, headers: dict,
+                 grupo: str, meses: Optional[frozenset]):
+        self.body = body
+        self.status = status
+        self.mimetype = mimetype
+        self.headers = headers
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.grupo = grupo
+        self.meses = meses
+        self.tamanho = len(body) + 256  # body + rough bookkeeping overhead
+
+
+class ResponseCache:
+    """Thread-safe LRU of serialized responses, indexed by (grupo, mes)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max(max_bytes // 8, 1)
+        self._lock = threading.Lock()
+        self._entradas: OrderedDict[tuple, _Entrada] = OrderedDict()
+        # (grupo, mes) -> keys; mes None = responses covering every month
+        self._indice: dict[tuple, set] = {}
+        self._bytes = 0
+        # Bumped on every invalidation; a response computed across a bump
+        # may be stale and is not stored
+        self.geracao = 0
+        self.invalidado_em = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chave: tuple) -> Optional[_Entrada]:
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.hits += 1
+            return entrada
+
+    def put(self, chave: tuple, entrada: _Entrada, geracao: int) -> None:
+        if entrada.tamanho > self.max_entry_bytes:
+            return
+        with self._lock:
+            if geracao != self.geracao:
+                return
+            self._remover(chave)
+            self._entradas[chave] = entrada
+            self._bytes += entrada.tamanho
+            for mes in (entrada.meses if entrada.meses is not None else (None,)):
+                self._indice.setdefault((entrada.grupo, mes), set()).add(chave)
+            while self._bytes > self.max_bytes and self._entradas:
+                self._remover(next(iter(self._entradas)))
+
+    def _remover(self, chave: tuple) -> None:
+        entrada = self._entradas.pop(chave, None)
+        if entrada is None:
+            return
+        self._bytes -= entrada.tamanho
+        for mes in (entrada.meses if entrada.meses is not None else (None,)):
+            chaves = self._indice.get((entrada.grupo, mes))
+            if chaves is not None:
+                chaves.discard(chave)
+                if not chaves:
+                    del self._indice[(entrada.grupo, mes)]
+
+    def invalidate(self, grupos: Optional[Iterable[str]] = None,
+                   meses: Optional[Iterable[str]] = None) -> None:
+        """
+        Drop cached responses.
+
+        Args:
+            grupos: Groups to drop (None = every group)
+            meses: Months to drop (None = every month). Responses that
+                cover every month are always dropped for their group.
+        """
+        with self._lock:
+            self.geracao += 1
+            self.invalidado_em = time.monotonic()
+            if grupos is None and meses is None:
+                self._entradas.clear()
+                self._indice.clear()
+                self._bytes = 0
+                return
+
+            alvo = set()
+            for (grupo, mes), chaves in self._indice.items():
+                if grupos is not None and grupo not in grupos:
+                    continue
+                if meses is None or mes is None or mes in meses:
+                    alvo.update(chaves)
+            for chave in alvo:
+                self._remover(chave)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+_enabled = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# A replica may still serve pre-invalidation data for up to this long
+_replica_max_lag = float(os.environ.get('DATABASE_REPLICA_MAX_LAG', '5'))
+response_cache = ResponseCache(int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', str(32 * 1024 * 1024))))
+
+
+def _on_invalidation(data) -> None:
+    if data is None:  # listener reset: anything may have changed
+        response_cache.invalidate()
+        return
+    response_cache.invalidate(data.get('grupos'), data.get('meses'))
+
+
+invalidation.subscribe(TOPIC, _on_invalidation)
+
+
+def invalidar(cur, grupos: Optional[Iterable[str]], meses: Optional[Iterable[str]] = None) -> None:
+    """
+    Invalidate cached responses after a mutation, in every worker.
+
+    Call with the cursor of the mutating transaction: other workers drop
+    their entries when it commits.
+
+    Args:
+        cur: Cursor of the mutating transaction
+        grupos: Affected groups (e.g. GRUPOS_DESPESA), None = all
+        meses: Affected months (YYYY-MM), None = all
+    """
+    meses = sorted({m for m in meses if m}) if meses is not None else None
+    invalidation.publish(cur, TOPIC, {
+        'grupos': list(grupos) if grupos is not None else None,
+        'meses': meses,
+    })
+
+
+def _responder(entrada: _Entrada):
+    """Build the response for an entry, honoring If-None-Match."""
+    if entrada.etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = make_response(entrada.body, entrada.status)
+        response.mimetype = entrada.mimetype
+        for nome, valor in entrada.headers.items():
+            response.headers[nome] = valor
+    response.set_etag(entrada.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def cached_response(grupo: str, meses: Callable[..., Optional[Iterable[str]]] = lambda **kw: None):
+    """
+    Cache a GET view's successful responses.
+
+    Args:
+        grupo: Cache group invalidated by the related mutations
+        meses: Called with the view's kwargs; returns the months the
+            response covers, or None if it spans every month
+
+    The cache is bypassed while this worker's invalidation listener is
+    down, since other workers' writes could not reach it. Responses read
+    from the replica within DATABASE_REPLICA_MAX_LAG seconds of an
+    invalidation are served but not stored.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not _enabled or request.method != 'GET':
+                return view(*args, **kwargs)
+
+            invalidation.ensure_listener()
+            usar_cache = invalidation.is_listening()
+            chave = (request.endpoint, request.full_path, request.headers.get('Accept', ''))
+
+            if usar_cache:
+                entrada = response_cache.get(chave)
+                if entrada is not None:
+                    return _responder(entrada)
+
+            geracao = response_cache.geracao
+            checkouts_replica = replica_checkouts()
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+
+            meses_resposta = meses(**kwargs)
+            entrada = _Entrada(
+                body=response.get_data(),
+                status=response.status_code,
+                mimetype=response.mimetype,
+                headers={h: response.headers[h] for h in _HEADERS_CACHEADOS if h in response.headers},
+                grupo=grupo,
+                meses=frozenset(meses_resposta) if meses_resposta is not None else None,
+            )
+            via_replica = replica_checkouts() != checkouts_replica
+            if via_replica and time.monotonic() - response_cache.invalidado_em < _replica_max_lag:
+                usar_cache = False
+            if usar_cache:
+                response_cache.put(chave, entrada, geracao)
+            return _responder(entrada)
+        return wrapper
+    return decorator
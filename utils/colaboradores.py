@@ -0,0 +1,92 @@
+"""Per-worker cache of colaborador records (id, nome, dia_fechamento).
+
+Every despesa/renda write needs the colaborador's closing day or just its
+existence, and colaboradores change maybe once a year. The whole table is
+loaded once per worker, on first use, and dropped whenever
+``routes/colaboradores.py`` publishes a change through
+``utils.invalidation`` (immediately in the writing worker, on commit in
+the others).
+
+While this worker's invalidation listener is down the cache is bypassed
+and every lookup reads the table, since changes could be missed. The
+foreign keys on despesa/renda_mensal still reject a colaborador deleted
+in the few milliseconds before the notification arrives.
+"""
+import threading
+from typing import Iterable, Optional
+
+from utils import invalidation
+
+TOPIC = 'colaboradores'
+
+
+class ColaboradorCache:
+    """Thread-safe snapshot of the colaborador table, keyed by id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_id: Optional[dict[int, dict]] = None
+        # Bumped on every invalidation; a load that raced one is not kept
+        self.geracao = 0
+        self.cargas = 0
+
+    @staticmethod
+    def _ler(cur) -> dict[int, dict]:
+        cur.execute("SELECT id, nome, dia_fechamento FROM colaborador")
+        return {row['id']: dict(row) for row in cur.fetchall()}
+
+    def todos(self, cur) -> dict[int, dict]:
+        """
+        Every colaborador by id (do not mutate the returned records).
+
+        Args:
+            cur: Cursor used to (re)load the table when needed (RealDictCursor)
+        """
+        if not invalidation.is_listening():
+            return self._ler(cur)
+        with self._lock:
+            dados, geracao = self._por_id, self.geracao
+        if dados is not None:
+            return dados
+
+        dados = self._ler(cur)
+        with self._lock:
+            if geracao == self.geracao:
+                self._por_id = dados
+                self.cargas += 1
+        return dados
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.geracao += 1
+            self._por_id = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'loaded': self._por_id is not None,
+                'colaboradores': len(self._por_id) if self._por_id is not None else 0,
+                'loads': self.cargas,
+            }
+
+
+colaborador_cache = ColaboradorCache()
+
+
+def buscar_colaborador(cur, colaborador_id: int) -> Optional[dict]:
+    """The colaborador's {id, nome, dia_fechamento}, or None if it doesn't exist."""
+    return colaborador_cache.todos(cur).get(colaborador_id)
+
+
+def buscar_colaboradores(cur, ids: Iterable[int]) -> dict[int, dict]:
+    """{id: record} for the given ids that exist."""
+    todos = colaborador_cache.todos(cur)
+    return {i: todos[i] for i in ids if i in todos}
+
+
+def invalidar_colaboradores(cur) -> None:
+    """Drop every worker's colaborador cache once the caller's transaction commits."""
+    invalidation.publish(cur, TOPIC)
+
+
+invalidation.subscribe(TOPIC, lambda data: colaborador_cache.invalidate())
@@ -0,0 +1,101 @@
+"""Compact column-oriented responses and ?fields= projection for list endpoints.
+
+A client that sends ``Accept: application/vnd.controle.columnar+json``
+gets a list as::
+
+    {"columns": ["id", "valor", ...], "values": [[1, 2, ...], ["10.00", ...]], "count": 2}
+
+i.e. each column name once and one array per column, in the same order
+(``values[i][n]`` is column ``columns[i]`` of row n). Decimals and dates
+are encoded as strings exactly as in the row format. Plain JSON clients
+keep receiving the list of objects.
+
+``?fields=a,b`` restricts the columns; endpoints map every public field
+to its SQL expression so the projection reaches the SELECT list instead
+of trimming rows after the fact.
+"""
+import json
+import time
+from datetime import date
+from decimal import Decimal
+from typing import Mapping, Optional, Sequence
+
+from flask import current_app, request
+
+from utils.json_utils import DecimalEncoder, json_response
+
+COLUMNAR_MIMETYPE = 'application/vnd.controle.columnar+json'
+
+
+def campos_solicitados(disponiveis: Mapping[str, str]) -> Optional[list[str]]:
+    """
+    Fields requested with ``?fields=`` (None when absent = every field).
+
+    Raises:
+        ValueError: Unknown field (message lists the valid ones)
+    """
+    valor = request.args.get('fields')
+    if not valor:
+        return None
+    campos = list(dict.fromkeys(c.strip() for c in valor.split(',') if c.strip()))
+    desconhecidos = [c for c in campos if c not in disponiveis]
+    if desconhecidos or not campos:
+        raise ValueError(
+            f"fields inválidos: {', '.join(desconhecidos) or '(vazio)'}; "
+            f"disponíveis: {', '.join(disponiveis)}"
+        )
+    return campos
+
+
+def select_list(campos: Sequence[str], disponiveis: Mapping[str, str]) -> str:
+    """SQL select list for ``campos`` (``expr AS campo, ...``)."""
+    return ', '.join(f"{disponiveis[c]} AS {c}" for c in campos)
+
+
+def prefere_colunar() -> bool:
+    """True when the request's Accept header prefers the columnar format."""
+    return request.accept_mimetypes.best_match(
+        ['application/json', COLUMNAR_MIMETYPE]
+    ) == COLUMNAR_MIMETYPE
+
+
+def _coluna(valores: list) -> list:
+    # Stringify Decimal/date columns up front so json.dumps stays on its
+    # C fast path instead of calling DecimalEncoder.default per value
+    amostra = next((v for v in valores if v is not None), None)
+    if isinstance(amostra, Decimal):
+        return [None if v is None else str(v) for v in valores]
+    if isinstance(amostra, date):
+        return [None if v is None else v.isoformat() for v in valores]
+    return valores
+
+
+def lista_response(rows: list, campos: Optional[Sequence[str]] = None, status: int = 200):
+    """
+    Serialize a list of row dicts as JSON objects or, if the client asked
+    for it, in the columnar format.
+
+    Args:
+        rows: Row dicts (e.g. RealDictRow)
+        campos: Columns to send, in order (None = every column of the rows)
+        status: HTTP status code
+    """
+    if not prefere_colunar():
+        if campos is not None:
+            rows = [{c: row[c] for c in campos} for row in rows]
+        response = json_response(rows, status)
+    else:
+        from utils.metrics import observe_json
+
+        if campos is None:
+            campos = list(rows[0].keys()) if rows else []
+        started = time.perf_counter()
+        body = json.dumps({
+            'columns': list(campos),
+            'values': [_coluna([row[c] for row in rows]) for c in campos],
+            'count': len(rows),
+        }, cls=DecimalEncoder, separators=(',', ':'))
+        observe_json(time.perf_counter() - started)
+        response = current_app.response_class(response=body, status=status, mimetype=COLUMNAR_MIMETYPE)
+    response.vary.add('Accept')
+    return response
@@ -31,3 +31,14 @@ def calcular_mes_vigente(data_compra: date, tipo_pg: str, dia_limite: int) -> st
             return f"{data_compra.year + 1}-01"
         else:
             return f"{data_compra.year}-{data_compra.month + 1:02d}"
+
+
+def adicionar_meses(mes_ano: str, meses: int) -> str:
+    """
+    Soma `meses` a um mês no formato 'YYYY-MM' (com rotação de ano).
+
+    Ex.: adicionar_meses('2024-11', 3) -> '2025-02'
+    """
+    ano, mes = map(int, mes_ano.split('-'))
+    indice = ano * 12 + (mes - 1) + meses
+    return f"{indice // 12}-{indice % 12 + 1:02d}"
@@ -0,0 +1,460 @@
+"""Streaming parsers for bank statement imports (CSV and OFX).
+
+Every stage is a generator, so a statement is read, normalized and sent
+to PostgreSQL one line at a time and memory use doesn't depend on the
+file size:
+
+    ler_csv / ler_ofx  ->  LinhaExtrato(linha, data, descricao, valor)
+    preparar_linhas    ->  rows ready for despesa (tipo_pg, categoria,
+                           mes_vigente); rejected lines go to a Relatorio
+    CopyStream         ->  file-like object consumed by COPY FROM STDIN
+"""
+import codecs
+import csv
+import io
+import re
+import unicodedata
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Iterator, NamedTuple, Optional, Union
+
+from utils.date_utils import calcular_mes_vigente
+
+CENTAVO = Decimal('0.01')
+
+# Lowercase, accent-free header names recognized when no mapping is given
+COLUNAS_PADRAO = {
+    'data': ('data', 'date', 'data compra', 'data_compra', 'data da compra', 'data lancamento'),
+    'descricao': ('descricao', 'historico', 'lancamento', 'estabelecimento', 'memo', 'title', 'description'),
+    'valor': ('valor', 'amount', 'valor (r$)', 'valor r$', 'value'),
+}
+
+# Lines with an ambiguous value held back (per file) until an unambiguous
+# value reveals the decimal separator; past this they are rejected outright
+MAX_PENDENTES = 1000
+
+FORMATOS_DATA = ('%d/%m/%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%Y', '%d.%m.%Y')
+
+# Accent-free keywords -> categoria (first match wins; default lazer_outros)
+PALAVRAS_CATEGORIA = (
+    ('saude', ('farmacia', 'drogaria', 'droga ', 'drogasil', 'drogaraia', 'pacheco', 'hospital', 'clinica',
+               'laborat', 'medic', 'odonto', 'unimed')),
+    ('alimentacao', ('supermercado', 'mercado', 'atacad', 'assai', 'carrefour', 'padaria', 'hortifruti',
+                     'sacolao', 'acougue', 'pao de acucar')),
+    ('restaurante_lanche', ('restaurante', 'lanchonete', 'lanche', 'ifood', 'rappi', 'burger', 'mcdonald',
+                            'pizza', 'cafe', 'cafeteria', 'bar ', 'churrascaria', 'sushi')),
+    ('transporte', ('uber', '99app', '99 tecnologia', 'posto', 'combustivel', 'shell', 'ipiranga',
+                    'petrobras', 'estacionamento', 'pedagio', 'sem parar', 'metro', 'onibus', 'bilhete')),
+    ('moradia', ('aluguel', 'condominio', 'energia', 'eletropaulo', 'enel', 'cemig', 'copel', 'sabesp',
+                 'saneamento', 'comgas', 'internet', 'iptu')),
+    ('casa_utilidades', ('leroy', 'tok stok', 'tokstok', 'casas bahia', 'magazine', 'magalu', 'amazon',
+                         'mercadolivre', 'mercado livre', 'shopee', 'americanas', 'camicado')),
+)
+
+
+class LinhaExtrato(NamedTuple):
+    linha: int
+    data_compra: date
+    descricao: str
+    valor: Decimal  # > 0 for expenses
+
+
+class ErroLinha(NamedTuple):
+    linha: int
+    error: str
+    code: str
+
+
+class FormatoInvalido(Exception):
+    """The file can't be parsed at all (no header, unknown columns...)."""
+
+    def __init__(self, message: str, code: str = 'INVALID_FILE'):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+class ValorAmbiguo(ValueError):
+    """A lone separator followed by three digits ('1.234', '1,234')."""
+
+    def __init__(self, texto: str, separador: str):
+        super().__init__(
+            f"Valor ambíguo {texto.strip()!r}: não é possível saber se '{separador}' separa milhar ou decimal"
+        )
+        self.separador = separador
+
+
+def sem_acentos(texto: str) -> str:
+    """Lowercase, accent-free version of ``texto`` (for matching)."""
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower().strip()
+
+
+def categorizar(descricao: str, padrao: str = 'lazer_outros') -> str:
+    """Guess the categoria from the statement description."""
+    texto = f" {sem_acentos(descricao)} "
+    for categoria, palavras in PALAVRAS_CATEGORIA:
+        if any(p in texto for p in palavras):
+            return categoria
+    return padrao
+
+
+def _limpar_valor(texto: str) -> str:
+    return texto.replace('R$', '').replace('\xa0', '').replace(' ', '').strip()
+
+
+def _separadores(t: str, decimal_arquivo: Optional[str]) -> tuple[Optional[str], Optional[str]]:
+    """(thousands, decimal) separators of a cleaned value."""
+    if ',' in t and '.' in t:
+        return (',', '.') if t.rindex('.') > t.rindex(',') else ('.', ',')
+    if ',' not in t and '.' not in t:
+        return None, None
+    separador = ',' if ',' in t else '.'
+    if t.count(separador) > 1:
+        return separador, None
+    if len(t) - t.index(separador) - 1 == 3:
+        if decimal_arquivo is None:
+            raise ValorAmbiguo(t, separador)
+        return (None, separador) if separador == decimal_arquivo else (separador, None)
+    return None, separador
+
+
+def separador_decimal(texto: str) -> Optional[str]:
+    """
+    Decimal separator implied by an unambiguous value ('1.234,56' -> ',',
+    '1.234.567' -> ',', '12.3' -> '.'), None if it tells nothing ('123').
+
+    Raises:
+        ValorAmbiguo: Ambiguous value
+    """
+    milhar, decimal = _separadores(_limpar_valor(texto).strip('()'), None)
+    if decimal is None and milhar is not None:
+        return ',' if milhar == '.' else '.'
+    return decimal
+
+
+def parse_valor(texto: str, decimal_arquivo: Optional[str] = None) -> Decimal:
+    """
+    Parse '1.234,56', '1,234.56', 'R$ -12,30', '1234.56' or '(12.30)' into a Decimal.
+
+    With both separators the last one is the decimal separator. A lone
+    separator is decimal unless it is repeated ('1.234.567') or followed by
+    exactly three digits ('1.234', '1,234'), which could be either: those
+    are read with ``decimal_arquivo``, the file's decimal separator (see
+    separador_decimal), when it is known.
+
+    Raises:
+        InvalidOperation: Not a number
+        ValorAmbiguo: Ambiguous separators and no ``decimal_arquivo``
+    """
+    t = _limpar_valor(texto)
+    negativo = t.startswith('(') and t.endswith(')')
+    t = t.strip('()')
+    milhar, decimal = _separadores(t, decimal_arquivo)
+
+    if milhar is not None:
+        inteiro = t.split(decimal)[0] if decimal else t
+        if not re.fullmatch(rf'[-+]?\d{{1,3}}(\{milhar}\d{{3}})+', inteiro):
+            raise InvalidOperation(texto)
+        t = t.replace(milhar, '')
+    if decimal == ',':
+        t = t.replace(',', '.')
+    valor = Decimal(t)
+    if not valor.is_finite():
+        raise InvalidOperation(texto)
+    return -valor if negativo else valor
+
+
+def parse_data(texto: str) -> date:
+    """
+    Parse a statement date in any of FORMATOS_DATA.
+
+    Raises:
+        ValueError: Unknown format
+    """
+    texto = texto.strip()[:10]
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"data inválida: {texto!r}")
+
+
+def abrir_texto(stream, encoding: str = 'utf-8-sig') -> io.TextIOBase:
+    """Wrap a binary upload stream for line-by-line text reading."""
+    codecs.lookup(encoding)  # LookupError for unknown encodings
+    return io.TextIOWrapper(stream, encoding=encoding, errors='replace', newline='')
+
+
+def ler_csv(texto: io.TextIOBase, colunas: Optional[dict] = None,
+            inverter_sinal: bool = False) -> Iterator[Union[LinhaExtrato, ErroLinha]]:
+    """
+    Read a CSV statement (``;`` or ``,`` separated, detected from the header).
+
+    Args:
+        texto: Text stream
+        colunas: {'data': header, 'descricao': header, 'valor': header};
+            missing keys are looked up in COLUNAS_PADRAO
+        inverter_sinal: Account statements list debits as negative
+            values; set to import those as expenses
+
+    Yields:
+        LinhaExtrato for expenses (value > 0 after the sign rule),
+        ErroLinha for unparseable lines. Credits/zero values are skipped.
+        Lines whose value is ambiguous ('1.234') wait until another line
+        shows the file's decimal separator, so they may come out of order;
+        if none does they end as AMBIGUOUS_AMOUNT errors.
+
+    Raises:
+        FormatoInvalido: Empty file or columns not found
+    """
+    cabecalho = texto.readline()
+    if not cabecalho.strip():
+        raise FormatoInvalido('Arquivo vazio')
+    delimitador = ';' if cabecalho.count(';') >= cabecalho.count(',') else ','
+    nomes = next(csv.reader([cabecalho], delimiter=delimitador))
+    normalizados = [sem_acentos(n) for n in nomes]
+
+    indices = {}
+    for campo, candidatos in COLUNAS_PADRAO.items():
+        pedido = (colunas or {}).get(campo)
+        procurados = (sem_acentos(pedido),) if pedido else candidatos
+        indice = next((i for i, n in enumerate(normalizados) if n in procurados), None)
+        if indice is None:
+            raise FormatoInvalido(f"Coluna de {campo} não encontrada no cabeçalho: {nomes}", 'MISSING_COLUMNS')
+        indices[campo] = indice
+
+    ultimo = max(indices.values())
+    decimal = None
+    pendentes = []  # (numero, data_compra, descricao, valor text, error) with an ambiguous value
+    for numero, campos in enumerate(csv.reader(texto, delimiter=delimitador), start=2):
+        if not any(c.strip() for c in campos):
+            continue
+        if len(campos) <= ultimo:
+            yield ErroLinha(numero, 'Linha com colunas faltando', 'MISSING_FIELDS')
+            continue
+        descricao, texto_valor = campos[indices['descricao']], campos[indices['valor']]
+        try:
+            data_compra = parse_data(campos[indices['data']])
+            valor = parse_valor(texto_valor, decimal)
+        except ValorAmbiguo as e:
+            if len(pendentes) < MAX_PENDENTES:
+                pendentes.append((numero, data_compra, descricao, texto_valor, str(e)))
+            else:
+                yield ErroLinha(numero, str(e), 'AMBIGUOUS_AMOUNT')
+            continue
+        except (ValueError, InvalidOperation):
+            yield ErroLinha(numero, 'Data ou valor inválido', 'INVALID_DATA')
+            continue
+
+        if decimal is None:
+            decimal = separador_decimal(texto_valor)
+            if decimal is not None:
+                for numero_p, data_p, descricao_p, texto_p, _ in pendentes:
+                    item = _despesa_csv(numero_p, data_p, descricao_p, parse_valor(texto_p, decimal),
+                                        inverter_sinal)
+                    if item is not None:
+                        yield item
+                pendentes = []
+        item = _despesa_csv(numero, data_compra, descricao, valor, inverter_sinal)
+        if item is not None:
+            yield item
+
+    for numero, _, _, _, erro in pendentes:
+        yield ErroLinha(numero, erro, 'AMBIGUOUS_AMOUNT')
+
+
+def _despesa_csv(numero: int, data_compra: date, descricao: str, valor: Decimal,
+                 inverter_sinal: bool) -> Union[LinhaExtrato, ErroLinha, None]:
+    """One CSV line as an expense, an error, or None (credit)."""
+    if inverter_sinal:
+        valor = -valor
+    if valor <= 0:
+        return None  # credit / payment
+    descricao = descricao.strip()
+    if not descricao:
+        return ErroLinha(numero, 'Descrição vazia', 'MISSING_FIELDS')
+    return LinhaExtrato(numero, data_compra, descricao, valor)
+
+
+_TAG_OFX = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def _tokens_ofx(texto: io.TextIOBase, bloco: int = 65536) -> Iterator[tuple[bool, str, str]]:
+    """(is_closing, TAG, value) for every tag, reading the file in chunks."""
+    resto = ''
+    while True:
+        pedaco = texto.read(bloco)
+        dados = resto + pedaco
+        if not pedaco:
+            corte = len(dados)
+        else:
+            corte = dados.rfind('<')  # the last tag may continue in the next chunk
+            if corte <= 0:
+                resto = dados
+                continue
+        for m in _TAG_OFX.finditer(dados, 0, corte):
+            yield m.group(1) == '/', m.group(2).upper(), m.group(3).strip()
+        resto = dados[corte:]
+        if not pedaco:
+            return
+
+
+def ler_ofx(texto: io.TextIOBase) -> Iterator[Union[LinhaExtrato, ErroLinha]]:
+    """
+    Read an OFX statement (SGML 1.x or XML 2.x).
+
+    Debits (negative TRNAMT) become expenses; credits are skipped.
+    ``linha`` is the transaction's position in the file.
+
+    Raises:
+        FormatoInvalido: No transactions found
+    """
+    numero = 0
+    atual = None
+    for fechando, tag, valor in _tokens_ofx(texto):
+        if tag == 'STMTTRN':
+            if not fechando:
+                numero += 1
+                atual = {}
+                continue
+        elif atual is not None and not fechando and valor:
+            atual[tag] = valor
+            continue
+        else:
+            continue
+
+        # </STMTTRN>: transaction complete
+        trn, atual = atual, None
+        if trn is None:
+            continue
+        try:
+            data_compra = datetime.strptime(trn.get('DTPOSTED', '')[:8], '%Y%m%d').date()
+            # TRNAMT is a plain signed decimal (no thousands separator)
+            quantia = Decimal(trn.get('TRNAMT', '').replace(',', '.'))
+            if not quantia.is_finite():
+                raise InvalidOperation
+        except (ValueError, InvalidOperation):
+            yield ErroLinha(numero, 'Data ou valor inválido', 'INVALID_DATA')
+            continue
+        if quantia >= 0:
+            continue  # credit / payment
+        descricao = (trn.get('MEMO') or trn.get('NAME') or '').strip()
+        if not descricao:
+            yield ErroLinha(numero, 'Descrição vazia', 'MISSING_FIELDS')
+            continue
+        yield LinhaExtrato(numero, data_compra, descricao, -quantia)
+
+    if numero == 0:
+        raise FormatoInvalido('Nenhuma transação (STMTTRN) encontrada no OFX')
+
+
+class Relatorio:
+    """Counters filled while the pipeline runs."""
+
+    def __init__(self, max_erros: int = 100):
+        self.max_erros = max_erros
+        self.erros: list[ErroLinha] = []  # first max_erros only
+        self.total_erros = 0
+        self.linhas = 0
+        self.data_min: Optional[date] = None
+        self.data_max: Optional[date] = None
+
+    def erro(self, erro: ErroLinha) -> None:
+        self.total_erros += 1
+        if len(self.erros) < self.max_erros:
+            self.erros.append(erro)
+
+
+def preparar_linhas(linhas: Iterable[Union[LinhaExtrato, ErroLinha]], colaborador_id: int,
+                    dia_fechamento: int, tipo_pg: str, categoria: Optional[str],
+                    relatorio: Relatorio, max_linhas: int) -> Iterator[tuple]:
+    """
+    Turn parsed lines into despesa rows.
+
+    Args:
+        tipo_pg: Already normalized (normalizar_tipo_pg)
+        categoria: Fixed categoria, or None to guess with categorizar()
+        relatorio: Receives rejected lines, row count and date range
+        max_linhas: Maximum number of rows
+
+    Yields:
+        (linha, data_compra, mes_vigente, descricao, valor, tipo_pg,
+        colaborador_id, categoria)
+
+    Raises:
+        FormatoInvalido: More than max_linhas rows
+    """
+    hoje = date.today()
+    for item in linhas:
+        if isinstance(item, LinhaExtrato) and item.data_compra > hoje:
+            item = ErroLinha(item.linha, 'Data da compra não pode ser no futuro', 'FUTURE_DATE')
+        if isinstance(item, ErroLinha):
+            relatorio.erro(item)
+            continue
+
+        relatorio.linhas += 1
+        if relatorio.linhas > max_linhas:
+            raise FormatoInvalido(f'Arquivo excede {max_linhas} lançamentos', 'FILE_TOO_LARGE')
+        if relatorio.data_min is None or item.data_compra < relatorio.data_min:
+            relatorio.data_min = item.data_compra
+        if relatorio.data_max is None or item.data_compra > relatorio.data_max:
+            relatorio.data_max = item.data_compra
+
+        yield (
+            item.linha,
+            item.data_compra,
+            calcular_mes_vigente(item.data_compra, tipo_pg, dia_fechamento),
+            item.descricao,
+            item.valor.quantize(CENTAVO),
+            tipo_pg,
+            colaborador_id,
+            categoria or categorizar(item.descricao),
+        )
+
+
+class CopyStream(io.TextIOBase):
+    """
+    File-like object producing CSV text from an iterator of tuples.
+
+    Handed to ``cursor.copy_expert("COPY ... FROM STDIN WITH (FORMAT csv)")``:
+    psycopg2 pulls ``read(size)`` chunks, so rows are generated only as
+    fast as PostgreSQL consumes them.
+
+    An exception raised by the iterator ends the data early and is kept
+    in ``erro``; the caller must check it after the COPY (psycopg2 would
+    otherwise replace it with a generic COPY failure).
+    """
+
+    def __init__(self, linhas: Iterable[tuple]):
+        self._linhas = iter(linhas)
+        self.erro: Optional[Exception] = None
+        self._buffer = ''
+        self._saida = io.StringIO()
+        self._writer = csv.writer(self._saida, lineterminator='\n')
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            try:
+                linha = next(self._linhas, None)
+            except Exception as e:
+                self.erro = e
+                linha = None
+            if linha is None:
+                break
+            self._writer.writerow(linha)
+            self._buffer += self._saida.getvalue()
+            self._saida.seek(0)
+            self._saida.truncate()
+        if size < 0:
+            dados, self._buffer = self._buffer, ''
+        else:
+            dados, self._buffer = self._buffer[:size], self._buffer[size:]
+        return dados
+
+    def readline(self, size: int = -1) -> str:
+        return self.read(size)
@@ -0,0 +1,138 @@
+"""Cross-worker invalidation messages over PostgreSQL LISTEN/NOTIFY.
+
+Each gunicorn worker keeps in-memory caches; when one worker changes data
+the others must drop what they cached. Writers publish a message inside
+their transaction (``publish``); PostgreSQL delivers it to every listening
+worker only if and when the transaction commits. A daemon thread per
+worker LISTENs on a dedicated connection and dispatches messages to the
+callbacks registered with ``subscribe``.
+
+Messages are JSON ``{"topic": str, "data": ...}``. A callback receives
+``data``, or ``None`` meaning "reset everything": sent after the listener
+(re)connects, since messages may have been missed while it was down.
+"""
+import json
+import logging
+import os
+import select
+import threading
+import time
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'controle_familiar_invalidacao'
+
+_subscribers: dict[str, list[Callable[[Any], None]]] = {}
+_subscribers_lock = threading.Lock()
+
+_listener_pid: Optional[int] = None
+_listener_lock = threading.Lock()
+_listening = threading.Event()
+
+
+def subscribe(topic: str, callback: Callable[[Any], None]) -> None:
+    """Register ``callback(data)`` for messages published on ``topic``."""
+    with _subscribers_lock:
+        _subscribers.setdefault(topic, []).append(callback)
+
+
+def _dispatch(topic: str, data: Any) -> None:
+    with _subscribers_lock:
+        callbacks = list(_subscribers.get(topic, ()))
+    for callback in callbacks:
+        try:
+            callback(data)
+        except Exception:
+            logger.exception(f"Erro ao processar invalidação '{topic}'")
+
+
+def _reset_all() -> None:
+    with _subscribers_lock:
+        topics = list(_subscribers)
+    for topic in topics:
+        _dispatch(topic, None)
+
+
+def publish(cur, topic: str, data: Any = None) -> None:
+    """
+    Publish an invalidation inside the caller's transaction.
+
+    Other workers receive it when the transaction commits (and never if it
+    rolls back). The current worker is invalidated immediately as well, so
+    its next read doesn't wait for the round trip through the listener.
+
+    Args:
+        cur: Cursor of the transaction that changed the data
+        topic: Message topic (e.g. 'cache')
+        data: JSON-serializable payload (keep it well under 8000 bytes)
+    """
+    payload = json.dumps({'topic': topic, 'data': data})
+    cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+    _dispatch(topic, data)
+
+
+def is_listening() -> bool:
+    """True while this worker's listener is connected."""
+    return _listener_pid == os.getpid() and _listening.is_set()
+
+
+def ensure_listener() -> None:
+    """Start this process's listener thread if it isn't running (cheap check)."""
+    global _listener_pid
+
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listening.clear()
+        _listener_pid = os.getpid()
+        thread = threading.Thread(target=_listen_forever, name='invalidation-listener', daemon=True)
+        thread.start()
+
+
+def _listen_forever() -> None:
+    """Listener loop: (re)connect, LISTEN, dispatch notifications."""
+    from connection import connect_direct
+
+    backoff = 1.0
+    while True:
+        conn = None
+        try:
+            conn = connect_direct()
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL}")
+            _listening.set()
+            backoff = 1.0
+            # Anything published while we were disconnected is lost
+            _reset_all()
+
+            while True:
+                if select.select([conn], [], [], 30.0) == ([], [], []):
+                    # Idle: make sure the connection is still alive
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1")
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        message = json.loads(notify.payload)
+                    except ValueError:
+                        logger.warning(f"Invalidação com payload inválido: {notify.payload[:100]}")
+                        continue
+                    _dispatch(message.get('topic', ''), message.get('data'))
+
+        except Exception as e:
+            _listening.clear()
+            logger.warning(f"Listener de invalidação desconectado: {e} (nova tentativa em {backoff:.0f}s)")
+            _reset_all()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
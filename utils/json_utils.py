@@ -4,31 +4,41 @@ This module provides a custom JSON encoder that serializes Decimal values
 as strings to preserve precision in financial calculations.
 """
 import json
+import time
+from datetime import date
 from decimal import Decimal
 
 
 class DecimalEncoder(json.JSONEncoder):
-    """JSON Encoder that serializes Decimal as string to preserve precision."""
+    """JSON Encoder that serializes Decimal as string to preserve precision (and dates as ISO 8601)."""
     
     def default(self, obj):
         if isinstance(obj, Decimal):
             return str(obj)
+        if isinstance(obj, date):
+            return obj.isoformat()
         return super().default(obj)
 
 
-def json_response(data, status=200):
+def json_response(data, status=200, mimetype='application/json'):
     """Helper to return Flask response with Decimal serialization support.
     
     Args:
         data: Data to serialize (can contain Decimal values)
         status: HTTP status code
+        mimetype: Response content type (JSON-based)
         
     Returns:
         Flask Response object with proper JSON content-type
     """
     from flask import current_app
+    from utils.metrics import observe_json
+
+    started = time.perf_counter()
+    body = json.dumps(data, cls=DecimalEncoder)
+    observe_json(time.perf_counter() - started)
     return current_app.response_class(
-        response=json.dumps(data, cls=DecimalEncoder),
+        response=body,
         status=status,
-        mimetype='application/json'
+        mimetype=mimetype
     )
\ No newline at end of file
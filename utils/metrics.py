@@ -0,0 +1,146 @@
+"""Prometheus metrics for the API.
+
+Exposes request latency per blueprint endpoint, time spent holding and
+waiting for database connections, JSON serialization time, requests
+refused by the rate limiter and connection pool gauges.
+
+Multi-worker aggregation:
+    When ``PROMETHEUS_MULTIPROC_DIR`` is set (gunicorn.conf.py sets it
+    before forking), every worker writes its samples to mmap'd files in
+    that directory and ``/metrics`` merges them, so the numbers are the
+    same no matter which worker answers the scrape. Without it (local
+    ``flask run``), the default in-process registry is used.
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Latency buckets tuned for a small API on a remote managed Postgres
+_REQUEST_BUCKETS = (.005, .01, .025, .05, .075, .1, .15, .25, .5, .75, 1.0, 2.5, 5.0, 10.0)
+_FAST_BUCKETS = (.0001, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Latência das requisições HTTP por endpoint',
+    ['endpoint', 'method', 'status'],
+    buckets=_REQUEST_BUCKETS,
+)
+
+DB_CHECKOUT = Histogram(
+    'db_pool_checkout_seconds',
+    'Tempo aguardando uma conexão do pool',
+    ['endpoint'],
+    buckets=_FAST_BUCKETS,
+)
+
+DB_HOLD = Histogram(
+    'db_connection_hold_seconds',
+    'Tempo dentro de get_db_connection/get_db_cursor (queries + commit)',
+    ['endpoint'],
+    buckets=_REQUEST_BUCKETS,
+)
+
+DB_CHECKOUT_ERRORS = Counter(
+    'db_pool_checkout_errors_total',
+    'Checkouts que falharam (timeout, fila cheia ou erro de conexão)',
+)
+
+JSON_SERIALIZATION = Histogram(
+    'json_serialization_seconds',
+    'Tempo de serialização JSON em json_response',
+    ['endpoint'],
+    buckets=_FAST_BUCKETS,
+)
+
+RATE_LIMITED = Counter(
+    'http_rate_limited_total',
+    'Requisições recusadas com 429 pelo rate limit',
+    ['endpoint', 'scope'],
+)
+
+POOL_IN_USE = Gauge(
+    'db_pool_in_use_connections',
+    'Conexões do pool em uso',
+    multiprocess_mode='livesum',
+)
+
+POOL_IDLE = Gauge(
+    'db_pool_idle_connections',
+    'Conexões ociosas no pool',
+    multiprocess_mode='livesum',
+)
+
+POOL_WAITING = Gauge(
+    'db_pool_waiting_requests',
+    'Requisições aguardando conexão do pool',
+    multiprocess_mode='livesum',
+)
+
+
+def _current_endpoint() -> str:
+    """Blueprint endpoint of the current request, or 'none' outside one."""
+    from flask import has_request_context, request
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'none'
+
+
+def observe_db_checkout(seconds: float) -> None:
+    DB_CHECKOUT.labels(_current_endpoint()).observe(seconds)
+
+
+def observe_db_hold(seconds: float) -> None:
+    DB_HOLD.labels(_current_endpoint()).observe(seconds)
+
+
+def observe_json(seconds: float) -> None:
+    JSON_SERIALIZATION.labels(_current_endpoint()).observe(seconds)
+
+
+def observe_rate_limited(endpoint: str, scope: str) -> None:
+    RATE_LIMITED.labels(endpoint, scope).inc()
+
+
+def record_pool_state(in_use: int, idle: int, waiting: int) -> None:
+    """Pool state listener (see ``ConnectionPool.listener``)."""
+    POOL_IN_USE.set(in_use)
+    POOL_IDLE.set(idle)
+    POOL_WAITING.set(waiting)
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Render all metrics (merged across workers in multiprocess mode)."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def init_app(app) -> None:
+    """Register request timing hooks on the Flask app."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            REQUEST_LATENCY.labels(
+                request.endpoint or 'unmatched',
+                request.method,
+                str(response.status_code),
+            ).observe(time.perf_counter() - start)
+        return response
@@ -0,0 +1,274 @@
+"""Sliding-window rate limiting per blueprint endpoint.
+
+Rules come from ``RATE_LIMITS``, a comma-separated list of
+``endpoint=limit/seconds@scope``, e.g.::
+
+    auth.login=10/60@ip,auth.login=5/60@user:falhas,despesas.listar_despesas=120/60@user
+
+``scope`` is ``ip`` (client address), ``user`` (JWT identity, or the
+``username`` being logged into on unauthenticated endpoints; falls back to
+the address) or ``ip+user``. An endpoint may have several rules; a request
+must pass all of them, checked in order. A rejected request gets 429 with
+Retry-After and isn't counted by the rule that rejected it (earlier rules
+did count it: a login refused for one username still costs its address).
+
+A ``:falhas`` suffix makes a rule count only the requests the endpoint
+reports as failed with ``registrar_falha()``; the limit is still checked
+before every request. Login uses it for the username key: counting every
+attempt would let anyone lock a user out just by posting their username,
+while counting failures only still caps password guessing per account.
+
+Each rule uses a sliding window counter: the previous fixed window's count
+weighted by how much of it still overlaps the sliding window, plus the
+current window's count - two integers per key, O(1) per request. Keys live
+in a per-worker LRU capped at ``RATE_LIMIT_MAX_KEYS`` entries, so a flood
+of distinct addresses can't grow memory. Endpoints without rules cost one
+dict lookup.
+
+Counters are per worker by default (each worker enforces the limit on its
+own share of the traffic). With ``RATE_LIMIT_SHARED=true`` they are kept
+in the ``rate_limite`` table instead (migrations/012_rate_limite.sql), one
+upsert per limited request, falling back to the local counters if the
+database errors.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+ESCOPOS = ('ip', 'user', 'ip+user')
+
+# Shared mode: stale windows are purged every this many upserts per worker
+_PURGA_A_CADA = 1000
+
+
+class Regra(NamedTuple):
+    limite: int
+    periodo: int
+    escopo: str
+    falhas: bool = False  # count only registrar_falha() calls
+
+
+def parse_regras(valor: str) -> dict[str, list[Regra]]:
+    """
+    Parse ``RATE_LIMITS`` into {endpoint: [Regra, ...]}.
+
+    Raises:
+        ValueError: Malformed rule
+    """
+    regras: dict[str, list[Regra]] = {}
+    for item in filter(None, (parte.strip() for parte in (valor or '').split(','))):
+        try:
+            endpoint, resto = item.split('=', 1)
+            taxa, _, escopo = resto.partition('@')
+            limite, periodo = (int(n) for n in taxa.split('/', 1))
+        except ValueError:
+            raise ValueError(f"Regra de RATE_LIMITS inválida: '{item}' (use endpoint=limite/segundos@escopo)")
+        escopo, _, modo = escopo.partition(':')
+        escopo = escopo.strip() or 'ip'
+        if escopo not in ESCOPOS or modo.strip() not in ('', 'falhas') or limite <= 0 or periodo <= 0:
+            raise ValueError(f"Regra de RATE_LIMITS inválida: '{item}'")
+        regras.setdefault(endpoint.strip(), []).append(Regra(limite, periodo, escopo, modo.strip() == 'falhas'))
+    return regras
+
+
+class SlidingWindowLimiter:
+    """Per-worker sliding window counters in a bounded LRU."""
+
+    def __init__(self, max_chaves: int = 10000):
+        self._lock = threading.Lock()
+        # key -> [window number, previous window count, current window count]
+        self._janelas: OrderedDict[tuple, list] = OrderedDict()
+        self.max_chaves = max_chaves
+        self.rejeitados = 0
+
+    def registrar(self, chave: tuple, limite: int, periodo: int, agora: float,
+                  contar: bool = True) -> Optional[float]:
+        """
+        Count a request for ``chave`` (only check the limit if not ``contar``).
+
+        Returns:
+            None if allowed (and counted), else seconds until it would be
+        """
+        with self._lock:
+            if not contar and chave not in self._janelas:
+                return None
+            estado = self._estado(chave, int(agora // periodo))
+            espera = _espera(estado[1], estado[2], limite, periodo, agora)
+            if espera is None:
+                estado[2] += contar
+            else:
+                self.rejeitados += 1
+            return espera
+
+    def contar(self, chave: tuple, periodo: int, agora: float) -> None:
+        """Count a request for ``chave`` without checking any limit."""
+        with self._lock:
+            self._estado(chave, int(agora // periodo))[2] += 1
+
+    def _estado(self, chave: tuple, janela: int) -> list:
+        """The counters of ``chave`` rolled to ``janela`` (lock held)."""
+        estado = self._janelas.get(chave)
+        if estado is None:
+            if len(self._janelas) >= self.max_chaves:
+                self._janelas.popitem(last=False)
+            estado = self._janelas[chave] = [janela, 0, 0]
+        else:
+            self._janelas.move_to_end(chave)
+            if estado[0] != janela:
+                estado[1] = estado[2] if estado[0] == janela - 1 else 0
+                estado[2] = 0
+                estado[0] = janela
+        return estado
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'keys': len(self._janelas), 'max_keys': self.max_chaves, 'rejected': self.rejeitados}
+
+
+def _espera(anterior: int, atual: int, limite: int, periodo: int, agora: float) -> Optional[float]:
+    """None if one more request fits, else seconds until it does (approximate)."""
+    decorrido = agora % periodo
+    estimado = anterior * (1 - decorrido / periodo) + atual
+    if estimado + 1 <= limite:
+        return None
+    if atual + 1 > limite:
+        # Only the next window can make room (its previous-window share decays from there)
+        return periodo - decorrido
+    # The previous window's share decays at anterior/periodo requests per second
+    return (estimado + 1 - limite) * periodo / anterior
+
+
+limiter = SlidingWindowLimiter(int(os.environ.get('RATE_LIMIT_MAX_KEYS', '10000')))
+
+_upserts = 0
+
+
+def _registrar_compartilhado(chave: tuple, limite: int, periodo: int, agora: float,
+                             contar: bool = True) -> Optional[float]:
+    """Same as SlidingWindowLimiter.registrar, counted in the rate_limite table."""
+    global _upserts
+    from connection import get_db_cursor
+
+    janela = int(agora // periodo)
+    texto = '|'.join(str(parte) for parte in chave)
+    if not contar:
+        with get_db_cursor(commit=False) as cur:
+            cur.execute("""
+                SELECT (SELECT contagem FROM rate_limite WHERE chave = %(chave)s AND janela = %(janela)s) AS atual,
+                       (SELECT contagem FROM rate_limite WHERE chave = %(chave)s AND janela = %(janela)s - 1) AS anterior
+            """, {'chave': texto, 'janela': janela})
+            row = cur.fetchone()
+        return _espera(row['anterior'] or 0, row['atual'] or 0, limite, periodo, agora)
+
+    with get_db_cursor() as cur:
+        cur.execute("""
+            INSERT INTO rate_limite AS r (chave, janela, contagem, expira_em)
+            VALUES (%(chave)s, %(janela)s, 1, to_timestamp(%(expira)s))
+            ON CONFLICT (chave, janela) DO UPDATE SET contagem = r.contagem + 1
+            RETURNING contagem - 1 AS atual,
+                      (SELECT contagem FROM rate_limite
+                       WHERE chave = %(chave)s AND janela = %(janela)s - 1) AS anterior
+        """, {'chave': texto, 'janela': janela, 'expira': (janela + 2) * periodo})
+        row = cur.fetchone()
+        _upserts += 1
+        if _upserts % _PURGA_A_CADA == 0:
+            cur.execute("DELETE FROM rate_limite WHERE expira_em < now()")
+    # Shared counters include rejected requests: hammering keeps the client out
+    return _espera(row['anterior'] or 0, row['atual'], limite, periodo, agora)
+
+
+def _usuario(request) -> Optional[str]:
+    from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+    try:
+        if verify_jwt_in_request(optional=True):
+            return f"u:{get_jwt_identity()}"
+    except Exception:
+        pass  # Bad tokens are rejected by the endpoint itself
+    dados = request.get_json(silent=True)
+    if isinstance(dados, dict) and isinstance(dados.get('username'), str):
+        return f"n:{dados['username'].strip().lower()}"
+    return None
+
+
+def _chaves(regra: Regra, endpoint: str, request) -> list[tuple]:
+    ip = request.remote_addr or '-'
+    chaves = []
+    if regra.escopo in ('ip', 'ip+user'):
+        chaves.append((endpoint, regra.periodo, 'ip', ip))
+    if regra.escopo in ('user', 'ip+user'):
+        usuario = _usuario(request)
+        if usuario is not None:
+            chaves.append((endpoint, regra.periodo, 'user', usuario))
+        elif regra.escopo == 'user':
+            chaves.append((endpoint, regra.periodo, 'ip', ip))
+    return chaves
+
+
+def _registrar(chave: tuple, regra: Regra, agora: float, compartilhado: bool) -> Optional[float]:
+    """Check ``regra`` for ``chave``, counting the request unless it is a ``:falhas`` rule."""
+    if compartilhado:
+        try:
+            return _registrar_compartilhado(chave, regra.limite, regra.periodo, agora, not regra.falhas)
+        except Exception as e:
+            logger.warning(f"Rate limit compartilhado indisponível, usando contador local: {e}")
+    return limiter.registrar(chave, regra.limite, regra.periodo, agora, not regra.falhas)
+
+
+def registrar_falha() -> None:
+    """Count the current request against its endpoint's ``:falhas`` rules."""
+    from flask import current_app, request
+
+    regras, compartilhado = current_app.extensions.get('rate_limit', ({}, False))
+    agora = time.time()
+    for regra in regras.get(request.endpoint, ()):
+        if not regra.falhas:
+            continue
+        for chave in _chaves(regra, request.endpoint, request):
+            if compartilhado:
+                try:
+                    _registrar_compartilhado(chave, regra.limite, regra.periodo, agora)
+                    continue
+                except Exception as e:
+                    logger.warning(f"Rate limit compartilhado indisponível, usando contador local: {e}")
+            limiter.contar(chave, regra.periodo, agora)
+
+
+def init_app(app) -> None:
+    """Enforce ``RATE_LIMITS`` on every request of the app."""
+    from flask import request
+
+    from utils import metrics
+    from utils.json_utils import json_response
+
+    regras = parse_regras(app.config.get('RATE_LIMITS', ''))
+    compartilhado = bool(app.config.get('RATE_LIMIT_SHARED', False))
+    if not regras:
+        return
+    app.extensions['rate_limit'] = (regras, compartilhado)
+
+    @app.before_request
+    def _rate_limit():
+        regras_endpoint = regras.get(request.endpoint)
+        if regras_endpoint is None or request.method == 'OPTIONS':
+            return None
+
+        agora = time.time()
+        for regra in regras_endpoint:
+            for chave in _chaves(regra, request.endpoint, request):
+                espera = _registrar(chave, regra, agora, compartilhado)
+                if espera is not None:
+                    metrics.observe_rate_limited(request.endpoint, chave[2])
+                    response = json_response({
+                        'error': 'Muitas requisições; tente novamente em instantes',
+                        'code': 'RATE_LIMITED',
+                    }, 429)
+                    response.headers['Retry-After'] = str(max(1, math.ceil(espera)))
+                    return response
+        return None
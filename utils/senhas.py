@@ -0,0 +1,158 @@
+"""Password hashing off the request threads.
+
+Hashing and verifying passwords (werkzeug scrypt/PBKDF2) takes tens to
+hundreds of milliseconds of pure CPU while holding the GIL, and a worker
+only has a handful of gthreads: a burst of logins would stall every other
+endpoint of that worker. Each worker therefore runs the hashing in a small
+process pool of its own, created after fork.
+
+A request thread still waits for its hash, so the isolation comes from
+the limit: at most ``PASSWORD_HASH_MAX_PENDING`` hashes may be running or
+queued per worker - keep it below gunicorn's ``--threads`` so the other
+threads keep serving - and beyond that ``HashIndisponivel`` is raised
+immediately (the route answers 503 with Retry-After).
+
+Hashes made with an older method or cost are upgraded on the next
+successful login (``precisa_rehash``).
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashIndisponivel(Exception):
+    """The password hashing pool is saturated or didn't answer in time."""
+
+
+def _metodo() -> str:
+    return os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+
+
+def _gerar(senha: str, metodo: str) -> str:
+    return generate_password_hash(senha, method=metodo)
+
+
+def _verificar(password_hash: str, senha: str) -> bool:
+    return check_password_hash(password_hash, senha)
+
+
+class PasswordHasher:
+    """Per-process pool of hashing processes behind a pending-work limit."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._prefixo: Optional[str] = None
+        self.pendentes = 0
+        self.rejeitados = 0
+
+    @staticmethod
+    def _max_pendentes() -> int:
+        return int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '2'))
+
+    def _pool(self) -> ProcessPoolExecutor:
+        executor = self._executor
+        if self._pid == os.getpid() and executor is not None:
+            return executor
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the parent's pool and pending work aren't ours
+                self.pendentes = 0
+                self._pid = os.getpid()
+                self._executor = None
+            if self._executor is None:
+                # spawn: forking a multi-threaded gunicorn worker is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', '2')),
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._executor
+
+    def _executar(self, fn, *args):
+        executor = self._pool()
+        with self._lock:
+            if self.pendentes >= self._max_pendentes():
+                self.rejeitados += 1
+                raise HashIndisponivel('Fila de hashing de senhas cheia')
+            self.pendentes += 1
+        try:
+            future = executor.submit(fn, *args)
+        except Exception as e:
+            self._liberar()
+            if isinstance(e, BrokenProcessPool):
+                self._descartar(executor)
+                raise HashIndisponivel('Processos de hashing reiniciando')
+            raise
+        # The slot is freed when the work finishes, even if we stop waiting
+        future.add_done_callback(lambda f: self._liberar())
+        try:
+            return future.result(timeout=float(os.environ.get('PASSWORD_HASH_TIMEOUT', '10')))
+        except FuturesTimeoutError:
+            raise HashIndisponivel('Hashing de senha não respondeu a tempo')
+        except BrokenProcessPool:
+            # A hashing process died (e.g. OOM killer): start a fresh pool
+            self._descartar(executor)
+            raise HashIndisponivel('Processos de hashing reiniciando')
+
+    def _descartar(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _liberar(self) -> None:
+        with self._lock:
+            self.pendentes -= 1
+
+    def gerar(self, senha: str) -> str:
+        """Hash ``senha`` with the configured method."""
+        password_hash = self._executar(_gerar, senha, _metodo())
+        if self._prefixo is None:
+            self._prefixo = password_hash.split('$', 1)[0]
+        return password_hash
+
+    def verificar(self, password_hash: str, senha: str) -> bool:
+        """True if ``senha`` matches ``password_hash``."""
+        return self._executar(_verificar, password_hash, senha)
+
+    def precisa_rehash(self, password_hash: str) -> bool:
+        """
+        True if the hash was made with another method or cost than configured.
+
+        Never hashes: the configured prefix (e.g. "scrypt:32768:8:1") comes
+        from ``aquecer`` or the first ``gerar``; until then nothing is
+        reported, so a login never waits for (or is refused by) the pool
+        just to check this.
+        """
+        if self._prefixo is None:
+            return False
+        return password_hash.split('$', 1)[0] != self._prefixo
+
+    def aquecer(self) -> None:
+        """Start the hashing processes now instead of on the first login (and learn the hash prefix)."""
+        self._prefixo = self._pool().submit(_gerar, '', _metodo()).result().split('$', 1)[0]
+
+    def encerrar(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid() and self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'started': self._pid == os.getpid() and self._executor is not None,
+                'pending': self.pendentes,
+                'max_pending': self._max_pendentes(),
+                'rejected': self.rejeitados,
+            }
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,188 @@
+"""Revoked JWTs, shared by every worker (token_revogado table).
+
+Logout writes the token's jti with its own ``exp`` to ``token_revogado``
+and announces it through ``utils.invalidation``. Each worker mirrors the
+unexpired rows in memory (loaded once, then kept current by those
+messages), so the check flask-jwt-extended runs on every authenticated
+request is a dict lookup. Only tokens that are both revoked and not yet
+expired are kept, which bounds the mirror by logouts per token lifetime.
+
+While this worker's invalidation listener is down the mirror could miss a
+logout, so each check reads the table instead (primary key lookup).
+Expired rows are purged in the background: a daemon thread per worker
+deletes them every ``TOKEN_PURGE_INTERVAL`` seconds and prunes the mirror,
+off the request and logout paths.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+from utils import invalidation
+
+logger = logging.getLogger(__name__)
+
+TOPIC = 'tokens_revogados'
+
+_purga_pid: Optional[int] = None
+_purga_lock = threading.Lock()
+
+
+class TokenBlocklist:
+    """Thread-safe mirror of token_revogado: jti -> expiry (epoch seconds)."""
+
+    # Expired entries are dropped from the mirror at most this often
+    PODA_INTERVALO = 60.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jtis: Optional[dict[str, float]] = None
+        # Bumped on every change; a load that raced one is not kept
+        self.geracao = 0
+        self.cargas = 0
+        self._ultima_poda = 0.0
+
+    @staticmethod
+    def _ler(cur) -> dict[str, float]:
+        cur.execute("""
+            SELECT jti, extract(epoch FROM expira_em)::float8 AS exp
+            FROM token_revogado
+            WHERE expira_em > now()
+        """)
+        return {row['jti']: row['exp'] for row in cur.fetchall()}
+
+    def revogado(self, cur_factory, jti: str) -> bool:
+        """
+        True if ``jti`` was revoked and hasn't expired yet.
+
+        Args:
+            cur_factory: Zero-argument context manager yielding a cursor,
+                used only when the table has to be read
+            jti: Token id
+        """
+        invalidation.ensure_listener()
+        ensure_purga()
+        if not invalidation.is_listening():
+            with cur_factory() as cur:
+                cur.execute(
+                    "SELECT 1 FROM token_revogado WHERE jti = %s AND expira_em > now()",
+                    (jti,)
+                )
+                return cur.fetchone() is not None
+
+        with self._lock:
+            jtis, geracao = self._jtis, self.geracao
+        if jtis is None:
+            with cur_factory() as cur:
+                jtis = self._ler(cur)
+            with self._lock:
+                if geracao == self.geracao:
+                    self._jtis = jtis
+                    self.cargas += 1
+        exp = jtis.get(jti)
+        return exp is not None and exp > time.time()
+
+    def adicionar(self, jti: str, exp: float) -> None:
+        with self._lock:
+            self.geracao += 1
+            if self._jtis is None:
+                return
+            self._jtis[jti] = exp
+            agora = time.time()
+            if agora - self._ultima_poda >= self.PODA_INTERVALO:
+                self._podar(agora)
+
+    def _podar(self, agora: float) -> None:
+        # Caller holds the lock
+        self._ultima_poda = agora
+        if self._jtis is not None:
+            self._jtis = {j: e for j, e in self._jtis.items() if e > agora}
+
+    def podar(self) -> None:
+        """Drop expired entries from the mirror."""
+        with self._lock:
+            self._podar(time.time())
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.geracao += 1
+            self._jtis = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'loaded': self._jtis is not None,
+                'tokens': len(self._jtis) if self._jtis is not None else 0,
+                'loads': self.cargas,
+            }
+
+
+token_blocklist = TokenBlocklist()
+
+
+def revogar_token(cur, jti: str, exp: int) -> None:
+    """
+    Revoke a token in the caller's transaction (every worker sees it on commit).
+
+    Args:
+        cur: Cursor of the caller's transaction
+        jti: Token id
+        exp: Token expiry (JWT ``exp`` claim, epoch seconds)
+    """
+    cur.execute("""
+        INSERT INTO token_revogado (jti, expira_em)
+        VALUES (%s, to_timestamp(%s))
+        ON CONFLICT (jti) DO NOTHING
+    """, (jti, exp))
+    invalidation.publish(cur, TOPIC, {'jti': jti, 'exp': exp})
+
+
+def purgar_expirados(cur) -> int:
+    """Delete revocations of tokens already past their exp; returns how many."""
+    # Those tokens are rejected by the JWT expiry check anyway
+    cur.execute("DELETE FROM token_revogado WHERE expira_em < now()")
+    return cur.rowcount
+
+
+def ensure_purga() -> None:
+    """Start this process's purge thread if it isn't running (cheap check)."""
+    global _purga_pid
+
+    if _purga_pid == os.getpid():
+        return
+    with _purga_lock:
+        if _purga_pid == os.getpid():
+            return
+        _purga_pid = os.getpid()
+        thread = threading.Thread(target=_purgar_periodicamente, name='token-purge', daemon=True)
+        thread.start()
+
+
+def _purgar_periodicamente() -> None:
+    from connection import get_db_cursor
+
+    intervalo = float(os.environ.get('TOKEN_PURGE_INTERVAL', '3600'))
+    # Spread the workers' purges over the interval
+    time.sleep(random.uniform(0, intervalo))
+    while True:
+        try:
+            with get_db_cursor() as cur:
+                removidos = purgar_expirados(cur)
+            if removidos:
+                logger.info(f"Tokens revogados expirados removidos: {removidos}")
+        except Exception as e:
+            logger.warning(f"Falha ao remover tokens revogados expirados: {e}")
+        token_blocklist.podar()
+        time.sleep(intervalo)
+
+
+def _on_message(data) -> None:
+    if data is None:
+        token_blocklist.invalidate()
+    else:
+        token_blocklist.adicionar(data['jti'], float(data['exp']))
+
+
+invalidation.subscribe(TOPIC, _on_message)
@@ -0,0 +1,122 @@
+"""Per-worker TTL cache of active usuario records (id, username, email).
+
+Every authenticated request resolves its JWT identity to a user
+(flask-jwt-extended ``user_lookup_loader``, see routes/auth.py) and the SPA
+polls /auth/status constantly; both are served from here. Records are kept
+for ``USER_CACHE_TTL`` seconds and dropped as soon as the usuario row
+changes: a trigger on the table publishes the ids through
+``utils.invalidation`` (migrations/011_usuario_notify.sql), so even a user
+deactivated straight in SQL loses access on the next request in every
+worker.
+
+Only active users are cached; unknown or inactive ids always read the
+table. While this worker's invalidation listener is down the cache is
+bypassed.
+"""
+import os
+import threading
+import time
+from typing import Optional
+
+from utils import invalidation
+
+TOPIC = 'usuarios'
+
+
+class UsuarioCache:
+    """Thread-safe id -> record cache with per-entry expiry."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_id: dict[int, tuple[float, dict]] = {}
+        # Bumped on every invalidation; a load that raced one is not kept
+        self.geracao = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _ttl() -> float:
+        return float(os.environ.get('USER_CACHE_TTL', '300'))
+
+    @staticmethod
+    def _max_entries() -> int:
+        return int(os.environ.get('USER_CACHE_MAX_ENTRIES', '1000'))
+
+    @staticmethod
+    def _ler(cur, usuario_id: int) -> Optional[dict]:
+        cur.execute(
+            "SELECT id, username, email FROM usuario WHERE id = %s AND ativo = true",
+            (usuario_id,)
+        )
+        row = cur.fetchone()
+        return dict(row) if row else None
+
+    def buscar(self, cur_factory, usuario_id: int) -> Optional[dict]:
+        """
+        The active user's {id, username, email}, or None if missing/inactive.
+
+        Args:
+            cur_factory: Zero-argument context manager yielding a cursor,
+                used only on a miss
+            usuario_id: User id (JWT identity)
+        """
+        usar_cache = invalidation.is_listening()
+        agora = time.monotonic()
+        if usar_cache:
+            with self._lock:
+                entrada = self._por_id.get(usuario_id)
+                geracao = self.geracao
+                if entrada is not None and entrada[0] > agora:
+                    self.hits += 1
+                    return entrada[1]
+                self.misses += 1
+
+        with cur_factory() as cur:
+            usuario = self._ler(cur, usuario_id)
+        if usar_cache and usuario is not None:
+            with self._lock:
+                if geracao == self.geracao:
+                    if len(self._por_id) >= self._max_entries():
+                        self._podar(agora)
+                    self._por_id[usuario_id] = (agora + self._ttl(), usuario)
+        return usuario
+
+    def _podar(self, agora: float) -> None:
+        # Caller holds the lock: drop expired entries, then the oldest ones
+        self._por_id = {i: e for i, e in self._por_id.items() if e[0] > agora}
+        while len(self._por_id) >= self._max_entries():
+            self._por_id.pop(next(iter(self._por_id)))
+
+    def invalidate(self, ids: Optional[list[int]] = None) -> None:
+        """Drop the given users (None = everyone)."""
+        with self._lock:
+            self.geracao += 1
+            if ids is None:
+                self._por_id = {}
+            else:
+                for usuario_id in ids:
+                    self._por_id.pop(usuario_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._por_id),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+usuario_cache = UsuarioCache()
+
+
+def buscar_usuario(cur_factory, usuario_id: int) -> Optional[dict]:
+    """The active user's {id, username, email}, or None (see UsuarioCache.buscar)."""
+    return usuario_cache.buscar(cur_factory, usuario_id)
+
+
+def _on_message(data) -> None:
+    # Published by the usuario trigger: {"ids": [...]}, or null when too many
+    usuario_cache.invalidate(data.get('ids') if data else None)
+
+
+invalidation.subscribe(TOPIC, _on_message)